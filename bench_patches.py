@@ -0,0 +1,265 @@
+"""Scaling benchmark for the patch scripts on synthetic sources.
+
+Builds synthetic trees at 1x, 10x and 100x the current size of every target
+file: a skeleton holding the anchors each patch edits, padded with
+marker-free JSX elements of App.tsx. Next to the typical tree, one worst
+case per anchor search the patches run, its file made of near misses with
+the skeleton (and so the only real match) at the end:
+
+    worst-types    interfaces that never close, so the outline holds one
+                   InverterConfig / MicroBranchConfig body to the end
+    worst-agcp     many 'configuredStrings: [],' near misses of AGCP_DEFAULT
+                   followed by long whitespace runs
+    worst-ac-block many 'Coffret AC →' hints outside any element, each
+                   looked up in the outline before the real one
+
+Every patch function is timed on its own (Source built, patch applied, text
+joined), plus the end-to-end pipeline run on a temporary directory. Peak
+memory comes from a separate tracemalloc run. Results go to stdout and
+bench_output.txt and are compared with bench_baseline.json: a time above
+tolerance x baseline (scaled by a CPU calibration loop), a peak above
+1.5 x baseline, or a 100x time growing much faster than the input is a
+regression and the exit status is 1, as it is when the baseline is missing.
+
+The baseline is checked in with the calibration time of the machine that
+recorded it, and every time is compared after scaling by the ratio of the
+two calibrations, so it stays valid on other machines. Regenerate it only
+in a commit that changes the patches' performance on purpose (and say so
+in that commit), not to make a regression pass.
+
+    python bench_patches.py                    # all scales, compare
+    python bench_patches.py --scales 1 10      # skip the slow 100x tier
+    python bench_patches.py --update-baseline
+"""
+import io, sys, json, time, argparse, pathlib, platform, tempfile, tracemalloc, contextlib
+
+from patch_anchors import markers_for
+from patch_document import Source, as_source_patch
+from patch_pipeline import MANIFEST, run, targets, write_atomic
+from tsx_outline import parse as parse_outline
+
+ROOT = pathlib.Path(__file__).resolve().parent
+BASELINE = ROOT / 'bench_baseline.json'
+OUTPUT = ROOT / 'bench_output.txt'
+SCALES = (1, 10, 100)
+REPEATS = {1: 5, 10: 3, 100: 1}
+TOLERANCE = 2.0
+MEMORY_TOLERANCE = 1.5
+SLACK_S = 0.002
+SLACK_BYTES = 64 << 10
+SUPERLINEAR = 3.0  # allowed excess of t(100x) / t(1x) over 100
+
+SKELETONS = {
+    'types.ts': '''
+export interface MicroBranchConfig {
+  id: string;
+  maxMicros: number;
+}
+
+export interface InverterConfig {
+  brand: InverterBrand;
+  model?: string;
+  configuredStrings?: ConfiguredString[];
+}
+''',
+    'App.tsx': '''
+  inverterConfig: {
+      brand: InverterBrand.FOXESS,
+      configuredStrings: [],
+      agcpValue: undefined
+  },
+  legacyInverterConfig: { mpptCount: undefined, phase: 'Mono' },
+                                        <div>
+                                            <div>
+                                              <label className="text-[11px] font-black text-slate-700">
+                                                <b>Câblage AC (m)</b>
+                                              </label>
+                                              <div className="text-[10px] italic text-slate-500">Coffret AC ➜ point de raccordement</div>
+                                            </div>
+                                            <div className="text-[10px] italic text-slate-500">
+                                                Coffret AC → point de raccordement
+                                            </div>
+                                        </div>
+''',
+    'components/CalculationAudit.tsx': '''
+          {/* Affichage DÉTAILLÉ des MPPT */}
+          <div className="mt-6">
+            <h2 className="text-sm font-black text-slate-700 uppercase tracking-widest mb-2">Validation matériel de protection DC</h2>
+          </div>
+''',
+    'components/PdfReport.tsx': '''
+        <section className="mb-6">
+            <h3 className="text-[10px] font-black text-slate-800 uppercase mb-3 tracking-tight">Validation Matériel de protection DC</h3>
+        </section>
+''',
+}
+
+def filler_units():
+    """Whole JSX elements of App.tsx that hold no marker or guard of any patch.
+
+    Complete elements rather than loose lines, so the padded files still
+    parse and the outline the patches walk looks like the real one.
+    """
+    needles = {part.strip() for m in markers_for(fn for _, fn in MANIFEST) for part in m.split('\n')}
+    needles = [n for n in needles if len(n) > 8]  # keeps plain '</div>' lines
+    text = (ROOT / 'App.tsx').read_text(encoding='utf-8')
+    units, end = [], 0
+    for node in parse_outline(text).find('element'):
+        if node.start >= end and node.closed:
+            unit = text[node.start:node.end]
+            if not any(n in unit for n in needles):
+                units.append(unit + '\n')
+                end = node.end
+    return units
+
+def pad(size, units):
+    out, n, i = [], 0, 0
+    while n < size:
+        out.append(units[i % len(units)])
+        n += len(out[-1])
+        i += 1
+    return ''.join(out)
+
+def typical(path, size, units):
+    head = pad(size // 2, units)
+    return head + SKELETONS[path] + pad(size - len(head) - len(SKELETONS[path]), units[len(units) // 2:] + units)
+
+def repeat_to(unit, size):
+    return unit * max(1, size // len(unit))
+
+WORST = {
+    'worst-types': ('types.ts', lambda size: (
+        'export interface InverterConfig {\n' + repeat_to('  field: { x: number } ;\n', size // 2)
+        + 'export interface MicroBranchConfig {\n' + repeat_to('  branch: { id: string } ;\n', size // 2))),
+    'worst-agcp': ('App.tsx', lambda size: repeat_to(
+        '      configuredStrings: [],\n' + ' ' * 200 + 'agcpValue: null,\n', size)),
+    'worst-ac-block': ('App.tsx', lambda size: repeat_to(
+        'Coffret AC → point de raccordement\n' + ' ' * 200 + '</span>\n', size)),
+}
+
+def current_sizes():
+    return {path: len((ROOT / path).read_text(encoding='utf-8')) for path in targets()}
+
+def tree(case, scale, units, sizes):
+    texts = {path: typical(path, sizes[path] * scale, units) for path in targets()}
+    if case in WORST:
+        path, make = WORST[case]
+        # the skeleton last: every patch still finds its real anchor, after all the near misses
+        texts[path] = make(sizes[path] * scale) + SKELETONS[path]
+    return texts
+
+def apply_patch(fn, text):
+    parse_outline.cache_clear()  # every run pays for its outline
+    src = Source(text, getattr(fn, 'markers', ()))
+    as_source_patch(fn)(src)
+    return src.text
+
+def end_to_end(texts):
+    parse_outline.cache_clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        for path, text in texts.items():
+            (pathlib.Path(tmp) / path).parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(pathlib.Path(tmp) / path, text)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            run(tmp, jobs=1, cache=False)
+
+def measure(call, repeats):
+    """(best wall time over `repeats`, traced peak bytes of one more run)."""
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def calibrate():
+    """Seconds for a fixed pure-Python workload, to rescale a baseline taken on another machine."""
+    best = float('inf')
+    for _ in range(5):
+        t0 = time.perf_counter()
+        d = {}
+        for i in range(200000):
+            d[i % 977] = d.get(i % 977, 0) + i
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def benchmarks(scales, cases):
+    units, sizes = filler_units(), current_sizes()
+    for scale in scales:
+        for case in cases:
+            texts = tree(case, scale, units, sizes)
+            touched = targets() if case == 'typical' else [WORST[case][0]]
+            for path, fn in MANIFEST:
+                if path in touched:
+                    yield (f'{scale}x/{case}/{fn.__module__}.{fn.__name__}', len(texts[path]),
+                           lambda fn=fn, text=texts[path]: apply_patch(fn, text), REPEATS[scale])
+            yield f'{scale}x/{case}/end-to-end', sum(map(len, texts.values())), lambda texts=texts: end_to_end(texts), REPEATS[scale]
+
+def compare(results, baseline, calib, tolerance):
+    failures = []
+    ratio = calib / baseline['calibration'] if baseline.get('calibration') else 1.0
+    for key, r in results.items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        limit = base['seconds'] * ratio * tolerance + SLACK_S
+        if r['seconds'] > limit:
+            failures.append(f'{key}: {r["seconds"] * 1e3:.1f} ms > {limit * 1e3:.1f} ms '
+                            f'(baseline {base["seconds"] * 1e3:.1f} ms)')
+        mem_limit = base['peak'] * MEMORY_TOLERANCE + SLACK_BYTES
+        if r['peak'] > mem_limit:
+            failures.append(f'{key}: peak {r["peak"] >> 10} KiB > {int(mem_limit) >> 10} KiB '
+                            f'(baseline {base["peak"] >> 10} KiB)')
+    return failures
+
+def scaling(results):
+    """Flag benchmarks whose 100x time outgrows the input by more than SUPERLINEAR."""
+    failures = []
+    for key, r in results.items():
+        if not key.startswith('100x/'):
+            continue
+        small = results.get('1x/' + key[5:])
+        if small and r['seconds'] > 0.01 and r['seconds'] / max(small['seconds'], 1e-6) > 100 * SUPERLINEAR:
+            failures.append(f'{key}: {r["seconds"] / small["seconds"]:.0f}x the 1x time for 100x the input')
+    return failures
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('--scales', type=int, nargs='+', default=list(SCALES), choices=SCALES)
+    ap.add_argument('--cases', nargs='+', default=['typical', *WORST], choices=['typical', *WORST])
+    ap.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown over the baseline')
+    ap.add_argument('--update-baseline', action='store_true')
+    args = ap.parse_args()
+    calib = calibrate()
+    results, report = {}, []
+    with open(OUTPUT, 'w', encoding='utf-8') as out:
+        def emit(line):
+            print(line)
+            out.write(line + '\n')
+            out.flush()
+        emit(f'# {platform.python_implementation()} {platform.python_version()}, calibration {calib * 1e3:.1f} ms')
+        emit(f'{"benchmark":72} {"chars":>10} {"ms":>10} {"peak KiB":>10}')
+        for key, size, call, repeats in benchmarks(args.scales, args.cases):
+            seconds, peak = measure(call, repeats)
+            results[key] = {'chars': size, 'seconds': seconds, 'peak': peak}
+            emit(f'{key:72} {size:>10} {seconds * 1e3:>10.2f} {peak >> 10:>10}')
+        failures = scaling(results)
+        if args.update_baseline:
+            stored = json.loads(BASELINE.read_text(encoding='utf-8'))['results'] if BASELINE.exists() else {}
+            stored.update(results)
+            BASELINE.write_text(json.dumps({'calibration': calib, 'python': platform.python_version(),
+                                            'results': stored}, indent=1, sort_keys=True) + '\n', encoding='utf-8')
+            emit(f'baseline written to {BASELINE.name}')
+        elif BASELINE.exists():
+            failures += compare(results, json.loads(BASELINE.read_text(encoding='utf-8')), calib, args.tolerance)
+        else:
+            failures.append(f'no {BASELINE.name} to compare with; run with --update-baseline to record one')
+        for f in failures:
+            emit('REGRESSION ' + f)
+    sys.exit(1 if failures else 0)
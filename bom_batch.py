@@ -0,0 +1,429 @@
+"""Batch bill of materials over project exports.
+
+A port of calculateBillOfMaterials (services/calculatorService.ts), with
+calculateMicroInverters and the per-project merge App.tsx does across
+fields, for runs over thousands of roof fields:
+
+- each catalog (k2, esdec, inverters, cables) is indexed once by key and
+  by component id, so getMaterialFromDB's `Object.values(db).find(...)`
+  fallback and alternate keys such as 'MC4-EXT-2M' (id '303037') are
+  single dict lookups;
+- the rail list (components whose description mentions a rail, shortest
+  first) is filtered and sorted once per catalog instead of per field;
+- the rail and splice layout is memoised per (line length, rail length);
+- projects are split in chunks and run in a process pool.
+
+The catalogs are the app's defaults from data/*.ts, or the collections of
+a getAllData backup (--catalog), which replace the defaults as they do in
+the app. The output has one JSON line per project with its merged BOM, the
+same items in the same order as the TS code. --check-ts runs the TS
+functions through node on the same inputs and compares them item by item.
+
+    python bom_batch.py exports/ -o bom.ndjson [-j 8] [--totals totals.json]
+    python bom_batch.py projects.json --catalog backup.json --check-ts
+    python bom_batch.py tests/fixtures/bom_projects.ndjson --write-fixture tests/fixtures/bom_ts.ndjson
+"""
+import os, sys, json, argparse, pathlib, tempfile, subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from climate_index import TS_LOADER
+from dc_audit import default_inverters, panel_count, read_projects
+from js_compat import ceil, js_max, js_values, num, truthy
+from ts_literals import ROOT, load_enum, load_module
+
+INTER_CLAMP_GAP = 20  # mm
+CHUNK = 256
+COLLECTIONS = ('k2', 'esdec', 'inverters', 'cables')
+
+BRAND = load_enum('types.ts', 'InverterBrand')
+FIBROCIMENT = load_enum('types.ts', 'RoofType')['FIBROCIMENT']
+MC4_EXTENSION = {'id': '303037', 'description': 'Rallonge MC4 2M', 'unit': 'piece', 'price': 'A0BEX2'}
+HEAVY_DUTY_CLIP = {'id': '1008068', 'description': 'ClickFit EVO - Clip métal poids lourd 2-8kg (Micro-ond)', 'unit': 'piece', 'price': 'A0K6F7'}
+
+class Undefined:
+    """A field the TS object does not have: falsy, and left out of the JSON output."""
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return 'undefined'
+
+    __repr__ = __str__
+
+UNDEFINED = Undefined()
+
+class Catalog:
+    """A component collection ({key: Component}) indexed by key and by id."""
+    __slots__ = ('by_key', 'by_id', 'rails')
+
+    def __init__(self, components):
+        self.by_key = components
+        self.by_id = {}
+        for c in js_values(components):
+            self.by_id.setdefault(c.get('id'), c)
+        # availableRails of calculateBillOfMaterials (Array.sort is stable, like sorted)
+        self.rails = sorted((c for c in js_values(components)
+                             if 'rail' in c['description'].lower() and truthy(c.get('length')) and c['length'] > 0),
+                            key=lambda c: c.get('length') or 0)
+
+    def get(self, key):
+        """`db[key]`."""
+        return self.by_key.get(key) or UNDEFINED
+
+    def find(self, component_id):
+        """`Object.values(db).find(c => c.id === component_id)`."""
+        return self.by_id.get(component_id) or UNDEFINED
+
+    def material(self, search_id, fallback_description):
+        """getMaterialFromDB: by key, then by id, else a placeholder component."""
+        return (self.by_key.get(search_id) or self.by_id.get(search_id)
+                or {'id': search_id, 'description': fallback_description, 'unit': 'piece', 'price': ''})
+
+def default_catalogs():
+    """The collections App.tsx starts from."""
+    k2 = load_module('data/k2components.ts')
+    return {'k2': k2['K2_COMPONENTS_DEFAULT'], 'esdec': k2['ESDEC_COMPONENTS_DEFAULT'],
+            'inverters': default_inverters(), 'cables': load_module('data/cables.ts')['DEFAULT_CABLES']}
+
+def load_catalogs(path=None):
+    """Default collections, each replaced by a non-empty collection of the getAllData backup at path."""
+    collections = default_catalogs()
+    if path is not None:
+        backup = json.loads(pathlib.Path(path).read_text(encoding='utf-8'))
+        collections.update((name, backup[name]) for name in COLLECTIONS if backup.get(name))
+    return collections
+
+@lru_cache(maxsize=4096)
+def rail_layout(line_length, rail_length):
+    """(rails per line, splices per line): calculateOptimalRails for one rail length."""
+    rails = ceil(line_length / rail_length)
+    return rails, rails - 1 if rails > 1 else 0
+
+def item(component, quantity, description=None, price=None):
+    """A Material built from a component, the way the TS code spells it out."""
+    return {'id': component.get('id', UNDEFINED),
+            'description': component.get('description', UNDEFINED) if description is None else description,
+            'quantity': quantity,
+            'price': component.get('price', UNDEFINED) if price is None else price,
+            'datasheetUrl': component.get('datasheetUrl', UNDEFINED)}
+
+def is_custom_micro(config, component):
+    return config.get('brand') == BRAND['CUSTOM'] and truthy(((component or {}).get('electrical') or {}).get('isMicro'))
+
+def micro_mounts(config, inverters, total):
+    """(micro-inverter count, supports per micro) as the mounting branches count them."""
+    brand, model = config.get('brand'), config.get('model') or ''
+    if brand == BRAND['ENPHASE'] or is_custom_micro(config, inverters.get(model)):
+        return total, 1
+    if brand == BRAND['APSYSTEMS']:
+        return ceil(total / 2), 1
+    if brand == BRAND['FOXESS'] and 'MICRO' in model:
+        return ceil(total / (4 if '2000' in model else 2)), 2
+    return 0, 1
+
+def micro_inverters(field, config, inverters):
+    """calculateMicroInverters."""
+    bom = []
+    total = panel_count(field['panels'])
+    portrait = field['panels'].get('orientation') == 'Portrait'
+    brand, model = config.get('brand'), config.get('model')
+    three_phase = config.get('phase') == 'Tri'
+    if total == 0:
+        return []
+    custom_micro = is_custom_micro(config, inverters.find(model))
+    if (brand in (BRAND['ENPHASE'], BRAND['APSYSTEMS']) or custom_micro
+            or (brand == BRAND['FOXESS'] and 'MICRO' in (model or ''))):
+        if three_phase:
+            male = inverters.material('2300711032', 'CONNECTEUR ETANCHE MALE TRI. APS')
+            female = inverters.material('2300812032', 'CONNECTEUR ETANCHE FEM. TRI. APS')
+            bom.append(item(male, 1, price=male.get('price') or 'A04CJ7'))
+            bom.append(item(female, 1, price=female.get('price') or 'A04CK5'))
+        else:
+            male = inverters.material('2300531032', 'CONNECTEUR ETANCHE MALE MONO APS')
+            female = inverters.material('2300532032', 'CONNECTEUR ETANCHE FEM. MONO APS')
+            bom.append(item(male, 1, price=male.get('price') or 'A04CG2'))
+            bom.append(item(female, 1, price=female.get('price') or 'A04CH0'))
+
+    if brand == BRAND['ENPHASE']:
+        bom.append(item(inverters.material(model or 'ENP-IQ8MC-72-M-INT', 'Micro-onduleur Enphase'), total))
+        if three_phase:
+            cable_id = 'Q-25-10-3P-200' if portrait else 'Q-25-17-3P-160'
+        else:
+            cable_id = 'ENP-Q-25-10-240' if portrait else 'ENP-Q-25-17-240'
+        bom.append(item(inverters.material(cable_id, 'Câble Enphase Q-Cable'), total))
+        term = inverters.material(*(('Q-TERM-3P', 'EMBOUT DE TERMIN.TRI.ENPHASE') if three_phase
+                                    else ('ENP-Q-TERM-R', 'EMBOUT TERMINAIS.MONO ENPHASE')))
+        bom.append(item(term, 1))
+    elif brand == BRAND['APSYSTEMS']:
+        count = ceil(total / 2)
+        inverter = inverters.material(model or 'APS-DS3', 'Micro-onduleur AP Systems')
+        bom.append(item(inverter, count, description=f'{inverter["description"]} (1 pour 2 panneaux)'))
+        if portrait:
+            cable = inverters.material('2322304903', 'CABLE MONO. PORTRAIT 2M APS')
+            bom.append(item(cable, count, price=cable.get('price') or 'A04C98'))
+        else:
+            cable = inverters.material('2322404903', 'CABLE MONO. PAYSAGE 4M DS3 APS')
+            bom.append(item(cable, count, price=cable.get('price') or 'A04CS1'))
+        cap = inverters.material('2060700017', 'EMBOUT TERMINAIS.MONO APS')
+        bom.append(item(cap, 1, price=cap.get('price') or 'A08TY8'))
+    elif brand == BRAND['FOXESS']:
+        if model and 'MICRO' in model:
+            inputs = 4 if '2000' in model else 2
+            count = ceil(total / inputs)
+            inverter = inverters.material(model, 'Micro-onduleur FoxESS')
+            bom.append(item(inverter, count, description=f'{inverter["description"]} (1 pour {inputs} panneaux)'))
+            bom.append(item(inverters.material('10-100-01176-0', 'CABLE AC MONO FoxESS'), count))
+            bom.append(item(inverters.material('10-208-00083-00', 'TE DE CONNEXION AC MONO FoxESS'), count))
+            # one branch takes 7 micros; each extra branch needs a cap and a female / male connector pair
+            extra = (count - 1) // 7
+            bom.append(item(inverters.material('10-109-00175-00', 'BOUCHON AC FoxESS'), 1 + extra))
+            if extra > 0:
+                bom.append(item(inverters.material('2300532032', 'CONNECTEUR ETANCHE FEM. MONO APS'), extra))
+                bom.append(item(inverters.material('2300531032', 'CONNECTEUR ETANCHE MALE MONO APS'), extra))
+    elif brand == BRAND['CUSTOM'] and custom_micro:
+        bom.append(item(inverters.material(model or 'OND-PERSO', 'Micro-onduleur Perso'), total))
+    return bom
+
+def field_bom(field, components, system, inverters, cables, config=None):
+    """calculateBillOfMaterials for one RoofField (Catalogs for the component collections)."""
+    panels, roof = field['panels'], field['roof']
+    model = panels.get('model')
+    if not truthy(model) or panels.get('rows') == 0 or panels.get('columns') == 0:
+        return []
+    bom = []
+    total = panel_count(panels)
+    rows, columns = num(panels.get('rows')), num(panels.get('columns'))
+    if total > 0:
+        bom.append({'id': model['name'], 'description': model['name'], 'quantity': total,
+                    'price': model.get('price') or '', 'datasheetUrl': model.get('datasheetUrl', UNDEFINED)})
+    vertical = (field.get('railOrientation') or system.get('railOrientation') or 'Horizontal') == 'Vertical'
+
+    def add(component, quantity, optional=False):
+        if component and quantity > 0:
+            bom.append({'id': component['id'],
+                        'description': f'{component["description"]}*' if optional else component['description'],
+                        'quantity': ceil(quantity), 'price': component.get('price') or '',
+                        'datasheetUrl': component.get('datasheetUrl', UNDEFINED)})
+
+    width, height = num(model.get('width')), num(model.get('height'))
+    if panels.get('orientation') == 'Portrait':
+        field_width = columns * width + js_max(0, columns - 1) * INTER_CLAMP_GAP
+        field_height = rows * height + js_max(0, rows - 1) * INTER_CLAMP_GAP
+    else:
+        field_width = columns * height + js_max(0, columns - 1) * INTER_CLAMP_GAP
+        field_height = rows * width + js_max(0, rows - 1) * INTER_CLAMP_GAP
+    lines = columns * 2 if vertical else rows * 2
+    line_length = field_height if vertical else field_width
+    rails, part = components.rails, components.get
+    micro = config is not None and config.get('brand') != BRAND['NONE']
+
+    if system.get('brand') == 'ESDEC':
+        if rails:
+            rail = rails[0]
+            add(rail, ceil(lines * line_length / rail['length']))
+            per_line = rail_layout(line_length, rail['length'])[0]
+            if per_line > 1:
+                add(part('SPLICE'), (per_line - 1) * lines)
+        add(part('END_CAP'), lines * 2)
+        add(part('UNIVERSAL_CLAMP'), total * 2 + 4 if vertical else (columns + 1) * rows * 2)
+        fixing = part('HANGER_BOLT_FIBRO') if roof.get('type') == FIBROCIMENT else part('HOOK_UNIVERSAL')
+        if fixing:
+            fixings = js_max(2, ceil(line_length / 1000)) * lines
+            add(fixing, fixings)
+            if fixing is part('HOOK_UNIVERSAL') and part('HOOK_GASKET'):
+                add(part('HOOK_GASKET'), fixings, True)
+        if micro:
+            count, clips = micro_mounts(config, inverters, total)
+            if count > 0 and clips > 0:
+                add(part('CLIP_HEAVY_DUTY') or HEAVY_DUTY_CLIP, count * clips)
+    else:
+        if rails and not line_length <= 0:  # calculateOptimalRails returns null otherwise
+            per_line, splices = rail_layout(line_length, rails[0]['length'])
+            add(rails[0], per_line * lines)
+            add(part('SPLICE'), splices * lines)
+        add(part('END_CAP'), lines * 2)
+        add(part('MID_CLAMP'), (rows - 1) * 2 * columns if vertical else (columns - 1) * 2 * rows)
+        add(part('END_CLAMP'), 4 * columns if vertical else 4 * rows)
+        if roof.get('type') == FIBROCIMENT:
+            add(part('HANGER_BOLT_FIBRO'), js_max(2 * lines, ceil(line_length / 1000) * lines))
+        else:
+            fixings = js_max(2 * lines, ceil(line_length / 800) * lines)
+            add(part('HOOK_CROSSHOOK'), fixings)
+            add(part('WOOD_SCREW_8X100'), fixings * 2)
+        add(part('GROUND_LUG_K2SZ'), total)
+        count, supports = micro_mounts(config, inverters, total) if micro else (0, 1)
+        if count > 0:
+            add(part('STAIRPLATE_KIT'), count * supports)
+
+    if micro:
+        bom.extend(micro_inverters(field, config, inverters))
+        # every micro but Enphase's takes two MC4 extensions
+        count = micro_mounts(config, inverters, total)[0] if config.get('brand') != BRAND['ENPHASE'] else 0
+        if count > 0:
+            ext = (cables.get('MC4-EXT-2M') if cables is not None else UNDEFINED) or MC4_EXTENSION
+            bom.append(item(ext, count * 2))
+    return bom
+
+def project_bom(project, catalogs):
+    """The fields' BOMs merged by id, as App.tsx builds globalBOM before the project-wide items."""
+    components = catalogs['esdec'] if project['system'].get('brand') == 'ESDEC' else catalogs['k2']
+    merged = {}
+    for field in project['fields']:
+        if panel_count(field['panels']) > 0:
+            for entry in field_bom(field, components, project['system'], catalogs['inverters'],
+                                   catalogs['cables'], project.get('inverterConfig')):
+                if entry['id'] in merged:
+                    merged[entry['id']]['quantity'] += entry['quantity']
+                else:
+                    merged[entry['id']] = dict(entry)
+    return list(merged.values())
+
+def to_json(bom):
+    """Materials as JSON.stringify writes them: undefined fields dropped, NaN as null."""
+    out = []
+    for entry in bom:
+        rec = {}
+        for k, v in entry.items():
+            if v is UNDEFINED:
+                continue
+            if isinstance(v, float):
+                v = None if v != v or v in (float('inf'), float('-inf')) else int(v) if v.is_integer() else v
+            rec[k] = v
+        out.append(rec)
+    return out
+
+_catalogs = None
+
+def init_worker(collections):
+    global _catalogs
+    _catalogs = {name: Catalog(collections[name]) for name in COLLECTIONS}
+
+def bom_chunk(chunk):
+    """Worker: [(origin, id, name, bom)] for a chunk of (origin, project)."""
+    return [(origin, p.get('id'), p.get('name'), to_json(project_bom(p, _catalogs))) for origin, p in chunk]
+
+def chunks(projects, size):
+    chunk = []
+    for pair in projects:
+        chunk.append(pair)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def batch(projects, collections=None, jobs=None, chunk=CHUNK):
+    """Yield (origin, id, name, bom) per project, in input order, `chunk` projects per pool task."""
+    collections = load_catalogs() if collections is None else collections
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        init_worker(collections)
+        for c in chunks(projects, chunk):
+            yield from bom_chunk(c)
+        return
+    with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(collections,)) as pool:
+        pending = deque()
+        for c in chunks(projects, chunk):
+            pending.append(pool.submit(bom_chunk, c))
+            if len(pending) >= 2 * jobs:  # bounded read-ahead, results stay in order
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def merge_into(totals, bom):
+    for entry in bom:
+        if entry['id'] in totals:
+            totals[entry['id']]['quantity'] += entry['quantity']
+        else:
+            totals[entry['id']] = dict(entry)
+
+BOM_HARNESS = TS_LOADER + r'''
+const { calculateBillOfMaterials, getPanelCount } = load('services/calculatorService.ts');
+const { catalogs, projects } = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+const lines = projects.map(project => {
+  const components = project.system.brand === 'ESDEC' ? catalogs.esdec : catalogs.k2;
+  const bom = [];
+  project.fields.forEach(field => {
+    if (getPanelCount(field.panels) > 0) {
+      calculateBillOfMaterials(field, components, project.system, catalogs.inverters, catalogs.cables, project.inverterConfig).forEach(item => {
+        const existing = bom.find(i => i.id === item.id);
+        if (existing) existing.quantity += item.quantity;
+        else bom.push({ ...item });
+      });
+    }
+  });
+  return JSON.stringify(bom);
+});
+fs.writeFileSync(out, lines.join('\n'));
+'''
+
+def run_ts(projects, collections):
+    """The BOM of each (origin, project) from the TS functions run through node (needs the typescript package)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        inp, out = pathlib.Path(tmp) / 'in.json', pathlib.Path(tmp) / 'ts.ndjson'
+        inp.write_text(json.dumps({'catalogs': collections, 'projects': [p for _, p in projects]}), encoding='utf-8')
+        proc = subprocess.run(['node', '-e', BOM_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        lines = out.read_text(encoding='utf-8').split('\n')
+    if len(lines) != len(projects):
+        raise RuntimeError(f'TS parity run returned {len(lines)} BOMs for {len(projects)} projects')
+    return [json.loads(line) for line in lines]
+
+def compare(results, expected):
+    """Mismatches between `results` ([(origin, id, name, bom)]) and the TS BOMs."""
+    mismatches = 0
+    for (origin, _, _, bom), want in zip(results, expected, strict=True):
+        if json.loads(json.dumps(bom)) != want:
+            mismatches += 1
+            print(f'{origin}: python {bom} != ts {want}', file=sys.stderr)
+    return mismatches
+
+def check_ts(projects, collections, results):
+    """Compare `results` with the TS functions run through node; returns the mismatches."""
+    return compare(results, run_ts(projects, collections))
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('inputs', nargs='+', help='project JSON / NDJSON files or directories')
+    ap.add_argument('-o', '--out', help='per-project BOMs, one JSON line each (default: stdout)')
+    ap.add_argument('--catalog', help='getAllData backup whose collections replace the default catalogs')
+    ap.add_argument('--totals', help='also write the BOM merged over every project to this file')
+    ap.add_argument('-j', '--jobs', type=int, help='worker processes (default: CPU count, 1 = in-process)')
+    ap.add_argument('--chunk', type=int, default=CHUNK, help='projects per pool task (default: %(default)s)')
+    ap.add_argument('--check-ts', action='store_true', help='compare with the TS functions through node')
+    ap.add_argument('--write-fixture', metavar='PATH', help='write the TS BOMs of the inputs to PATH, one JSON line each (test fixtures)')
+    args = ap.parse_args()
+    collections = load_catalogs(args.catalog)
+    if args.write_fixture:
+        try:
+            boms = run_ts(list(read_projects(args.inputs)), collections)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        pathlib.Path(args.write_fixture).write_text(''.join(json.dumps(b, ensure_ascii=False) + '\n' for b in boms), encoding='utf-8')
+        print(f'{len(boms)} BOMs written to {args.write_fixture}', file=sys.stderr)
+        sys.exit()
+    projects = list(read_projects(args.inputs)) if args.check_ts else read_projects(args.inputs)
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    totals, results, fields = {}, [], 0
+    try:
+        for origin, pid, name, bom in batch(projects, collections, args.jobs, args.chunk):
+            out.write(json.dumps({'file': origin, 'id': pid, 'name': name, 'bom': bom}, ensure_ascii=False) + '\n')
+            merge_into(totals, bom)
+            if args.check_ts:
+                results.append((origin, pid, name, bom))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.totals:
+        pathlib.Path(args.totals).write_text(json.dumps(list(totals.values()), ensure_ascii=False, indent=1), encoding='utf-8')
+    print(f'{len(totals)} distinct items', file=sys.stderr)
+    if args.check_ts:
+        try:
+            bad = check_ts(projects, collections, results)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(f'ts parity: {len(results)} projects, {bad} mismatches', file=sys.stderr)
+        sys.exit(1 if bad else 0)
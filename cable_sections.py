@@ -0,0 +1,274 @@
+"""Batch cable-section optimizer for the AC link and the MPPT DC runs.
+
+The app picks sections one link at a time. calculateAcCableSection walks
+[2.5, 6, 10, 16, 25], calculateDcCableSection picks 6 or 10 mm², and the UI
+offers a fixed dropdown. The protection rules of
+services/standardsService.ts are only checked afterwards. Here every
+catalog cable of data/cables.ts (or of a getAllData backup) is tried
+against every link at once. The result is the smallest cable that keeps
+the voltage drop within each target (1 % and 3 %) and passes the
+protection rules:
+
+- AC link: the breaker is ceil(1.25 × Ib) and needs section >=
+  getMinSectionForIn(In) and In <= getMaxInForSection(section). The drop
+  is that of calculateVoltageDropPercent: ρ = 0.023, 2 × L single phase,
+  √3 × L three phase, relative to 230 / 400 V.
+- DC run (one per MPPT with a dcCablingRun): the current is the Isc × 1.25
+  of the audit and needs isDcCableTooSmallForI(section, I) to be false.
+  The drop is the "1B. Liaison DC" one, ΔU = 2 × L × I × ρ / S relative
+  to the MPPT's hot Vmp (see dc_audit).
+
+The protection rules depend only on the section and the current. They
+are tabulated once per catalog as a (section × breaker rating) table for
+AC and one current limit per section for DC. The drop is linear in the
+length, so it is broadcast over (run × section) per chunk of projects.
+Each target then takes the first feasible column.
+
+    python cable_sections.py exports/ -o sections.ndjson
+    python cable_sections.py projects.json --catalog backup.json --check-ts
+"""
+import re, sys, json, argparse, pathlib, tempfile, subprocess
+from math import ceil
+
+import numpy as np
+
+from climate_index import TS_LOADER, ClimateIndex
+from dc_audit import Batch, CHUNK, RHO, THRESHOLDS, default_inverters, load_catalog, panel_count, read_projects
+from js_compat import fixed, num
+from ts_literals import ROOT, Parser, load_const, tokenize
+
+STANDARDS_TS = 'services/standardsService.ts'
+AC_CABLE = re.compile(r'R2V ([35])G(\d+(?:\.\d+)?)')
+DC_CABLE = re.compile(r'H1Z2Z2\S*\s+(?:1x)?(\d+(?:\.\d+)?)', re.I)
+MAX_BREAKER = 400  # A; every rating above behaves like this one
+NO_DC_SECTION = 'no DC section in catalog'
+
+def function_body(name):
+    text = (ROOT / STANDARDS_TS).read_text(encoding='utf-8')
+    start = text.index(f'function {name}(')
+    end = text.find('\nexport', start)
+    return text[start:end if end >= 0 else len(text)]
+
+def function_map(name):
+    """The `const map = {section: amps}` literal of one standardsService function."""
+    toks = tokenize(function_body(name))
+    p = Parser(toks, {}, {})
+    p.i = next(j for j in range(1, len(toks)) if toks[j][1] == 'map' and toks[j - 1][1] == 'const') + 1
+    if p.peek()[1] == ':':
+        p.take()
+        p.skip_type()
+    p.take('=')
+    return {float(k): v for k, v in p.value().items()}
+
+def min_section_steps():
+    """[(max In, section)] and the fallback section of getMinSectionForIn."""
+    body = function_body('getMinSectionForIn')
+    steps = [(float(a), float(s)) for a, s in re.findall(r'if \(inA <= (\d+(?:\.\d+)?)\) return (\d+(?:\.\d+)?);', body)]
+    return steps, float(re.findall(r'\breturn (\d+(?:\.\d+)?);', body)[-1])
+
+MAX_IN_FOR_SECTION = function_map('getMaxInForSection')
+MAX_IDC_FOR_SECTION = function_map('getMaxIdcForSection')
+MIN_SECTION_STEPS, MIN_SECTION_FALLBACK = min_section_steps()
+
+def min_section_for_in(in_a):
+    """getMinSectionForIn."""
+    return next((s for limit, s in MIN_SECTION_STEPS if in_a <= limit), MIN_SECTION_FALLBACK)
+
+def cable_catalog(cables):
+    """{'ac-mono' | 'ac-tri' | 'dc': [(section, component)]} sorted by section, first cable of a section kept."""
+    kinds = {'ac-mono': {}, 'ac-tri': {}, 'dc': {}}
+    for c in cables.values():
+        desc = c.get('description') or ''
+        if m := AC_CABLE.search(desc):
+            kinds['ac-tri' if m.group(1) == '5' else 'ac-mono'].setdefault(float(m.group(2)), c)
+        elif m := DC_CABLE.search(desc):
+            kinds['dc'].setdefault(float(m.group(1)), c)
+    return {k: sorted(v.items(), key=lambda sc: sc[0]) for k, v in kinds.items()}
+
+def ac_protection_table(sections):
+    """bool [section, breaker A]: the section may carry a breaker of that rating (0..MAX_BREAKER)."""
+    ratings = np.arange(MAX_BREAKER + 1)
+    min_section = np.array([min_section_for_in(b) for b in ratings])
+    max_in = np.array([MAX_IN_FOR_SECTION.get(s, np.inf) for s in sections])
+    return (np.asarray(sections)[:, None] >= min_section) & (ratings <= max_in[:, None])
+
+def dc_current_limits(sections):
+    """Largest current per section that isDcCableTooSmallForI accepts (inf where it has no limit)."""
+    return np.array([MAX_IDC_FOR_SECTION.get(s, np.inf) for s in sections])
+
+class Optimizer:
+    def __init__(self, cables=None):
+        self.catalog = cable_catalog(load_const('data/cables.ts', 'DEFAULT_CABLES') if cables is None else cables)
+        self.sections = {k: np.array([s for s, _ in v]) for k, v in self.catalog.items()}
+        self.ac_ok = {k: ac_protection_table(self.sections[k]) for k in ('ac-mono', 'ac-tri')}
+        self.dc_limit = dc_current_limits(self.sections['dc'])
+
+    def pick(self, kind, feasible, drop_pct):
+        """{'1%': cable, '3%': cable} for each row of feasible / drop_pct [run, section]."""
+        rows = [{} for _ in range(len(feasible))]
+        for t in THRESHOLDS:
+            ok = feasible & (drop_pct <= t)
+            first = ok.argmax(axis=1)
+            for r, j in enumerate(first):
+                rows[r][f'{t}%'] = self.cable(kind, j, drop_pct[r, j]) if ok[r, j] else None
+        return rows
+
+    def cable(self, kind, j, drop_pct):
+        section, c = self.catalog[kind][j]
+        return {'id': c['id'], 'description': c['description'], 'sectionMm2': section, 'dropPct': fixed(drop_pct, 2)}
+
+    def ac(self, links):
+        """links: [(totalPowerW, distanceM, threePhase)] -> [result or None]."""
+        out = [None] * len(links)
+        for kind, tri in (('ac-mono', False), ('ac-tri', True)):
+            rows = [r for r, (p, d, t) in enumerate(links) if t == tri and p > 0 and d > 0]
+            sections = self.sections[kind]
+            if not rows or not len(sections):
+                for r in rows:
+                    out[r] = {**link_fields(links[r]), 'currentA': None, 'breakerA': None, '1%': None, '3%': None}
+                continue
+            power = np.array([links[r][0] for r in rows], dtype=np.float64)
+            length = np.array([links[r][1] for r in rows], dtype=np.float64)
+            voltage = 400 if tri else 230
+            # calculateVoltageDropPercent, same operation order
+            current = power / (voltage * 1.732) if tri else power / voltage
+            lead = np.sqrt(3) * length if tri else 2 * length
+            drop_pct = ((lead * current * RHO)[:, None] / sections / voltage) * 100
+            breaker = np.array([ceil(i * 1.25) for i in current])
+            feasible = self.ac_ok[kind][:, np.minimum(breaker, MAX_BREAKER)].T
+            for r, i, b, picked in zip(rows, current, breaker, self.pick(kind, feasible, drop_pct)):
+                out[r] = {**link_fields(links[r]), 'currentA': fixed(i, 2), 'breakerA': int(b), **picked}
+        return out
+
+    def dc(self, current, vmp, length):
+        """Per MPPT row: {'1%': cable, '3%': cable}; rows without a length or a Vmp get None."""
+        sections = self.sections['dc']
+        valid = (length > 0) & (np.nan_to_num(vmp) > 0)
+        if not len(sections):
+            return [{'1%': None, '3%': None, 'skipped': NO_DC_SECTION} if ok else None for ok in valid]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drop_pct = ((2 * length[:, None] * current[:, None] * RHO) / sections / vmp[:, None]) * 100
+        feasible = valid[:, None] & (current[:, None] <= self.dc_limit)
+        return [picked if ok else None for ok, picked in zip(valid, self.pick('dc', feasible, drop_pct))]
+
+def link_fields(link):
+    return dict(zip(('powerW', 'distanceM', 'threePhase'), link))
+
+def ac_link(project):
+    power = sum(f['panels']['model']['power'] * panel_count(f['panels']) for f in project['fields'])
+    return power, num(project.get('distanceToPanel') or 0), project['inverterConfig'].get('phase') == 'Tri'
+
+def optimize(projects, inverters=None, cables=None, chunk=CHUNK, climates=None, optimizer=None):
+    """Yield one result dict per (origin, project), `chunk` projects at a time."""
+    optimizer = optimizer or Optimizer(cables)
+    climates = climates or ClimateIndex()
+    inverters = default_inverters() if inverters is None else inverters
+    pending = []
+    for item in projects:
+        pending.append(item)
+        if len(pending) >= chunk:
+            yield from optimize_chunk(pending, inverters, climates, optimizer)
+            pending = []
+    if pending:
+        yield from optimize_chunk(pending, inverters, climates, optimizer)
+
+def optimize_chunk(projects, inverters, climates, optimizer):
+    batch = Batch()
+    for origin, project in projects:
+        batch.add(project, inverters, origin)
+    ac = optimizer.ac([ac_link(p) for _, p in projects])
+    dc = {}
+    if batch.mppt['index']:
+        vmp, current, _, _ = batch.compute(climates)
+        length = np.asarray(batch.mppt['length'], dtype=np.float64)
+        for r, picked in enumerate(optimizer.dc(current, vmp, length)):
+            dc.setdefault(batch.mppt['project'][r], []).append({
+                'mpptIndex': batch.mppt['index'][r], 'lengthM': batch.mppt['length'][r],
+                'sectionMm2': batch.mppt['section'][r], 'currentA': current[r],
+                'vmpHot': None if np.isnan(vmp[r]) else vmp[r],
+                **(picked or {'1%': None, '3%': None}), 'missing': picked is None,
+            })
+    for k, ((origin, project), reason) in enumerate(zip(batch.projects, batch.reasons)):
+        yield {'file': origin, 'id': project.get('id'), 'name': project.get('name'),
+               'ac': ac[k], 'dcSkipped': reason, 'dc': dc.get(k, [])}
+
+def load_cables(path):
+    """Cable DB from a getAllData backup ('cables' replaces the defaults, as in the app)."""
+    backup = json.loads(pathlib.Path(path).read_text(encoding='utf-8'))
+    return backup.get('cables') or load_const('data/cables.ts', 'DEFAULT_CABLES')
+
+STANDARDS_HARNESS = TS_LOADER + r'''
+const s = load('services/standardsService.ts');
+const { calculateVoltageDropPercent } = load('services/calculatorService.ts');
+const { sections, breakers, currents, links } = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+fs.writeFileSync(out, JSON.stringify({
+  minSection: breakers.map(b => s.getMinSectionForIn(b)),
+  tooHigh: sections.map(x => breakers.map(b => s.isProtectionTooHighForSection(x, b))),
+  dcTooSmall: sections.map(x => currents.map(i => s.isDcCableTooSmallForI(x, i))),
+  drop: links.map(([p, d, t, x]) => calculateVoltageDropPercent(p, d, x, t)),
+}));
+'''
+
+def check_ts(optimizer, results):
+    """Compare the protection tables and the AC drops of results with standardsService / calculatorService."""
+    sections = sorted({float(s) for v in optimizer.sections.values() for s in v} | set(MAX_IN_FOR_SECTION) | set(MAX_IDC_FOR_SECTION))
+    breakers = list(range(MAX_BREAKER + 1))
+    currents = [i / 4 for i in range(4 * 100)]
+    links = [(r['ac']['powerW'], r['ac']['distanceM'], r['ac']['threePhase'], c['sectionMm2']) for r in results
+             for t in THRESHOLDS if (c := (r['ac'] or {}).get(f'{t}%'))]
+    with tempfile.TemporaryDirectory() as tmp:
+        inp, out = pathlib.Path(tmp) / 'in.json', pathlib.Path(tmp) / 'ts.json'
+        inp.write_text(json.dumps({'sections': sections, 'breakers': breakers, 'currents': currents, 'links': links}))
+        proc = subprocess.run(['node', '-e', STANDARDS_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        ts = json.loads(out.read_text())
+    mismatches = []
+    mismatches += [f'getMinSectionForIn({b})' for b, s in zip(breakers, ts['minSection']) if min_section_for_in(b) != s]
+    for x, row in zip(sections, ts['tooHigh']):
+        mismatches += [f'isProtectionTooHighForSection({x}, {b})' for b, v in zip(breakers, row)
+                       if v != (b > MAX_IN_FOR_SECTION.get(x, np.inf))]
+    for x, row in zip(sections, ts['dcTooSmall']):
+        mismatches += [f'isDcCableTooSmallForI({x}, {i})' for i, v in zip(currents, row)
+                       if v != (i > MAX_IDC_FOR_SECTION.get(x, np.inf))]
+    picked = [c['dropPct'] for r in results for t in THRESHOLDS if (c := (r['ac'] or {}).get(f'{t}%'))]
+    mismatches += [f'calculateVoltageDropPercent{link}' for link, got, want in zip(links, picked, ts['drop']) if got != fixed(want, 2)]
+    return mismatches
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('inputs', nargs='+', help='project JSON / NDJSON files or directories')
+    ap.add_argument('-o', '--out', help='one JSON line per project (default: stdout)')
+    ap.add_argument('--catalog', help='getAllData backup to take the inverter and cable catalogs from')
+    ap.add_argument('--chunk', type=int, default=CHUNK)
+    ap.add_argument('--check-ts', action='store_true', help='compare the rules and AC drops with the TS services through node')
+    args = ap.parse_args()
+    optimizer = Optimizer(load_cables(args.catalog) if args.catalog else None)
+    inverters = load_catalog(args.catalog) if args.catalog else None
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    counts = dict.fromkeys(['projects', 'ac links', 'dc runs', 'no cable within 3%', NO_DC_SECTION], 0)
+    kept = []
+    try:
+        for rec in optimize(read_projects(args.inputs), inverters, chunk=args.chunk, optimizer=optimizer):
+            counts['projects'] += 1
+            counts['ac links'] += rec['ac'] is not None
+            runs = [m for m in rec['dc'] if not m['missing'] and 'skipped' not in m]
+            counts['dc runs'] += len(runs)
+            counts[NO_DC_SECTION] += sum('skipped' in m for m in rec['dc'])
+            counts['no cable within 3%'] += sum(m['3%'] is None for m in runs) + (rec['ac'] is not None and rec['ac']['3%'] is None)
+            if args.check_ts:
+                kept.append(rec)
+            out.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(', '.join(f'{v} {k}' for k, v in counts.items()), file=sys.stderr)
+    if args.check_ts:
+        try:
+            bad = check_ts(optimizer, kept)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        for m in bad[:20]:
+            print('mismatch:', m, file=sys.stderr)
+        print(f'ts parity: {len(bad)} mismatches', file=sys.stderr)
+        sys.exit(1 if bad else 0)
@@ -0,0 +1,317 @@
+"""Incremental, streamed backups of the component catalogs.
+
+getAllData (services/firebase.ts) returns every catalog collection (k2,
+esdec, inverters, panels, boxes, cables) as one JSON object. importAllData
+takes the same object back and replaces each collection it holds. This tool
+keeps a chain of backups of such objects as NDJSON files with one record
+per line:
+
+    {"type": "snapshot", "version": 1, "kind": "full" | "delta", "id": ..., "parent": ..., "collections": [...]}
+    {"c": "panels", "k": "DM500", "h": <hash of v>, "p": <hash replaced or null>, "v": {...}}
+    {"c": "panels", "k": "OLD", "h": null, "p": <hash removed>}          (deletion)
+    {"type": "end", "id": ..., "records": n, "lines": <hash of the record lines>, "state": <catalog digest>}
+
+A full snapshot holds every record. A delta holds only the records added,
+changed or removed since the previous file of the chain, and each
+record names the hash it replaces. The state digest is the sum (mod
+2**256) of a hash per (collection, key, record hash). A delta therefore
+updates it from its own lines (subtract p, add h), and `verify` checks a
+whole chain in one streaming pass: header links, record hashes, line
+digests and state digests, with no catalog in memory.
+
+`restore` streams the chain once to find the file and offset of the
+live version of each key, then writes the importAllData object by reading
+those records back one at a time. Keys keep the order a JS object would
+give them: an updated key stays in place, a new or re-added key goes last.
+
+    python catalog_backup.py backup getAllData.json [--dir backups] [--full]
+    python catalog_backup.py restore -o importAllData.json [--upto <id>]
+    python catalog_backup.py verify
+    python catalog_backup.py list
+"""
+import os, sys, json, time, hashlib, argparse, pathlib, tempfile
+
+BACKUP_DIR = pathlib.Path(os.environ.get('CATALOG_BACKUP_DIR', 'catalog_backups'))
+VERSION = 1
+STATE_MOD = 1 << 256
+
+class ChainError(ValueError):
+    pass
+
+def dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def record_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def state_term(collection, key, h):
+    digest = hashlib.blake2b(f'{collection}\0{key}\0{h}'.encode('utf-8'), digest_size=32).digest()
+    return int.from_bytes(digest, 'big')
+
+class Writer:
+    """One backup file, written to a temp file and moved into place by close()."""
+    def __init__(self, directory, kind, parent, collections, state=0):
+        self.directory, self.kind, self.parent = pathlib.Path(directory), kind, parent
+        self.state, self.records, self.lines = state, 0, hashlib.blake2b(digest_size=16)
+        self.created = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        self.id = hashlib.blake2b(f'{parent}\0{self.created}\0{time.time_ns()}'.encode('utf-8'), digest_size=8).hexdigest()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        self.f = os.fdopen(fd, 'w', encoding='utf-8')
+        self.f.write(dump({'type': 'snapshot', 'version': VERSION, 'kind': kind, 'id': self.id, 'parent': parent,
+                           'created': self.created, 'collections': list(collections)}) + '\n')
+
+    def put(self, collection, key, text, prev=None):
+        """Record the value (as JSON text) of collection[key], replacing the record hashed prev."""
+        h = record_hash(text)
+        line = dump({'c': collection, 'k': key, 'h': h, 'p': prev})[:-1] + ',"v":' + text + '}'
+        self._line(line, collection, key, h, prev)
+
+    def delete(self, collection, key, prev):
+        self._line(dump({'c': collection, 'k': key, 'h': None, 'p': prev}), collection, key, None, prev)
+
+    def _line(self, line, collection, key, h, prev):
+        if prev is not None:
+            self.state = (self.state - state_term(collection, key, prev)) % STATE_MOD
+        if h is not None:
+            self.state = (self.state + state_term(collection, key, h)) % STATE_MOD
+        self.lines.update(line.encode('utf-8') + b'\n')
+        self.records += 1
+        self.f.write(line + '\n')
+
+    def close(self, seq):
+        try:
+            self.f.write(dump({'type': 'end', 'id': self.id, 'records': self.records,
+                               'lines': self.lines.hexdigest(), 'state': f'{self.state:064x}'}) + '\n')
+            self.f.close()
+            path = self.directory / f'{seq:05d}-{self.kind}-{self.id}.ndjson'
+            os.replace(self.tmp, path)
+        except BaseException:
+            self.f.close()
+            os.unlink(self.tmp)
+            raise
+        return path
+
+    def abort(self):
+        self.f.close()
+        os.unlink(self.tmp)
+
+def backup_files(directory=BACKUP_DIR):
+    return sorted(pathlib.Path(directory).glob('[0-9]*-*.ndjson'))
+
+def read_file(path, raw=False):
+    """Yield (offset, object) for every line of a backup file, or (offset, line bytes, object)."""
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                raise ChainError(f'{path.name}: line at byte {offset} is not JSON') from None
+            yield (offset, line, obj) if raw else (offset, obj)
+            offset += len(line)
+
+def header(path):
+    with open(path, encoding='utf-8') as f:
+        return json.loads(f.readline())
+
+def chain(directory=BACKUP_DIR, upto=None):
+    """The files to replay for `upto` (an id, default the latest): the last full snapshot before it, then its deltas."""
+    files = backup_files(directory)
+    if upto is not None:
+        ends = [i for i, p in enumerate(files) if header(p)['id'] == upto]
+        if not ends:
+            raise ChainError(f'no backup with id {upto}')
+        files = files[:ends[0] + 1]
+    start = max((i for i, p in enumerate(files) if header(p)['kind'] == 'full'), default=None)
+    if start is None:
+        if files:
+            raise ChainError('no full snapshot to start the chain from')
+        return []
+    return files[start:]
+
+def index(files):
+    """(state, collections, {collection: {key: (hash, file, offset)}}) after replaying files, values left on disk."""
+    live, collections, state = {}, [], 0
+    for path in files:
+        for offset, obj in read_file(path):
+            if obj.get('type') == 'snapshot':
+                collections = obj['collections']
+            elif obj.get('type') == 'end':
+                state = int(obj['state'], 16)
+            elif obj['h'] is None:
+                live.get(obj['c'], {}).pop(obj['k'], None)
+            else:
+                # like a JS object: an update keeps the key's place, a deleted key comes back last
+                live.setdefault(obj['c'], {})[obj['k']] = (obj['h'], path, offset)
+    return state, collections, live
+
+def backup(source, directory=BACKUP_DIR, full=False):
+    """Write a delta against the latest backup (or a full snapshot); returns its path, or None if nothing changed."""
+    data = json.loads(pathlib.Path(source).read_text(encoding='utf-8'))
+    if not isinstance(data, dict) or not all(isinstance(v, dict) for v in data.values() if v is not None):
+        raise ChainError(f'{source}: not a getAllData object ({{collection: {{key: component}}}})')
+    # an empty collection is kept: importAllData clears the stored one when given {}
+    collections = [c for c, v in data.items() if v is not None]
+    files = [] if full else chain(directory)
+    existing = backup_files(directory)
+    seq = int(existing[-1].name.split('-')[0]) + 1 if existing else 1
+    if not files:
+        w = Writer(directory, 'full', None, collections)
+        try:
+            for c in collections:
+                for k, v in data[c].items():
+                    w.put(c, k, dump(v))
+        except BaseException:
+            w.abort()
+            raise
+        return w.close(seq)
+    state, previous, live = index(files)
+    w = Writer(directory, 'delta', header(files[-1])['id'], collections, state)
+    try:
+        for c in collections:
+            old = live.get(c, {})
+            # keys keep their place up to the first one out of the old order; from there on
+            # each key is re-added (deleted first if it exists) so the replay ends in the source order
+            place, last, stay = {k: i for i, k in enumerate(old)}, -1, 0
+            for k in data[c]:
+                if place.get(k, -1) <= last:
+                    break
+                last, stay = place[k], stay + 1
+            for i, (k, v) in enumerate(data[c].items()):
+                text = dump(v)
+                prev = old[k][0] if k in old else None
+                if i >= stay and prev is not None:
+                    w.delete(c, k, prev)
+                    prev = None
+                if prev != record_hash(text):
+                    w.put(c, k, text, prev)
+        for c, old in live.items():
+            gone = data.get(c) or {}
+            for k, (h, _, _) in old.items():
+                if k not in gone:
+                    w.delete(c, k, h)
+    except BaseException:
+        w.abort()
+        raise
+    if w.records == 0 and previous == collections:
+        w.abort()
+        return None
+    return w.close(seq)
+
+def restore(out, directory=BACKUP_DIR, upto=None):
+    """Write the importAllData object of a backup to the text stream out; returns the record count."""
+    files = chain(directory, upto)
+    if not files:
+        raise ChainError(f'no backups in {directory}')
+    _, collections, live = index(files)
+    handles, n = {}, 0
+    try:
+        out.write('{')
+        for i, c in enumerate(collections):
+            out.write(('' if i == 0 else ',') + '\n' + dump(c) + ': {')
+            for j, (k, (h, path, offset)) in enumerate(live.get(c, {}).items()):
+                f = handles.get(path) or handles.setdefault(path, open(path, 'rb'))
+                f.seek(offset)
+                rec = json.loads(f.readline())
+                text = dump(rec['v'])
+                if record_hash(text) != h:
+                    raise ChainError(f'{path.name}: record {c}/{k} does not match its hash')
+                out.write(('' if j == 0 else ',') + '\n  ' + dump(k) + ': ' + text)
+                n += 1
+            out.write('\n}')
+        out.write('\n}\n')
+    finally:
+        for f in handles.values():
+            f.close()
+    return n
+
+def verify(directory=BACKUP_DIR):
+    """Check every file of the directory in one streaming pass; returns [(file, problem)]."""
+    problems, parent, state = [], None, 0
+    for path in backup_files(directory):
+        head, end, records, lines = None, None, 0, hashlib.blake2b(digest_size=16)
+        try:
+            for _, line, obj in read_file(path, raw=True):
+                if head is None:
+                    head = obj
+                    if obj.get('type') != 'snapshot' or obj.get('version') != VERSION:
+                        raise ChainError('does not start with a snapshot header')
+                    if obj['kind'] == 'full':
+                        state = 0
+                    elif obj['parent'] != parent:
+                        problems.append((path.name, f'parent {obj["parent"]} is not the previous backup {parent}'))
+                    continue
+                if end is not None:
+                    raise ChainError('lines after the end record')
+                if obj.get('type') == 'end':
+                    end = obj
+                    continue
+                if head['kind'] == 'full' and obj['p'] is not None:
+                    problems.append((path.name, f'full snapshot record {obj["c"]}/{obj["k"]} replaces a hash'))
+                if obj['h'] is not None and record_hash(dump(obj['v'])) != obj['h']:
+                    problems.append((path.name, f'record {obj["c"]}/{obj["k"]} does not match its hash'))
+                if obj['p'] is not None:
+                    state = (state - state_term(obj['c'], obj['k'], obj['p'])) % STATE_MOD
+                if obj['h'] is not None:
+                    state = (state + state_term(obj['c'], obj['k'], obj['h'])) % STATE_MOD
+                lines.update(line)
+                records += 1
+            if head is None or end is None:
+                raise ChainError('truncated (no end record)')
+        except (ChainError, KeyError, TypeError) as e:
+            problems.append((path.name, str(e).removeprefix(f'{path.name}: ') if isinstance(e, ChainError) else f'malformed record ({e!r})'))
+            parent = None
+            continue
+        if end['id'] != head['id']:
+            problems.append((path.name, 'end record id differs from the header'))
+        if end['records'] != records:
+            problems.append((path.name, f'{records} records, end record says {end["records"]}'))
+        if end['lines'] != lines.hexdigest():
+            problems.append((path.name, 'line digest mismatch'))
+        if end['state'] != f'{state:064x}':
+            problems.append((path.name, 'catalog digest mismatch (a delta does not apply to its parent)'))
+        parent = head['id']
+    return problems
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('command', choices=('backup', 'restore', 'verify', 'list'))
+    ap.add_argument('source', nargs='?', help='getAllData JSON to back up (backup)')
+    ap.add_argument('--dir', default=BACKUP_DIR, type=pathlib.Path, help='backup directory (default: $CATALOG_BACKUP_DIR or %(default)s)')
+    ap.add_argument('--full', action='store_true', help='write a full snapshot even if a chain exists (backup)')
+    ap.add_argument('--upto', help='restore the catalog as of this backup id (default: the latest)')
+    ap.add_argument('-o', '--out', help='importAllData JSON to write (restore; default: stdout)')
+    args = ap.parse_args()
+    try:
+        if args.command == 'backup':
+            if not args.source:
+                ap.error('backup needs the getAllData JSON')
+            path = backup(args.source, args.dir, args.full)
+            print(f'wrote {path}' if path else 'no change since the last backup', file=sys.stderr)
+        elif args.command == 'restore':
+            if args.out:
+                fd, tmp = tempfile.mkstemp(dir=pathlib.Path(args.out).resolve().parent, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        n = restore(f, args.dir, args.upto)
+                    os.replace(tmp, args.out)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            else:
+                n = restore(sys.stdout, args.dir, args.upto)
+            print(f'{n} records restored', file=sys.stderr)
+        elif args.command == 'verify':
+            problems = verify(args.dir)
+            for name, problem in problems:
+                print(f'{name}: {problem}')
+            print(f'{len(backup_files(args.dir))} backup(s), {len(problems)} problem(s)', file=sys.stderr)
+            sys.exit(1 if problems else 0)
+        else:
+            for path in backup_files(args.dir):
+                for _, obj in read_file(path):
+                    if obj.get('type') == 'end':
+                        print(f'{path.name}\t{obj["records"]} record(s)')
+    except ChainError as e:
+        raise SystemExit(str(e))
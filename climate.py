@@ -0,0 +1,63 @@
+"""Python ports of getLocationClimate (services/climateService.ts) and
+getWindZone (services/windZoneService.ts).
+
+The lookup tables are read from the TS sources themselves, so the ports
+follow any edit to the department tables without a copy to keep in sync.
+"""
+import math
+
+from js_compat import js_str
+from ts_literals import load_const, load_enum
+
+CLIMATE_TS = 'services/climateService.ts'
+WIND_TS = 'services/windZoneService.ts'
+
+BASE_TEMP_BY_DEPT = load_const(CLIMATE_TS, 'BASE_TEMP_BY_DEPT')
+COASTAL_EXCEPTIONS_MAP = load_const(CLIMATE_TS, 'COASTAL_EXCEPTIONS_MAP')
+DEPARTMENT_TO_WIND_ZONE = load_const(WIND_TS, 'departmentToWindZone')
+WIND_ZONE = load_enum('types.ts', 'WindZone')
+
+def base_temperature(postal_code):
+    """(sea-level base temperature, label origin) for a postal code of 2+ characters."""
+    prefix2, prefix3 = postal_code[:2], postal_code[:3]
+    if postal_code.startswith('97'):
+        return BASE_TEMP_BY_DEPT.get(prefix3) or 15, f'Outre-mer {prefix3}'
+    if postal_code in COASTAL_EXCEPTIONS_MAP:
+        return COASTAL_EXCEPTIONS_MAP[postal_code], 'Zone Côtière/Ile'
+    if postal_code.startswith('20'):
+        return -2, 'Corse'
+    return BASE_TEMP_BY_DEPT.get(prefix2, -10), f'Dept {prefix2}'
+
+def altitude_penalty(altitude):
+    """-1°C per started 200 m step above 200 m."""
+    return math.ceil((altitude - 200) / 200) if altitude is not None and altitude > 200 else 0
+
+def max_ambient(base_temp):
+    t_max = 35
+    if base_temp >= -5:
+        t_max = 38
+    if base_temp <= -15:
+        t_max = 30
+    return t_max
+
+def location_climate(postal_code, altitude=0):
+    """getLocationClimate(postalCode, altitude)."""
+    if not postal_code or len(postal_code) < 2:
+        return {'tempMin': -10, 'tempMaxAmb': 35, 'label': 'Standard (Défaut)'}
+    base, origin = base_temperature(postal_code)
+    penalty = altitude_penalty(altitude)
+    return {
+        'tempMin': base - penalty,
+        'tempMaxAmb': max_ambient(base),
+        'label': f'{origin} (Base {js_str(base)}°C) @ {js_str(altitude)}m',
+        'altitudePenalty': penalty,
+    }
+
+def wind_zone(postal_code):
+    """getWindZone(postalCode)."""
+    if not postal_code or len(postal_code) < 2:
+        return WIND_ZONE['ZONE_1']
+    if postal_code.upper().startswith(('2A', '2B')):
+        return WIND_ZONE['ZONE_4']
+    return (DEPARTMENT_TO_WIND_ZONE.get(postal_code[:3]) or DEPARTMENT_TO_WIND_ZONE.get(postal_code[:2])
+            or WIND_ZONE['ZONE_1'])
@@ -0,0 +1,286 @@
+"""Compiled postal-code index for the climate and wind-zone lookups.
+
+getLocationClimate and getWindZone walk a chain of prefix tables on every
+call (DOM-TOM prefix3, coastal exceptions, Corsica, prefix2). The answer
+only depends on the postal code, except for the altitude penalty, so this
+module evaluates the chain once for every 5-digit code and stores the
+results as flat columns in one binary file:
+
+    header   magic, hash of the TS sources, code count, zone names
+    base     int8   sea-level base temperature
+    tmax     int8   tempMaxAmb
+    zone     uint8  index into the zone names
+    origin   uint8  which rule picked the base temperature (for the label)
+
+The file is mapped read-only, a lookup is one array read, and the altitude
+penalty is applied to whole arrays at once. Codes that are not five ASCII
+digits (empty, '2A004', ...) go through the climate.py port. The index is
+rebuilt whenever services/climateService.ts, services/windZoneService.ts or
+types.ts change.
+
+    python climate_index.py compile
+    python climate_index.py check          # index against the Python port, every code
+    python climate_index.py check --ts     # and against the TS functions through node
+    python climate_index.py fixture        # refresh the TS answers pinned by the tests (node)
+"""
+import os, sys, json, mmap, struct, hashlib, argparse, pathlib, tempfile, subprocess
+
+import numpy as np
+
+import climate
+from js_compat import js_str
+from ts_literals import ROOT
+
+INDEX_PATH = pathlib.Path(os.environ.get('CLIMATE_INDEX', pathlib.Path.home() / '.cache' / 'climate_index.bin'))
+SOURCES = (climate.CLIMATE_TS, climate.WIND_TS, 'types.ts')
+CODES = 100000
+MAGIC = b'PVCLIM01'
+HEADER = struct.Struct('<8s16sLL')
+COLUMNS = (('base', np.int8), ('tmax', np.int8), ('zone', np.uint8), ('origin', np.uint8))
+DEPT, OVERSEAS, COASTAL, CORSICA = range(4)
+ORIGINS = {'Dept': DEPT, 'Outre-mer': OVERSEAS, 'Zone Côtière/Ile': COASTAL, 'Corse': CORSICA}
+ALTITUDES = (None, 0, 1, 150, 200, 200.5, 201, 399, 400, 401, 1000, 1901, 2500, 4807)
+
+def sources_digest():
+    return hashlib.blake2b(b'\0'.join((ROOT / p).read_bytes() for p in SOURCES), digest_size=16).digest()
+
+def code_key(code):
+    """Row of a postal code in the index, or -1 when the port has to answer."""
+    if isinstance(code, str) and len(code) == 5 and code.isascii() and code.isdigit():
+        return int(code)
+    return -1
+
+def origin_label(origin, code):
+    if origin == DEPT:
+        return f'Dept {code[:2]}'
+    if origin == OVERSEAS:
+        return f'Outre-mer {code[:3]}'
+    return 'Zone Côtière/Ile' if origin == COASTAL else 'Corse'
+
+def altitude_penalties(altitudes):
+    """altitude_penalty over an array (None / NaN count as no penalty)."""
+    alt = np.asarray(altitudes, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return np.where(alt > 200, np.ceil((alt - 200) / 200), 0).astype(np.int64)
+
+def compile_index(path=INDEX_PATH):
+    zones = list(climate.WIND_ZONE.values())
+    cols = {name: np.empty(CODES, dtype=dt) for name, dt in COLUMNS}
+    for i in range(CODES):
+        code = f'{i:05d}'
+        base, origin = climate.base_temperature(code)
+        cols['base'][i] = base
+        cols['tmax'][i] = climate.max_ambient(base)
+        cols['zone'][i] = zones.index(climate.wind_zone(code))
+        cols['origin'][i] = ORIGINS[origin.rsplit(' ', 1)[0] if origin.startswith(('Dept ', 'Outre-mer ')) else origin]
+    names = json.dumps(zones).encode('utf-8')
+    names += b' ' * (-(HEADER.size + len(names)) % 8)
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.' + path.name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sources_digest(), CODES, len(names)))
+            f.write(names)
+            for name, _ in COLUMNS:
+                f.write(cols[name].tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+class ClimateIndex:
+    """Read-only mapping of a compiled index; rebuilds it when the TS tables changed."""
+    def __init__(self, path=INDEX_PATH, rebuild=True):
+        path = pathlib.Path(path)
+        if not self._current(path):
+            if not rebuild:
+                raise ValueError(f'{path}: missing or out of date, run `python climate_index.py compile`')
+            compile_index(path)
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, count, names_len = HEADER.unpack_from(self.map)
+        self.zones = json.loads(self.map[HEADER.size:HEADER.size + names_len])
+        offset = HEADER.size + names_len
+        for name, dt in COLUMNS:
+            setattr(self, name, np.frombuffer(self.map, dtype=dt, count=count, offset=offset))
+            offset += count * np.dtype(dt).itemsize
+
+    @staticmethod
+    def _current(path):
+        try:
+            with open(path, 'rb') as f:
+                magic, source, count, _ = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return False
+        return magic == MAGIC and source == sources_digest() and count == CODES
+
+    def location_climate(self, postal_code, altitude=0):
+        """Same result as climate.location_climate / getLocationClimate."""
+        i = code_key(postal_code)
+        if i < 0:
+            return climate.location_climate(postal_code, altitude)
+        base = int(self.base[i])
+        penalty = climate.altitude_penalty(altitude)
+        return {
+            'tempMin': base - penalty,
+            'tempMaxAmb': int(self.tmax[i]),
+            'label': f'{origin_label(self.origin[i], postal_code)} (Base {base}°C) @ {js_str(altitude)}m',
+            'altitudePenalty': penalty,
+        }
+
+    def wind_zone(self, postal_code):
+        i = code_key(postal_code)
+        return self.zones[self.zone[i]] if i >= 0 else climate.wind_zone(postal_code)
+
+    def climates(self, postal_codes, altitudes=None):
+        """Vectorised lookup: (tempMin, tempMaxAmb, wind zone index) arrays for parallel sequences."""
+        keys = np.fromiter((code_key(c) for c in postal_codes), dtype=np.int64)
+        known = keys >= 0
+        rows = np.where(known, keys, 0)
+        base, tmax, zone = self.base[rows].astype(np.int64), self.tmax[rows].astype(np.int64), self.zone[rows].astype(np.int64)
+        if not known.all():
+            zones = {z: k for k, z in enumerate(self.zones)}
+            for j in np.flatnonzero(~known):
+                code = postal_codes[j]
+                if not code or len(code) < 2:
+                    base[j], tmax[j] = -10, 35  # default climate; no penalty applies either
+                else:
+                    base[j] = climate.base_temperature(code)[0]
+                    tmax[j] = climate.max_ambient(base[j])
+                zone[j] = zones[climate.wind_zone(code)]
+        temp_min = base.copy()
+        if altitudes is not None:
+            penalty = altitude_penalties([np.nan if a is None else a for a in altitudes])
+            applies = np.fromiter((bool(c) and len(c) >= 2 for c in postal_codes), dtype=bool)
+            temp_min -= np.where(applies, penalty, 0)
+        return temp_min, tmax, zone
+
+def check_port(index):
+    """Compare the index with the Python port for every code and a range of altitudes."""
+    mismatches = 0
+    for i in range(CODES):
+        code = f'{i:05d}'
+        for alt in ALTITUDES:
+            if index.location_climate(code, alt) != climate.location_climate(code, alt):
+                mismatches += 1
+        if index.wind_zone(code) != climate.wind_zone(code):
+            mismatches += 1
+    # the vectorised path, one altitude at a time over every code
+    codes = [f'{i:05d}' for i in range(CODES)]
+    expected_zone = np.array([index.zones.index(climate.wind_zone(c)) for c in codes])
+    for alt in ALTITUDES:
+        temp_min, tmax, zone = index.climates(codes, [alt] * CODES)
+        ref = [climate.location_climate(c, alt) for c in codes]
+        mismatches += int(np.count_nonzero(temp_min != [r['tempMin'] for r in ref]))
+        mismatches += int(np.count_nonzero(tmax != [r['tempMaxAmb'] for r in ref]))
+        mismatches += int(np.count_nonzero(zone != expected_zone))
+    return mismatches
+
+# loads a .ts file of the repo (and its relative imports) through the typescript package
+TS_LOADER = r'''
+const fs = require('fs'), path = require('path'), Module = require('module');
+const [root, out] = process.argv.slice(1);
+const ts = require(require.resolve('typescript', { paths: [root] }));
+const load = (file) => {
+  const src = fs.readFileSync(path.join(root, file), 'utf8');
+  const js = ts.transpileModule(src, { compilerOptions: { module: ts.ModuleKind.CommonJS, target: ts.ScriptTarget.ES2020 } }).outputText;
+  const m = new Module(path.join(root, file), module);
+  m.filename = path.join(root, file);
+  m.paths = Module._nodeModulePaths(path.dirname(m.filename));
+  m.require = (id) => id.startsWith('.') ? load(path.relative(root, path.join(path.dirname(m.filename), id)) + '.ts') : require(id);
+  new Function('exports', 'require', 'module', js)(m.exports, m.require, m);
+  return m.exports;
+};
+'''
+TS_HARNESS = TS_LOADER + r'''
+const { getLocationClimate } = load('services/climateService.ts');
+const { getWindZone } = load('services/windZoneService.ts');
+const lines = [];
+for (const [code, altitudes] of JSON.parse(fs.readFileSync(process.argv[3], 'utf8'))) {
+  lines.push(JSON.stringify([code, altitudes, altitudes.map(a => getLocationClimate(code, a === null ? undefined : a)), getWindZone(code)]));
+}
+fs.writeFileSync(out, lines.join('\n'));
+'''
+EXTRA_CODES = ('', '7', '20', '2A004', '2b200', '97', '971', '97150', '20000', 'abcde', '830000', ' 83400')
+FIXTURE = ROOT / 'tests' / 'fixtures' / 'climate_ts.ndjson'
+
+def run_ts(cases):
+    """[(code, altitudes)] -> [(code, altitudes, climates, wind zone)] from the TS functions (node + typescript)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out, inp = pathlib.Path(tmp) / 'ts.ndjson', pathlib.Path(tmp) / 'in.json'
+        inp.write_text(json.dumps(cases), encoding='utf-8')
+        proc = subprocess.run(['node', '-e', TS_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        with open(out, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+def compare(index, results):
+    """Mismatches between the index and TS results of run_ts."""
+    mismatches = 0
+    for code, altitudes, climates, zone in results:
+        for alt, expected in zip(altitudes, climates):
+            # undefined altitude takes the TS default of 0
+            got = index.location_climate(code, 0 if alt is None else alt)
+            if got != expected:
+                mismatches += 1
+                print(f'{code!r} @ {alt}: index {got} != ts {expected}', file=sys.stderr)
+        if index.wind_zone(code) != zone:
+            mismatches += 1
+            print(f'{code!r}: index {index.wind_zone(code)} != ts {zone}', file=sys.stderr)
+    return mismatches
+
+def check_ts(index):
+    """Compare the index with the TS functions themselves (needs node and the typescript package)."""
+    codes = list(EXTRA_CODES) + [f'{i:05d}' for i in range(CODES)]
+    return compare(index, run_ts([(code, ALTITUDES) for code in codes]))
+
+def fixture_cases():
+    """The codes pinned by the tests: four per department prefix, every coastal
+    exception, wind-zone prefix, Corsica and overseas code, and the fallbacks.
+    The full altitude range is only swept for a few of them."""
+    codes = [f'{d:02d}{s}' for d in range(100) for s in ('000', '100', '500', '999')]
+    codes += list(climate.COASTAL_EXCEPTIONS_MAP)
+    codes += [k.ljust(5, '0') for k in climate.DEPARTMENT_TO_WIND_ZONE] + [k.ljust(5, '9') for k in climate.DEPARTMENT_TO_WIND_ZONE]
+    codes += ['20090', '20137', '20600', '2A000', '2a004', '2B200', '2b', '2A']
+    codes += [f'97{d}{s}' for d in range(10) for s in ('00', '50')] + ['97', '971', '9']
+    codes += list(EXTRA_CODES) + ['00000', '99999', '1', 'AB123', '830001']
+    sweep = {'83400', '06000', '74400', '05000', '20000', '97100', '00000', ''}
+    codes = list(dict.fromkeys(codes))
+    return [(code, ALTITUDES if code in sweep else (None, 0, 401, 1901)) for code in codes]
+
+def write_fixture(path=FIXTURE):
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [json.dumps(r, ensure_ascii=False) for r in run_ts(fixture_cases())]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return len(lines)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('command', choices=('compile', 'check', 'fixture'))
+    ap.add_argument('--index', default=INDEX_PATH, type=pathlib.Path)
+    ap.add_argument('--ts', action='store_true', help='also compare with the TS functions through node')
+    args = ap.parse_args()
+    if args.command == 'compile':
+        print('compiled', compile_index(args.index))
+        sys.exit()
+    if args.command == 'fixture':
+        try:
+            print(f'{write_fixture()} codes written to {FIXTURE}')
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        sys.exit()
+    index = ClimateIndex(args.index)
+    bad = check_port(index)
+    print(f'port parity: {CODES} codes x {len(ALTITUDES)} altitudes, {bad} mismatches')
+    if args.ts:
+        try:
+            bad_ts = check_ts(index)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(f'ts parity: {CODES + len(EXTRA_CODES)} codes x {len(ALTITUDES)} altitudes, {bad_ts} mismatches')
+        bad += bad_ts
+    sys.exit(1 if bad else 0)
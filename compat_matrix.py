@@ -0,0 +1,355 @@
+"""Precomputed string-compatibility matrix: panel × inverter × climate × string length.
+
+checkElectricalCompatibility (services/compatibilityService.ts) works out
+one panel / inverter / climate combination per call. This module runs the
+same formulas for every panel of data/panels.ts, every inverter of
+data/inverters.ts, every climate band and string lengths 1..MAX_STRING in
+a few NumPy broadcasts, and stores the result as flat columns in one
+binary file:
+
+    header    magic, hash of the TS sources, axis sizes, axes (JSON)
+    voc_cold  float64 [panel, climate, n]   string Voc at tempMin
+    vmp_hot   float64 [panel, climate, n]   string Vmp at tempMaxAmb + 35 °C
+    vmp_cold  float64 [panel, climate, n]   string Vmp at tempMin
+    flags     uint8   [panel, inverter, climate, n]
+    dc_ac     float64 [panel, inverter, n]  DC/AC ratio of one string
+    rcd       uint8   [inverter]            index into 'AFB'
+
+The flags are the checks of the report: VOLTAGE (Voc cold above the max
+input voltage, an error), CURRENT (Isc above the max input current,
+isCurrentError) and MPPT_LOW (Vmp hot below the MPPT window,
+isMpptWarning), plus MPPT_HIGH (Vmp cold above maxMpptVoltage, the top of
+the window, which the report does not check) and NOT_STRING (a micro
+inverter takes one panel per input, so only n = 1 applies; its other
+flags follow the micro branch of the report).
+
+A climate band is a (tempMin, tempMaxAmb) pair. tempMin covers every whole
+degree from the coldest base temperature of climateService minus the
+largest altitude penalty up to the warmest base. tempMaxAmb takes the
+values max_ambient gives. The file is mapped read-only, so a query is a
+slice of the flags. It is rebuilt whenever the panel, inverter or climate
+tables change.
+
+    python compat_matrix.py compile
+    python compat_matrix.py query --power 500 -n 11 --tmin -14
+    python compat_matrix.py query --panel 'DMEGC DM500M10RT-B60HBT' -n 11 --postal-code 05100 --altitude 1300
+    python compat_matrix.py check --ts      # against checkElectricalCompatibility through node
+    python compat_matrix.py fixture         # refresh the TS answers pinned by the tests (node)
+"""
+import os, sys, json, mmap, random, struct, hashlib, argparse, pathlib, tempfile, subprocess
+
+import numpy as np
+
+import climate
+from climate_index import TS_LOADER
+from js_compat import fixed, truthy
+from ts_literals import ROOT, load_module
+
+INDEX_PATH = pathlib.Path(os.environ.get('COMPAT_MATRIX', pathlib.Path.home() / '.cache' / 'compat_matrix.bin'))
+SOURCES = ('data/panels.ts', 'data/inverters.ts', climate.CLIMATE_TS, 'services/compatibilityService.ts')
+MAGIC = b'PVCOMP01'
+HEADER = struct.Struct('<8s16s5L')
+MAX_STRING = 30
+MAX_ALTITUDE = 4807  # m, the altitude penalty is worst at the top of Mont Blanc
+DEFAULT_TEMP_COEFF_VOC = -0.26
+VOLTAGE, CURRENT, MPPT_LOW, MPPT_HIGH, NOT_STRING = 1, 2, 4, 8, 16
+ERRORS = VOLTAGE | CURRENT | NOT_STRING
+RCD_TYPES = 'AFB'
+
+def sources_digest():
+    return hashlib.blake2b(b'\0'.join((ROOT / p).read_bytes() for p in SOURCES), digest_size=16).digest()
+
+def panels():
+    data = load_module('data/panels.ts')
+    return data['DMEGC_PANELS'] + [data['GENERIC_PANEL']]
+
+def inverters():
+    """Every component of data/inverters.ts with input specs, in file order, once per id."""
+    found = {}
+    for value in load_module('data/inverters.ts').values():
+        for c in [value] if 'id' in value else value.values():
+            if (c.get('electrical') or {}).get('maxInputVoltage') is not None:
+                found.setdefault(c['id'], c)
+    return list(found.values())
+
+def climate_bands():
+    """[(tempMin, tempMaxAmb)] covering every band getLocationClimate can return, and its default."""
+    bases = (set(climate.BASE_TEMP_BY_DEPT.values()) | set(climate.COASTAL_EXCEPTIONS_MAP.values())
+             | {-2, 15, -10})  # Corsica, overseas fallback, default
+    coldest = min(bases) - climate.altitude_penalty(MAX_ALTITUDE)
+    maxima = sorted({climate.max_ambient(b) for b in bases} | {35})
+    return [(t, m) for t in range(coldest, max(bases) + 1) for m in maxima]
+
+def rcd_type(inv):
+    """The RCD type checkElectricalCompatibility reports."""
+    if inv['electrical']['maxInputVoltage'] < 100:
+        return 'F'
+    return 'B' if any(k in inv['id'] for k in ('H1', 'H3', 'KH', 'P3')) else 'F'
+
+def compute(panel_list, inverter_list, bands, max_string=MAX_STRING):
+    """The matrix columns as arrays (see the module docstring for their shapes)."""
+    spec = lambda key: np.array([float(p['electrical'][key]) for p in panel_list])
+    voc, vmp, isc = spec('voc'), spec('vmp'), spec('isc')
+    coeff = np.array([p['electrical'].get('tempCoeffVoc') if truthy(p['electrical'].get('tempCoeffVoc'))
+                      else DEFAULT_TEMP_COEFF_VOC for p in panel_list])[:, None, None]
+    power = np.array([float(p['power']) for p in panel_list])[:, None, None]
+    # a missing limit fails no comparison in JS (x > undefined is false), and neither does NaN
+    inv = lambda key: np.array([np.nan if i['electrical'].get(key) is None else float(i['electrical'][key]) for i in inverter_list])
+    vmax, vmin_mppt, vmax_mppt, imax = inv('maxInputVoltage'), inv('minMpptVoltage'), inv('maxMpptVoltage'), inv('maxInputCurrent')
+    micro = vmax < 100
+    t_min = np.array([b[0] for b in bands], dtype=np.float64)[None, :, None]
+    t_cell = np.array([b[1] for b in bands], dtype=np.float64)[None, :, None] + 35
+    n = np.arange(1, max_string + 1, dtype=np.float64)[None, None, :]
+    # same operation order as compatibilityService, so the values match bit for bit
+    voc_cold_panel = voc[:, None, None] * (1 + (coeff / 100) * (t_min - 25))
+    voc_cold = voc_cold_panel * n
+    vmp_hot = vmp[:, None, None] * (1 + (coeff / 100) * (t_cell - 25)) * n
+    vmp_cold = vmp[:, None, None] * (1 + (coeff / 100) * (t_min - 25)) * n
+    shape = (len(panel_list), len(inverter_list), len(bands), max_string)
+    at = lambda a: a[:, None]                      # [panel, climate, n] -> [panel, 1, climate, n]
+    per_inv = lambda a: a[None, :, None, None]     # [inverter] -> [1, inverter, 1, 1]
+    flags = np.zeros(shape, dtype=np.uint8)
+    flags |= np.where(at(voc_cold) > per_inv(vmax), VOLTAGE, 0).astype(np.uint8)
+    flags |= np.where(isc[:, None, None, None] > per_inv(imax), CURRENT, 0).astype(np.uint8)
+    flags |= np.where(at(vmp_hot) < per_inv(vmin_mppt), MPPT_LOW, 0).astype(np.uint8)
+    flags |= np.where(at(vmp_cold) > per_inv(vmax_mppt), MPPT_HIGH, 0).astype(np.uint8)
+    # micro inverters: one panel per input, and only the panel's cold Voc is checked
+    micro_flags = np.where(voc_cold_panel[:, None] > per_inv(vmax), VOLTAGE, 0).astype(np.uint8)
+    micro_flags = np.broadcast_to(micro_flags, shape) | np.where(n[None] > 1, NOT_STRING, 0).astype(np.uint8)
+    flags = np.where(per_inv(micro), micro_flags, flags)
+    ac = np.array([float(i['electrical'].get('maxAcPower') or 0) for i in inverter_list])
+    ac_central = np.array([float(i['electrical'].get('maxAcPower') or i.get('power') or 0) for i in inverter_list])
+    inputs = np.array([float(i['electrical'].get('mpptCount') or 1) for i in inverter_list])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        central = np.where(ac_central > 0, (power * n[0]) / ac_central[None, :, None], 0.0)
+        micro_ratio = np.where(ac > 0, (power * inputs[None, :, None]) / ac[None, :, None], 0.0)
+    dc_ac = np.where(micro[None, :, None], np.broadcast_to(micro_ratio, central.shape), central)
+    rcd = np.array([RCD_TYPES.index(rcd_type(i)) for i in inverter_list], dtype=np.uint8)
+    return {'voc_cold': voc_cold, 'vmp_hot': vmp_hot, 'vmp_cold': vmp_cold, 'flags': flags, 'dc_ac': dc_ac, 'rcd': rcd}
+
+COLUMNS = (('voc_cold', np.float64, 'pcn'), ('vmp_hot', np.float64, 'pcn'), ('vmp_cold', np.float64, 'pcn'),
+           ('flags', np.uint8, 'picn'), ('dc_ac', np.float64, 'pin'), ('rcd', np.uint8, 'i'))
+
+def compile_matrix(path=INDEX_PATH, max_string=MAX_STRING):
+    panel_list, inverter_list, bands = panels(), inverters(), climate_bands()
+    cols = compute(panel_list, inverter_list, bands, max_string)
+    axes = json.dumps({
+        'panels': [{'name': p['name'], 'power': p['power']} for p in panel_list],
+        'inverters': [{'id': i['id'], 'description': i['description'], 'power': i.get('power'),
+                       'electrical': i['electrical']} for i in inverter_list],
+        'climates': bands,
+    }, ensure_ascii=False).encode('utf-8')
+    axes += b' ' * (-(HEADER.size + len(axes)) % 8)
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.' + path.name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sources_digest(), len(panel_list), len(inverter_list), len(bands), max_string, len(axes)))
+            f.write(axes)
+            for name, dt, _ in COLUMNS:
+                data = np.ascontiguousarray(cols[name], dtype=dt).tobytes()
+                f.write(data + b'\0' * (-len(data) % 8))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+class CompatMatrix:
+    """Read-only mapping of a compiled matrix; rebuilds it when the TS tables changed."""
+    def __init__(self, path=INDEX_PATH, rebuild=True, max_string=MAX_STRING):
+        path = pathlib.Path(path)
+        if not self._current(path, max_string):
+            if not rebuild:
+                raise ValueError(f'{path}: missing or out of date, run `python compat_matrix.py compile`')
+            compile_matrix(path, max_string)
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, p, i, c, n, axes_len = HEADER.unpack_from(self.map)
+        axes = json.loads(self.map[HEADER.size:HEADER.size + axes_len])
+        self.panels, self.inverters = axes['panels'], axes['inverters']
+        self.climates = [tuple(b) for b in axes['climates']]
+        self.climate_row = {b: k for k, b in enumerate(self.climates)}
+        self.max_string = n
+        dims = {'p': p, 'i': i, 'c': c, 'n': n}
+        offset = HEADER.size + axes_len
+        for name, dt, axes_of in COLUMNS:
+            shape = tuple(dims[a] for a in axes_of)
+            count = int(np.prod(shape))
+            setattr(self, name, np.frombuffer(self.map, dtype=dt, count=count, offset=offset).reshape(shape))
+            size = count * np.dtype(dt).itemsize
+            offset += size + (-size % 8)
+
+    @staticmethod
+    def _current(path, max_string):
+        try:
+            with open(path, 'rb') as f:
+                magic, source, *_, n, _ = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return False
+        return magic == MAGIC and source == sources_digest() and n == max_string
+
+    def panel_rows(self, name=None, power=None):
+        rows = [k for k, p in enumerate(self.panels) if (name is None or p['name'] == name) and (power is None or p['power'] == power)]
+        if not rows:
+            raise KeyError(f'no panel matches name={name!r} power={power!r}')
+        return rows
+
+    def climate_rows(self, temp_min, temp_max=None):
+        """Rows of (temp_min, temp_max); every tempMaxAmb of temp_min when temp_max is None."""
+        rows = [k for (t, m), k in self.climate_row.items() if t == temp_min and (temp_max is None or m == temp_max)]
+        if not rows:
+            raise KeyError(f'no climate band for tempMin={temp_min} tempMaxAmb={temp_max}')
+        return rows
+
+    def query(self, string_length, temp_min, temp_max=None, name=None, power=None):
+        """[(panel, inverter, flags, voc_cold, vmp_hot)] for every panel matching name / power.
+
+        Without temp_max the flags are the union over the bands with that
+        tempMin, i.e. the worst case.
+        """
+        if not 1 <= string_length <= self.max_string:
+            raise KeyError(f'string length {string_length} outside 1..{self.max_string}')
+        n, cs = string_length - 1, self.climate_rows(temp_min, temp_max)
+        out = []
+        for p in self.panel_rows(name, power):
+            flags = np.bitwise_or.reduce(self.flags[p][:, cs, n], axis=1)
+            voc, vmp = self.voc_cold[p, cs, n].max(), self.vmp_hot[p, cs, n].min()
+            for i, inv in enumerate(self.inverters):
+                out.append((self.panels[p], inv, int(flags[i]), float(voc), float(vmp)))
+        return out
+
+def describe(flags):
+    return ', '.join(label for bit, label in ((VOLTAGE, 'Voc cold > max input'), (CURRENT, 'Isc > max input current'),
+                                              (MPPT_LOW, 'Vmp hot < MPPT min'), (MPPT_HIGH, 'Vmp cold > MPPT max'),
+                                              (NOT_STRING, 'micro: one panel per input')) if flags & bit) or 'ok'
+
+TS_HARNESS = TS_LOADER + r'''
+const { checkElectricalCompatibility } = load('services/compatibilityService.ts');
+const { panels, inverters, cells } = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+const lines = [];
+for (const [p, i, tempMin, tempMaxAmb, n] of cells) {
+  const r = checkElectricalCompatibility(panels[p], inverters[i], { tempMin, tempMaxAmb }, n, undefined, 1);
+  const d = r.details, s = d.stringsAnalysis[0];
+  lines.push(JSON.stringify(s ? [d.vocCold, d.vmpHot, s.isVoltageError, s.isCurrentError, s.isMpptWarning, d.dcAcRatio, d.rcdType]
+                              : [d.vocCold, null, !r.isCompatible, null, null, d.dcAcRatio, d.rcdType]));
+}
+fs.writeFileSync(out, lines.join('\n'));
+'''
+FIXTURE = ROOT / 'tests' / 'fixtures' / 'compat_ts.ndjson'
+
+def run_ts(cells):
+    """[(panel name, inverter id, tempMin, tempMaxAmb, n)] -> checkElectricalCompatibility results (node + typescript)."""
+    panel_list, inverter_list = panels(), inverters()
+    p_row = {p['name']: k for k, p in enumerate(panel_list)}
+    i_row = {inv['id']: k for k, inv in enumerate(inverter_list)}
+    with tempfile.TemporaryDirectory() as tmp:
+        inp, out = pathlib.Path(tmp) / 'in.json', pathlib.Path(tmp) / 'ts.ndjson'
+        inp.write_text(json.dumps({'panels': panel_list, 'inverters': inverter_list,
+                                   'cells': [[p_row[p], i_row[i], t, m, n] for p, i, t, m, n in cells]}), encoding='utf-8')
+        proc = subprocess.run(['node', '-e', TS_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        with open(out, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+def compare(matrix, cells, results):
+    """Mismatches between the matrix and run_ts results for the same cells."""
+    p_row = {p['name']: k for k, p in enumerate(matrix.panels)}
+    i_row = {inv['id']: k for k, inv in enumerate(matrix.inverters)}
+    mismatches = 0
+    for (panel, inverter, temp_min, temp_max, n), ts in zip(cells, results):
+        p, i, c = p_row[panel], i_row[inverter], matrix.climate_row[temp_min, temp_max]
+        voc, vmp, voltage, current, mppt_low, ratio, rcd = ts
+        micro = matrix.inverters[i]['electrical']['maxInputVoltage'] < 100
+        flags = int(matrix.flags[p, i, c, n - 1])
+        got = [fixed(matrix.voc_cold[p, c, 0 if micro else n - 1], 1), float(matrix.dc_ac[p, i, n - 1]),
+               RCD_TYPES[matrix.rcd[i]], bool(flags & VOLTAGE)]
+        want = [voc, ratio, rcd, voltage]
+        if not micro:
+            got += [fixed(matrix.vmp_hot[p, c, n - 1], 1), bool(flags & CURRENT), bool(flags & MPPT_LOW)]
+            want += [vmp, current, mppt_low]
+        if got != want:
+            mismatches += 1
+            if mismatches <= 20:
+                print(f'{panel} / {inverter} / {(temp_min, temp_max)} / n={n}: matrix {got} != ts {want}', file=sys.stderr)
+    return mismatches
+
+def all_cells(matrix):
+    return [(p['name'], inv['id'], t, m, n) for p in matrix.panels for inv in matrix.inverters
+            for t, m in matrix.climates for n in range(1, matrix.max_string + 1)]
+
+def check_ts(matrix):
+    """Compare every cell with checkElectricalCompatibility (needs node and the typescript package)."""
+    cells = all_cells(matrix)
+    return compare(matrix, cells, run_ts(cells))
+
+def fixture_cells(matrix, sample=1000, seed=0):
+    """The cells pinned by the tests: every panel / inverter pair at the coldest
+    and warmest band for a short and a long string, plus a seeded sample."""
+    bands = [matrix.climates[0], matrix.climates[-1], (-10, 35)]
+    cells = [(p['name'], inv['id'], t, m, n) for p in matrix.panels for inv in matrix.inverters
+             for t, m in bands for n in (1, 12)]
+    cells += random.Random(seed).sample(all_cells(matrix), sample)
+    return list(dict.fromkeys(cells))
+
+def write_fixture(matrix, path=FIXTURE):
+    cells = fixture_cells(matrix)
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [json.dumps([*cell, ts], ensure_ascii=False) for cell, ts in zip(cells, run_ts(cells))]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return len(lines)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('command', choices=('compile', 'query', 'check', 'fixture'))
+    ap.add_argument('--index', default=INDEX_PATH, type=pathlib.Path)
+    ap.add_argument('--max-string', type=int, default=MAX_STRING, help='longest string length in the matrix')
+    ap.add_argument('-n', '--string-length', type=int, help='panels in the string (query)')
+    ap.add_argument('--panel', help='panel name (query)')
+    ap.add_argument('--power', type=float, help='panel power in W (query)')
+    ap.add_argument('--tmin', type=int, help='minimum temperature in °C (query)')
+    ap.add_argument('--tmax', type=int, help='maximum ambient temperature in °C (query; default: worst case)')
+    ap.add_argument('--postal-code', help='take the climate from getLocationClimate instead of --tmin / --tmax')
+    ap.add_argument('--altitude', type=float, default=0)
+    ap.add_argument('--all', action='store_true', help='list rejected inverters too (query)')
+    ap.add_argument('--ts', action='store_true', help='compare with checkElectricalCompatibility through node (check)')
+    args = ap.parse_args()
+    if args.command == 'compile':
+        print('compiled', compile_matrix(args.index, args.max_string))
+        sys.exit()
+    matrix = CompatMatrix(args.index, max_string=args.max_string)
+    if args.command == 'fixture':
+        try:
+            print(f'{write_fixture(matrix)} cells written to {FIXTURE}')
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        sys.exit()
+    if args.command == 'check':
+        if not args.ts:
+            raise SystemExit('check needs --ts (the matrix is the only Python implementation; tests/test_compat_matrix.py pins it offline)')
+        try:
+            bad = check_ts(matrix)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        cells = matrix.flags.size
+        print(f'ts parity: {cells} cells, {bad} mismatches')
+        sys.exit(1 if bad else 0)
+    if args.string_length is None or (args.tmin is None and args.postal_code is None):
+        ap.error('query needs -n and --tmin or --postal-code')
+    tmin, tmax = args.tmin, args.tmax
+    if args.postal_code is not None:
+        band = climate.location_climate(args.postal_code, args.altitude)
+        tmin, tmax = band['tempMin'], band['tempMaxAmb']
+    try:
+        rows = matrix.query(args.string_length, tmin, tmax, args.panel, args.power)
+    except KeyError as e:
+        raise SystemExit(e.args[0])
+    for panel, inv, flags, voc, vmp in rows:
+        if flags & ERRORS and not args.all:
+            continue
+        status = 'error' if flags & ERRORS else 'warning' if flags else 'ok'
+        print(f'{inv["id"]:24} {status:8} {panel["name"]} x{args.string_length}: Voc {voc:.1f} V, Vmp {vmp:.1f} V'
+              f' ({describe(flags)})')
@@ -0,0 +1,405 @@
+"""Datasheet ingestion: a folder of supplier sheets into an importAllData backup.
+
+The admin page's OCR importer reads one file at a time. It extracts the
+text (extractTextFromPdf / extractTextFromImage of services/ocrService.ts),
+runs parseDatasheet and then hands the Component to the component form.
+This module does the same for a whole directory:
+
+- the text of every new or changed sheet is extracted in a process pool
+  (PDFs with pypdf, up to three pages, with pdf.js's line rebuilding;
+  images with pytesseract, eng+fra; .txt files are taken as already
+  extracted text);
+- texts are cached by content hash (DATASHEET_CACHE, default
+  ~/.cache/datasheets.json). A file whose (mtime, size) is unchanged is
+  not even hashed, and a re-run only extracts the sheets that are new or
+  changed;
+- parse_datasheet is a port of parseDatasheet, quirks included, so a sheet
+  gives the Component the app would propose;
+- panels and inverters are added by id to their collection, as the
+  admin page's save does. importAllData replaces whole collections, so
+  the output carries the full collection: the app's defaults, or those of
+  a getAllData backup (--base).
+
+Sheets whose text matches neither a panel nor an inverter are listed and
+left out.
+
+    python datasheets.py supplier_sheets/ -o import.json [--base backup.json] [-j 8]
+    python datasheets.py supplier_sheets/ --check-ts      # parser against parseDatasheet through node
+    python datasheets.py sheets/ --write-fixture tests/fixtures/datasheets_ts.ndjson
+
+pypdf and pytesseract (with the tesseract binary) are only needed for the
+file types that use them.
+"""
+import os, re, sys, json, hashlib, argparse, pathlib, tempfile, subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from climate_index import TS_LOADER
+from dc_audit import default_inverters
+from js_compat import js_number, js_str
+from ts_literals import ROOT, load_module
+
+CACHE_PATH = pathlib.Path(os.environ.get('DATASHEET_CACHE', pathlib.Path.home() / '.cache' / 'datasheets.json'))
+PDF_SUFFIXES = ('.pdf',)
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+TEXT_SUFFIXES = ('.txt',)
+MAX_PAGES = 3
+LINE_GAP = 5  # pt of vertical move that starts a new line, as in extractTextFromPdf
+OCR_LANG = 'eng+fra'
+VERSION = 1
+
+class ExtractError(Exception):
+    pass
+
+# --- text extraction ---
+
+def pdf_text(path):
+    """extractTextFromPdf: text items of the first pages, a newline whenever y moves by more than LINE_GAP."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractError('PDF sheets need pypdf (pip install pypdf)') from None
+    full = ''
+    for page in PdfReader(path).pages[:MAX_PAGES]:
+        items = []
+        def visit(text, cm, tm, font, size):
+            if text.strip('\n'):
+                # y of the text matrix in page space, like pdf.js's item.transform[5]
+                items.append((text.replace('\n', ' '), tm[4] * cm[1] + tm[5] * cm[3] + cm[5]))
+        page.extract_text(visitor_text=visit)
+        page_text, last_y = '', None
+        for text, y in items:
+            if last_y is not None and abs(y - last_y) > LINE_GAP:
+                page_text += '\n'
+            page_text += text + ' '
+            last_y = y
+        full += page_text + '\n'
+    return full
+
+def image_text(path):
+    """extractTextFromImage: tesseract in English and French."""
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError:
+        raise ExtractError('image sheets need pytesseract and Pillow (and the tesseract binary)') from None
+    with Image.open(path) as im:
+        return pytesseract.image_to_string(im, lang=OCR_LANG)
+
+def extract_text(path):
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix in PDF_SUFFIXES:
+        return pdf_text(path)
+    if suffix in IMAGE_SUFFIXES:
+        return image_text(path)
+    return pathlib.Path(path).read_text(encoding='utf-8', errors='replace')
+
+def extract_job(job):
+    """Worker: (digest, text, error) for (digest, path)."""
+    digest, path = job
+    try:
+        return digest, extract_text(path), None
+    except Exception as e:  # a broken sheet is reported, not fatal
+        return digest, None, f'{type(e).__name__}: {e}'
+
+def extract_all(jobs, workers=None):
+    """Yield (digest, text, error) for [(digest, path)], `workers` processes at a time."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        yield from map(extract_job, jobs)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(extract_job, job))
+            if len(pending) >= 2 * workers:  # bounded read-ahead
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# --- parseDatasheet ---
+
+# JS \s and String.prototype.trim()'s whitespace (Python's \s differs: it has \x1c-\x1f, not \ufeff)
+JS_SPACE = '\t\n\x0b\x0c\r \xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+JS_TRIM = JS_SPACE.replace('\u2000-\u200a', ''.join(map(chr, range(0x2000, 0x200b))))
+SPACES = re.compile(f'[{JS_SPACE}]+')
+# JS \d and \b are ASCII-only, and so is the \s left after normalise (no \x1c-\x1f, \x85)
+NUMBER = re.compile(r'\b\d{1,4}(?:[.,]\d{1,2})?\b', re.A)
+MICRO = re.compile(r'micro[- ]?inverter|micro[- ]?onduleur|iq8|ds3', re.I)
+INVERTER = re.compile(r'inverter|onduleur|mppt|hybrid', re.I)
+PANEL = re.compile(r'module|panneau|photovoltaic|cell|solar|bifacial', re.I)
+VOC = re.compile(r'Voc', re.I)
+DIMENSIONS = re.compile(r'([0-9]{3,4})\s*[xX*×]\s*([0-9]{3,4})(?:\s*[xX*×]\s*([0-9]{2,3}))?', re.A)
+MODEL = re.compile(r'([A-Z0-9]{2,}-[A-Z0-9-]{3,})', re.I)
+POWER_LINE = re.compile(r'(Pmax|Power|Puissance|Nominale|Pnom)', re.I)
+SIMPLE_POWER = re.compile(r'(?:Pmax|Power|Puissance)[^0-9]*([0-9]{3})', re.I)
+PANEL_FIELDS = (  # key, line regex, plausible range
+    ('voc', re.compile(r'Voc|Ouvert|Open', re.I), 20, 60),
+    ('vmp', re.compile(r'Vmp|Vmpp|Pmax.*?Voltage|Tension.*?Maximale', re.I), 20, 50),
+    ('isc', re.compile(r'Isc|Court|Short', re.I), 8, 20),
+    ('imp', re.compile(r'Imp|Impp|Pmax.*?Current|Courant.*?Maximal', re.I), 8, 20),
+)
+TEMP_COEFF_LINE = re.compile(r'(Temp|Coeff).*?Voc', re.I)
+TEMP_COEFF = re.compile(r'-0[.,][0-9]{2,3}')
+MAX_INPUT_VOLTAGE = re.compile(r'(?:Max.*?Input.*?Voltage|Tension.*?Entrée.*?Max)[^0-9]*([0-9]{2,4})', re.I)
+MPPT_RANGE = re.compile(r'(?:MPPT|Plage)[^0-9]*([0-9]{2,3})\s*[-~to]\s*([0-9]{2,4})', re.I | re.A)
+MAX_INPUT_CURRENT = re.compile(r'(?:Max.*?Input.*?Current|Courant.*?Entrée.*?Max)[^0-9]*([0-9]{1,3}(?:[.,][0-9])?)', re.I)
+
+def extract_numbers(line):
+    return [float(m.replace(',', '.', 1)) for m in NUMBER.findall(line)]
+
+def sheet_kind(full_text):
+    """'inverter', 'panel' or None, by parseDatasheet's type detection on the normalised text."""
+    if MICRO.search(full_text) or INVERTER.search(full_text):
+        return 'inverter'
+    if PANEL.search(full_text) or VOC.search(full_text):
+        return 'panel'
+    return None
+
+def normalise(raw):
+    return SPACES.sub(' ', raw).replace('O', '0').replace('o', '0')
+
+def parse_datasheet(raw):
+    """parseDatasheet(rawText): the Partial<Component> the importer proposes."""
+    lines = [l for l in (l.strip(JS_TRIM) for l in raw.split('\n')) if l]
+    full_text = normalise(raw)
+    result = {'unit': 'piece', 'electrical': {}}
+    kind = sheet_kind(full_text)
+    is_panel, is_inverter = kind == 'panel', kind == 'inverter'
+
+    if m := DIMENSIONS.search(full_text):
+        vals = [float(m.group(1)), float(m.group(2))]
+        if is_panel:
+            result['height'], result['width'] = max(vals), min(vals)
+        else:
+            result['width'], result['height'] = vals
+
+    m = MODEL.search(full_text)
+    model = m.group(1) if m else ('Panneau' if is_panel else 'Onduleur')
+
+    # the column of the highest power picks the values of the other table lines
+    column, power_found = 0, False
+    for line in lines:
+        if POWER_LINE.search(line) and not power_found:
+            numbers = extract_numbers(line)
+            powers = [n for n in numbers if 200 < n < 800]
+            if powers:
+                result['power'] = max(powers)
+                column = numbers.index(result['power'])
+                power_found = True
+                if model and js_str(result['power']) not in model:
+                    model += f'-{js_str(result["power"])}'
+    if not result.get('power'):
+        if m := SIMPLE_POWER.search(full_text):
+            result['power'] = float(m.group(1))
+
+    elec = result['electrical']
+    if is_panel:
+        def value_from_line(regex, low, high):
+            for line in lines:
+                if regex.search(line):
+                    numbers = extract_numbers(line)
+                    if numbers:
+                        if power_found and len(numbers) > column and low <= numbers[column] <= high:
+                            return numbers[column]
+                        valid = next((n for n in numbers if low <= n <= high), None)
+                        if valid:
+                            return valid
+            return None
+        for key, regex, low, high in PANEL_FIELDS:
+            elec[key] = value_from_line(regex, low, high) or 0
+        for line in lines:
+            if TEMP_COEFF_LINE.search(line) and (m := TEMP_COEFF.search(line)):
+                elec['tempCoeffVoc'] = float(m.group(0).replace(',', '.', 1))
+                break
+    elif is_inverter:
+        if m := MAX_INPUT_VOLTAGE.search(full_text):
+            elec['maxInputVoltage'] = float(m.group(1))
+        if m := MPPT_RANGE.search(full_text):
+            elec['minMpptVoltage'], elec['maxMpptVoltage'] = float(m.group(1)), float(m.group(2))
+        if m := MAX_INPUT_CURRENT.search(full_text):
+            elec['maxInputCurrent'] = float(m.group(1).replace(',', '.', 1))
+        elec['maxAcPower'] = result.get('power') or 0
+
+    result['id'] = model
+    power = result.get('power')
+    result['description'] = f'{"Panneau" if is_panel else "Onduleur"} {model} {js_str(power) + "W" if power else ""}'
+    return as_json(result)
+
+def as_json(value):
+    """Numbers as the app stores them (parseFloat's 450 is not 450.0)."""
+    if isinstance(value, dict):
+        return {k: as_json(v) for k, v in value.items()}
+    return js_number(value)
+
+# --- cache and catalog ---
+
+def find_sheets(root):
+    suffixes = PDF_SUFFIXES + IMAGE_SUFFIXES + TEXT_SUFFIXES
+    root = pathlib.Path(root)
+    if root.is_file():
+        return [root]
+    return sorted(p for p in root.rglob('*') if p.is_file() and p.suffix.lower() in suffixes)
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+class TextCache:
+    """{path: (stat, content hash)} and {content hash: extracted text}, kept on disk."""
+    def __init__(self, path=CACHE_PATH):
+        self.path = pathlib.Path(path)
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            data = {}
+        if data.get('version') != VERSION:
+            data = {'files': {}, 'texts': {}}
+        self.files, self.texts = data['files'], data['texts']
+        self.dirty = False
+
+    def digest(self, path):
+        """Content hash of path, re-read only when its (mtime, size) changed."""
+        key, st = str(pathlib.Path(path).resolve()), os.stat(path)
+        stat, entry = [st.st_mtime_ns, st.st_size], self.files.get(key)
+        if entry is None or entry['stat'] != stat:
+            entry = self.files[key] = {'stat': stat, 'hash': file_hash(path)}
+            self.dirty = True
+        return entry['hash']
+
+    def put(self, digest, text):
+        self.texts[digest] = text
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # texts no file points at any more go
+        live = {e['hash'] for e in self.files.values()}
+        self.texts = {h: t for h, t in self.texts.items() if h in live}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.' + self.path.name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': VERSION, 'files': self.files, 'texts': self.texts}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
+
+def default_panels():
+    """INITIAL_PANEL_DB of App.tsx."""
+    data = load_module('data/panels.ts')
+    db = {}
+    for p in data['DMEGC_PANELS']:
+        db[p['name']] = {
+            'id': p['name'], 'description': p['name'], 'unit': 'piece', 'price': p.get('price') or '',
+            'width': p['width'], 'height': p['height'], 'power': p['power'], 'electrical': p['electrical'],
+            **{k: p[k] for k in ('imageUrl', 'datasheetUrl', 'manualUrl', 'videoUrl') if k in p},
+        }
+    g = data['GENERIC_PANEL']
+    db[g['name']] = {'id': g['name'], 'description': g['name'], 'unit': 'piece', 'price': '', 'width': g['width'],
+                     'height': g['height'], 'power': g['power'], 'electrical': g['electrical']}
+    return db
+
+def ingest(paths, cache, workers=None, log=None):
+    """Yield (path, text, component, error) per sheet, extracting the texts the cache lacks."""
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+    sheets = [(p, cache.digest(p)) for root in paths for p in find_sheets(root)]
+    todo = list({d: str(p) for p, d in reversed(sheets) if d not in cache.texts}.items())
+    errors = {}
+    for n, (digest, text, error) in enumerate(extract_all(todo, workers), 1):
+        if error is None:
+            cache.put(digest, text)
+        else:
+            errors[digest] = error
+        log(f'extracted {n}/{len(todo)}')
+    for path, digest in sheets:
+        if digest in errors:
+            yield path, None, None, errors[digest]
+        else:
+            yield path, cache.texts[digest], parse_datasheet(cache.texts[digest]), None
+
+PARSE_HARNESS = TS_LOADER + r'''
+const { parseDatasheet } = load('services/ocrService.ts');
+const texts = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+fs.writeFileSync(out, texts.map(t => JSON.stringify(parseDatasheet(t))).join('\n'));
+'''
+
+def run_ts(texts):
+    """parseDatasheet of each text, through node (needs the typescript package)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        inp, out = pathlib.Path(tmp) / 'in.json', pathlib.Path(tmp) / 'ts.ndjson'
+        inp.write_text(json.dumps(texts), encoding='utf-8')
+        proc = subprocess.run(['node', '-e', PARSE_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        return [json.loads(line) for line in out.read_text(encoding='utf-8').split('\n')] if texts else []
+
+def check_ts(texts):
+    """Indices of texts where parse_datasheet differs from parseDatasheet (needs node and typescript)."""
+    return [i for i, (t, ts) in enumerate(zip(texts, run_ts(texts))) if parse_datasheet(t) != ts]
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('inputs', nargs='+', help='datasheet files or directories (PDF, images, .txt)')
+    ap.add_argument('-o', '--out', help='importAllData backup to write (default: stdout)')
+    ap.add_argument('--base', help='getAllData backup whose panels / inverters the sheets are added to (default: the app defaults)')
+    ap.add_argument('--cache', default=CACHE_PATH, type=pathlib.Path)
+    ap.add_argument('-j', '--jobs', type=int, help='extraction processes (default: CPU count)')
+    ap.add_argument('--check-ts', action='store_true', help='compare the parser with parseDatasheet through node')
+    ap.add_argument('--write-fixture', metavar='PATH', help='write [text, parseDatasheet(text)] of every sheet to PATH, one JSON line each (test fixtures)')
+    args = ap.parse_args()
+    cache = TextCache(args.cache)
+    if args.write_fixture:
+        texts = [text for _, text, _, error in ingest(args.inputs, cache, args.jobs) if error is None]
+        cache.save()
+        try:
+            parsed = run_ts(texts)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        pathlib.Path(args.write_fixture).write_text(
+            ''.join(json.dumps([t, c], ensure_ascii=False) + '\n' for t, c in zip(texts, parsed)), encoding='utf-8')
+        print(f'{len(texts)} sheets written to {args.write_fixture}', file=sys.stderr)
+        sys.exit()
+    base = json.loads(pathlib.Path(args.base).read_text(encoding='utf-8')) if args.base else {}
+    collections = {'panels': dict(base.get('panels') or default_panels()),
+                   'inverters': dict(base.get('inverters') or default_inverters())}
+    added, failed, texts, owner = {'panels': 0, 'inverters': 0}, 0, [], {}
+    try:
+        for path, text, component, error in ingest(args.inputs, cache, args.jobs):
+            if error is not None:
+                failed += 1
+                print(f'{path}: {error}', file=sys.stderr)
+                continue
+            texts.append(text)
+            col = {'panel': 'panels', 'inverter': 'inverters'}.get(sheet_kind(normalise(text)))
+            if col is None:
+                print(f'{path}: neither a panel nor an inverter sheet, skipped', file=sys.stderr)
+                continue
+            if (col, component['id']) in owner:
+                print(f'{path}: same id {component["id"]!r} as {owner[col, component["id"]]}, replaces it', file=sys.stderr)
+            owner[col, component['id']] = path
+            # OcrImporter leaves the datasheet URL to be filled in later
+            collections[col][component['id']] = {**component, 'datasheetUrl': ''}
+            added[col] += 1
+    finally:
+        cache.save()
+    backup = {col: db for col, db in collections.items() if added[col]}
+    text = json.dumps(backup, ensure_ascii=False, indent=2)
+    if args.out:
+        pathlib.Path(args.out).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    print(f'{added["panels"]} panel(s), {added["inverters"]} inverter(s), {failed} failed', file=sys.stderr)
+    if args.check_ts:
+        try:
+            bad = check_ts(texts)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(f'ts parity: {len(texts)} sheets, {len(bad)} mismatches', file=sys.stderr)
+        sys.exit(1 if bad else 0)
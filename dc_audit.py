@@ -0,0 +1,332 @@
+"""Batch DC voltage-drop audit over project exports.
+
+Runs the check of the "1B. Liaison DC" audit block for every project and
+every MPPT at once: ΔU = (2 × L × I × ρ) / S with ρ = 0.023 Ω·mm²/m and
+ΔU% relative to the MPPT's Vmp at summer cell temperature, the same
+stringsAnalysis figures checkElectricalCompatibility produces. Projects
+are read file by file and audited in chunks; each chunk becomes columnar
+NumPy arrays (one row per MPPT) and ΔU/ΔU% are computed for the declared
+section and every candidate section in one broadcast. The report is
+streamed as one JSON line per project.
+
+    python dc_audit.py exports/ -o dc_audit.ndjson
+    python dc_audit.py projects.json --catalog backup.json --only-flagged
+    python dc_audit.py projects.ndjson --write-fixture tests/fixtures/dc_audit_ts.ndjson
+
+Inputs are project JSON files (a Project, a list of Projects or
+{"projects": [...]}) or .ndjson files with one Project per line.
+getAllData backups hold the catalogs but not the projects; pass one as
+--catalog so custom inverters resolve as they do in the app.
+
+--write-fixture runs the app's path through node instead (needs the
+typescript package): the compatibilityReport of App.tsx for the inverter
+resolved here, then the 1B block's ΔU and ΔU% for each stringsAnalysis
+entry. The test suite compares the batch audit with those answers.
+"""
+import sys, json, argparse, pathlib, tempfile, subprocess
+from math import ceil
+
+import numpy as np
+
+from climate_index import TS_LOADER, ClimateIndex
+from js_compat import fixed, fixed_all, num, truthy
+from ts_literals import ROOT, load_module
+
+RHO = 0.023
+CANDIDATE_SECTIONS = (2.5, 4, 6, 10)
+THRESHOLDS = (1, 3)
+DEFAULT_TEMP_COEFF_VOC = -0.26
+CHUNK = 4096
+
+def default_inverters():
+    """ALL_INVERTERS_DEFAULT from App.tsx."""
+    data = load_module('data/inverters.ts')
+    db = {**data['ENPHASE_COMPONENTS'], **data['APSYSTEMS_COMPONENTS'], **data['FOXESS_COMPONENTS']}
+    db[data['GENERIC_INVERTER']['id']] = data['GENERIC_INVERTER']
+    return db
+
+def panel_count(panels):
+    """getPanelCount (services/calculatorService.ts)."""
+    if panels.get('rowConfiguration'):
+        return sum(panels['rowConfiguration'])
+    return panels.get('rows', 0) * panels.get('columns', 0)
+
+def is_micro_system(config, inverters):
+    brand, model = config.get('brand'), config.get('model')
+    custom = inverters.get(model) or {}
+    return (brand in ('Enphase', 'APSystems')
+            or (brand == 'Custom' and truthy((custom.get('electrical') or {}).get('isMicro')))
+            or (brand == 'FoxESS' and ('MICRO' in (model or '') or model == 'FOX-S3000-G2')))
+
+def active_inverter(project, inverters):
+    """The inverter App.tsx feeds to checkElectricalCompatibility, or None."""
+    config = project['inverterConfig']
+    model = config.get('model')
+    inv = next((c for c in inverters.values() if c.get('id') == model), None)
+    if inv is None and config.get('brand') == 'Custom':
+        inv = inverters.get(model or 'OND-PERSO')
+    if inv is None and model == 'Auto':
+        prefix = {'FoxESS': 'FOX', 'Enphase': 'ENP'}.get(config.get('brand'), 'APS')
+        candidates = [c for c in inverters.values() if c['id'].startswith(prefix)
+                      and not any(k in c['id'] for k in ('MICRO', 'ECS', 'EP', 'EQ'))]
+        if candidates:
+            target = sum(f['panels']['model']['power'] * panel_count(f['panels']) for f in project['fields']) * 0.8
+            candidates.sort(key=lambda c: c.get('power') or 0)
+            inv = next((c for c in candidates if (c.get('power') or 0) >= target), candidates[-1])
+    return inv
+
+def mppt_groups(project):
+    """{mpptIndex: [(panel, panelCount)]} in JS key order, or a reason the audit has no rows."""
+    config, fields = project['inverterConfig'], project['fields']
+    total = sum(panel_count(f['panels']) for f in fields)
+    if total == 0:
+        return 'no panels'
+    strings = config.get('configuredStrings') or []
+    if config.get('brand') == 'Custom' or (config.get('brand') == 'FoxESS' and 'MICRO' not in (config.get('model') or '')):
+        if sum(s['panelCount'] for s in strings) != total:
+            return 'strings not assigned'
+    main = fields[0]['panels']['model']
+    groups = {}
+    if not strings:
+        count = config.get('stringsCount') or 1
+        for i in range(count):
+            groups[i + 1] = [(main, ceil(total / count))]
+    else:
+        by_id = {}
+        for f in reversed(fields):
+            by_id[f['id']] = f
+        for s in strings:
+            field = by_id.get(s.get('fieldId'))
+            groups.setdefault(s.get('mpptIndex') or 1, []).append((field['panels']['model'] if field else main, s['panelCount']))
+    return dict(sorted(groups.items()))
+
+class Batch:
+    """Columnar view of a chunk of projects: one row per segment, one per MPPT."""
+    def __init__(self):
+        self.projects, self.reasons = [], []
+        self.postal_codes = []
+        self.seg = {k: [] for k in ('row', 'project', 'vmp', 'isc', 'coeff', 'count')}
+        self.mppt = {k: [] for k in ('project', 'index', 'length', 'section')}
+
+    def add(self, project, inverters, origin):
+        k = len(self.projects)
+        self.projects.append((origin, project))
+        self.postal_codes.append(project.get('postalCode'))
+        config = project.get('inverterConfig') or {}
+        if is_micro_system(config, inverters):
+            self.reasons.append('micro system')
+            return
+        inv = active_inverter(project, inverters)
+        if inv is None or not inv.get('electrical'):
+            self.reasons.append('no inverter')
+            return
+        if num(inv['electrical'].get('maxInputVoltage')) < 100:
+            self.reasons.append('micro inverter')
+            return
+        groups = mppt_groups(project)
+        if isinstance(groups, str):
+            self.reasons.append(groups)
+            return
+        self.reasons.append(None)
+        runs = {}
+        for run in reversed(config.get('dcCablingRuns') or []):
+            runs[run.get('mpptIndex')] = run
+        for index, segments in groups.items():
+            row = len(self.mppt['index'])
+            run = runs.get(index) or {}
+            self.mppt['project'].append(k)
+            self.mppt['index'].append(index)
+            self.mppt['length'].append(num(run.get('lengthM') if run.get('lengthM') is not None else 0))
+            self.mppt['section'].append(num(run.get('sectionMm2') if run.get('sectionMm2') is not None else 0))
+            for panel, count in segments:
+                spec = panel.get('electrical')
+                if spec is None:
+                    continue
+                coeff = spec.get('tempCoeffVoc')
+                self.seg['row'].append(row)
+                self.seg['project'].append(k)
+                self.seg['vmp'].append(num(spec.get('vmp')))
+                self.seg['isc'].append(num(spec.get('isc')))
+                self.seg['coeff'].append(coeff if truthy(coeff) else DEFAULT_TEMP_COEFF_VOC)
+                self.seg['count'].append(count)
+
+    def compute(self, climates):
+        """ΔU (V) and ΔU (%) for every MPPT, declared section first then the candidates."""
+        n = len(self.mppt['index'])
+        seg = {k: np.asarray(v, dtype=np.intp if k in ('row', 'project') else np.float64) for k, v in self.seg.items()}
+        # tempMaxAmb does not depend on the altitude
+        t_cell = climates.climates(self.postal_codes)[1][seg['project']] + 35
+        # same operation order as compatibilityService, so the sums match bit for bit
+        vmp_hot = seg['vmp'] * (1 + (seg['coeff'] / 100) * (t_cell - 25)) * seg['count']
+        vmp_sum = np.bincount(seg['row'], weights=vmp_hot, minlength=n)
+        isc_max = np.zeros(n)
+        np.fmax.at(isc_max, seg['row'], seg['isc'])
+        vmp = np.array(fixed_all(vmp_sum, 1))
+        current = np.array(fixed_all(isc_max * 1.25, 2))
+        length = np.asarray(self.mppt['length'])
+        declared = np.asarray(self.mppt['section'])
+        sections = np.column_stack([declared, np.broadcast_to(CANDIDATE_SECTIONS, (n, len(CANDIDATE_SECTIONS)))])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ok = (length > 0)[:, None] & (sections > 0)
+            drop_v = np.where(ok, (2 * length[:, None] * current[:, None] * RHO) / sections, 0.0)
+            base = np.where(np.isnan(vmp), 0.0, vmp)[:, None]
+            drop_pct = np.where(base > 0, (drop_v / base) * 100, 0.0)
+        return vmp, current, drop_v, drop_pct
+
+    def report(self, climates):
+        vmp, current, drop_v, drop_pct = self.compute(climates)
+        length, section = self.mppt['length'], self.mppt['section']
+        rows = {}
+        for r, k in enumerate(self.mppt['project']):
+            missing = length[r] <= 0 or section[r] <= 0
+            pct = drop_pct[r, 0]
+            candidates = {str(s): fixed(drop_pct[r, j + 1], 2) for j, s in enumerate(CANDIDATE_SECTIONS)}
+            rows.setdefault(k, []).append({
+                'mpptIndex': self.mppt['index'][r],
+                'lengthM': length[r], 'sectionMm2': section[r],
+                'currentA': current[r], 'vmpHot': None if np.isnan(vmp[r]) else vmp[r],
+                'dropV': None if missing else fixed(drop_v[r, 0], 1),
+                'dropPct': None if missing else fixed(pct, 2),
+                'status': 'missing' if missing else ('over 3%' if pct > 3 else 'over 1%' if pct > 1 else 'ok'),
+                'candidatePct': candidates if length[r] > 0 else None,
+                # smallest candidate section that keeps the run within each threshold
+                'minSection': {f'{t}%': next((s for j, s in enumerate(CANDIDATE_SECTIONS) if drop_pct[r, j + 1] <= t), None)
+                               for t in THRESHOLDS} if length[r] > 0 else None,
+            })
+        for k, ((origin, project), reason) in enumerate(zip(self.projects, self.reasons)):
+            mppts = rows.get(k, [])
+            worst = max((m['dropPct'] for m in mppts if m['dropPct'] is not None), default=None)
+            yield {
+                'file': origin, 'id': project.get('id'), 'name': project.get('name'),
+                'postalCode': project.get('postalCode'), 'skipped': reason,
+                'worstDropPct': worst, 'mppts': mppts,
+            }
+
+def read_projects(paths):
+    """Yield (origin, project) from JSON / NDJSON files and directories of them."""
+    for path in paths:
+        path = pathlib.Path(path)
+        files = sorted(p for p in path.rglob('*') if p.suffix in ('.json', '.ndjson')) if path.is_dir() else [path]
+        for f in files:
+            with open(f, encoding='utf-8') as fh:
+                if f.suffix == '.ndjson':
+                    for n, line in enumerate(fh, 1):
+                        if line.strip():
+                            yield f'{f}:{n}', json.loads(line)
+                    continue
+                data = json.load(fh)
+            if isinstance(data, dict) and 'projects' in data:
+                data = data['projects']
+            for project in data if isinstance(data, list) else [data]:
+                if isinstance(project, dict) and 'inverterConfig' in project and 'fields' in project:
+                    yield str(f), project
+
+def audit(projects, inverters=None, chunk=CHUNK, climates=None):
+    """Yield one report dict per (origin, project), auditing `chunk` projects at a time."""
+    inverters = default_inverters() if inverters is None else inverters
+    climates = climates or ClimateIndex()
+    batch = Batch()
+    for origin, project in projects:
+        batch.add(project, inverters, origin)
+        if len(batch.projects) >= chunk:
+            yield from batch.report(climates)
+            batch = Batch()
+    if batch.projects:
+        yield from batch.report(climates)
+
+AUDIT_HARNESS = TS_LOADER + r'''
+const { checkElectricalCompatibility } = load('services/compatibilityService.ts');
+const { getLocationClimate } = load('services/climateService.ts');
+const { getPanelCount } = load('services/calculatorService.ts');
+const lines = [];
+for (const [project, inverter] of JSON.parse(fs.readFileSync(process.argv[3], 'utf8'))) {
+  // compatibilityReport (App.tsx)
+  const config = project.inverterConfig;
+  const total = project.fields.map(f => getPanelCount(f.panels)).reduce((a, b) => a + b, 0);
+  let report = null;
+  if (total > 0 && inverter) {
+    const assigned = (config.configuredStrings || []).reduce((acc, s) => acc + s.panelCount, 0);
+    if (!(((config.brand === 'FoxESS' && !config.model?.includes('MICRO')) || config.brand === 'Custom') && assigned !== total)) {
+      const legacy = config.stringsCount || 1;
+      report = checkElectricalCompatibility(project.fields[0].panels.model, inverter, getLocationClimate(project.postalCode, project.altitude),
+                                            Math.ceil(total / legacy), total, legacy, 0, config.configuredStrings, project.fields);
+    }
+  }
+  if (!report || !report.details) {
+    lines.push('null');
+    continue;
+  }
+  // "1B. Liaison DC" (CalculationAudit.tsx)
+  lines.push(JSON.stringify(report.details.stringsAnalysis.map(mppt => {
+    const run = config.dcCablingRuns?.find(r => r.mpptIndex === mppt.mpptIndex);
+    const L = run?.lengthM ?? 0;
+    const S = run?.sectionMm2 ?? 0;
+    const I = mppt.iscCalculation;
+    const rho = 0.023;
+    const dropV = (L > 0 && S > 0) ? (2 * L * I * rho) / S : 0;
+    const baseV = mppt.vmpHot || 0;
+    const dropPct = (baseV > 0) ? (dropV / baseV) * 100 : 0;
+    const missing = L <= 0 || S <= 0;
+    return { mpptIndex: mppt.mpptIndex, vmpHot: mppt.vmpHot, iscCalculation: I, lengthM: L, sectionMm2: S, missing,
+             dropV: missing ? null : parseFloat(dropV.toFixed(1)), dropPct: missing ? null : parseFloat(dropPct.toFixed(2)) };
+  })));
+}
+fs.writeFileSync(out, lines.join('\n'));
+'''
+
+def run_ts(projects, inverters):
+    """The 1B rows the app shows for each (origin, project), or None without a report (node + typescript)."""
+    cases = [(p, active_inverter(p, inverters)) for _, p in projects]
+    with tempfile.TemporaryDirectory() as tmp:
+        inp, out = pathlib.Path(tmp) / 'in.json', pathlib.Path(tmp) / 'ts.ndjson'
+        inp.write_text(json.dumps(cases), encoding='utf-8')
+        proc = subprocess.run(['node', '-e', AUDIT_HARNESS, str(ROOT), str(out), str(inp)], capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError('TS parity run failed (is `npm install` done?):\n' + proc.stderr.strip())
+        lines = out.read_text(encoding='utf-8').split('\n')
+    if len(lines) != len(projects):
+        raise RuntimeError(f'TS parity run returned {len(lines)} reports for {len(projects)} projects')
+    return [json.loads(line) for line in lines]
+
+def load_catalog(path):
+    """Inverter DB from a getAllData backup (its 'inverters' collection replaces the defaults, as in the app)."""
+    backup = json.loads(pathlib.Path(path).read_text(encoding='utf-8'))
+    return backup.get('inverters') or default_inverters()
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('inputs', nargs='+', help='project JSON / NDJSON files or directories')
+    ap.add_argument('-o', '--out', help='report file (default: stdout)')
+    ap.add_argument('--catalog', help='getAllData backup to take the inverter catalog from')
+    ap.add_argument('--only-flagged', action='store_true', help='only report projects with a run missing or above 1%%')
+    ap.add_argument('--chunk', type=int, default=CHUNK)
+    ap.add_argument('--write-fixture', metavar='PATH', help="write the app's 1B rows for the inputs to PATH, one JSON line each (test fixtures)")
+    args = ap.parse_args()
+    inverters = load_catalog(args.catalog) if args.catalog else None
+    if args.write_fixture:
+        try:
+            rows = run_ts(list(read_projects(args.inputs)), inverters or default_inverters())
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        pathlib.Path(args.write_fixture).write_text(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in rows), encoding='utf-8')
+        print(f'{len(rows)} reports written to {args.write_fixture}', file=sys.stderr)
+        sys.exit()
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    counts = dict.fromkeys(['projects', 'mppts', 'missing', 'over 1%', 'over 3%'], 0)
+    try:
+        for rec in audit(read_projects(args.inputs), inverters, args.chunk):
+            counts['projects'] += 1
+            counts['mppts'] += len(rec['mppts'])
+            for m in rec['mppts']:
+                if m['status'] == 'missing':
+                    counts['missing'] += 1
+                elif m['status'] != 'ok':
+                    counts['over 1%'] += 1
+                    counts['over 3%'] += m['status'] == 'over 3%'
+            if args.only_flagged and all(m['status'] == 'ok' for m in rec['mppts']):
+                continue
+            out.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(', '.join(f'{k}: {v}' for k, v in counts.items()), file=sys.stderr)
@@ -0,0 +1,70 @@
+"""JavaScript number semantics the ported services rely on.
+
+`Number.prototype.toFixed` rounds the exact binary value half away from
+zero (so 1.005.toFixed(2) is '1.00' but 2.5.toFixed(0) is '3'), which is
+neither Python's round() nor '%.*f'. Python ports of the TS services go
+through these helpers wherever the app displays or re-parses a toFixed.
+"""
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+def to_fixed(x, digits=0):
+    """`x.toFixed(digits)`."""
+    if x is None or math.isnan(x):
+        return 'NaN'
+    if math.isinf(x):
+        return 'Infinity' if x > 0 else '-Infinity'
+    if abs(x) >= 1e21:
+        return js_str(x)
+    s = str(Decimal(x).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP))
+    return s[1:] if x == 0 and s.startswith('-') else s  # (-0).toFixed() is '0', (-0.01).toFixed(1) '-0.0'
+
+def fixed(x, digits=0):
+    """`parseFloat(x.toFixed(digits))`."""
+    return float(to_fixed(x, digits))
+
+def fixed_all(values, digits=0):
+    return [fixed(float(v), digits) for v in values]
+
+def js_str(x):
+    """String(x) for the values the services interpolate into labels."""
+    if x is None:
+        return 'null'
+    if isinstance(x, bool):
+        return 'true' if x else 'false'
+    if isinstance(x, float):
+        if math.isnan(x):
+            return 'NaN'
+        if x.is_integer() and abs(x) < 1e21:
+            return str(int(x))
+        return repr(x)
+    return str(x)
+
+def truthy(x):
+    """JS truthiness: 0, NaN, '', null/undefined and false are falsy."""
+    if isinstance(x, float) and math.isnan(x):
+        return False
+    return bool(x)
+
+def ceil(x):
+    """`Math.ceil(x)`: NaN and infinities pass through instead of raising."""
+    return math.ceil(x) if math.isfinite(x) else x
+
+def js_max(*xs):
+    """`Math.max(...)`: NaN wins, unlike Python's max()."""
+    return math.nan if any(x != x for x in xs) else max(xs)
+
+def js_values(obj):
+    """`Object.values(obj)` order: integer-like keys ascending first, then insertion order."""
+    index = sorted((int(k), k) for k in obj if k.isascii() and k.isdigit() and str(int(k)) == k and int(k) < 2 ** 32 - 1)
+    keys = [k for _, k in index]
+    seen = set(keys)
+    return [obj[k] for k in keys] + [v for k, v in obj.items() if k not in seen]
+
+def num(x):
+    """A numeric field as JS would see it in arithmetic (undefined -> NaN)."""
+    return float('nan') if x is None else float(x)
+
+def js_number(x):
+    """A parsed float as JSON.stringify writes it (450.0 -> 450)."""
+    return int(x) if isinstance(x, float) and x.is_integer() and abs(x) < 2 ** 53 else x
@@ -0,0 +1,172 @@
+"""Anchor index: every marker a patch needs, found in one pass over the file.
+
+Patches declare the literal markers and idempotency guards they use
+(`@anchored(...)`). The index runs an Aho-Corasick automaton over the text
+once, then answers position / membership lookups with a bisect instead of
+rescanning. Edits made through `patch_document.Source` keep the index
+current by shifting the stored offsets and rescanning only the window
+around the edit.
+"""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+Anchor = namedtuple('Anchor', 'pos byte line col')
+
+def anchored(*markers, writes=None, files=()):
+    """Declare the markers a patch function looks up.
+
+    `writes` maps each region the patch writes to (anchor, guard): the literal
+    it edits next to (None when it appends) and the marker(s) whose presence
+    means the region is already there. `files` lists other files it reads.
+    Both feed the scheduler's dependency and conflict checks.
+    """
+    writes = dict(writes or {})
+    extra = tuple(m for anchor, guard in writes.values() for m in (anchor,) + as_tuple(guard) if m)
+    def deco(fn):
+        fn.markers = tuple(dict.fromkeys(markers + extra))
+        fn.writes = writes
+        fn.files = tuple(files)
+        return fn
+    return deco
+
+def as_tuple(x):
+    return x if isinstance(x, tuple) else (x,)
+
+def utf8_len(s):
+    return len(s.encode('utf-8'))
+
+class Automaton:
+    """Aho-Corasick automaton over a fixed set of literal patterns."""
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self.maxlen = max((len(p) for p in self.patterns), default=0)
+        goto, fail, out = [{}], [0], [()]
+        for p in self.patterns:
+            s = 0
+            for ch in p:
+                nxt = goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[s][ch] = nxt
+                    goto.append({}); fail.append(0); out.append(())
+                s = nxt
+            out[s] = out[s] + (p,)
+        queue = list(goto[0].values())
+        for s in queue:
+            for ch, nxt in goto[s].items():
+                queue.append(nxt)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def scan(self, text, start=0, end=None, newlines=None):
+        """Yield (pos, pattern) for every match fully inside text[start:end].
+
+        When `newlines` is a list, the offset of every '\\n' seen is appended to it.
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        root = goto[0]
+        s = 0
+        for i in range(start, len(text) if end is None else end):
+            ch = text[i]
+            if ch == '\n' and newlines is not None:
+                newlines.append(i)
+            if s == 0 and ch not in root:
+                continue
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            for p in out[s]:
+                yield i - len(p) + 1, p
+
+class AnchorIndex:
+    """Sorted char offsets of every declared marker, plus a line table."""
+    def __init__(self, text, markers):
+        self.automaton = Automaton(markers)
+        self.hits = {p: [] for p in self.automaton.patterns}
+        newlines = []
+        for pos, p in self.automaton.scan(text, newlines=newlines):
+            self.hits[p].append(pos)
+        self.line_starts = [0] + [i + 1 for i in newlines]
+        self.original_line_starts = tuple(self.line_starts)  # kept for diffs against the original
+        self.line_bytes = [0]
+        for a, b in zip(self.line_starts, self.line_starts[1:]):
+            self.line_bytes.append(self.line_bytes[-1] + utf8_len(text[a:b]))
+
+    def copy(self):
+        """Independent index over the same text (the automaton is shared, nothing is rescanned)."""
+        new = object.__new__(AnchorIndex)
+        new.automaton = self.automaton
+        new.hits = {p: list(h) for p, h in self.hits.items()}
+        new.line_starts = list(self.line_starts)
+        new.original_line_starts = tuple(self.line_starts)
+        new.line_bytes = list(self.line_bytes)
+        return new
+
+    def _hits(self, marker):
+        try:
+            return self.hits[marker]
+        except KeyError:
+            raise KeyError(f'marker not declared for this file: {marker!r}') from None
+
+    def __contains__(self, marker):
+        return bool(self._hits(marker))
+
+    def positions(self, marker):
+        return list(self._hits(marker))
+
+    def find(self, marker, start=0):
+        """First offset of `marker` at or after `start`, or -1 (like str.find)."""
+        hits = self._hits(marker)
+        i = bisect_left(hits, start)
+        return hits[i] if i < len(hits) else -1
+
+    def locate(self, pos, doc):
+        """Anchor(pos, byte, line, col) for a char offset; line and col are 1-based.
+
+        `doc` is anything with `slice(a, b)`; only the text of pos's own line is read.
+        """
+        i = bisect_right(self.line_starts, pos) - 1
+        start = self.line_starts[i]
+        return Anchor(pos, self.line_bytes[i] + utf8_len(doc.slice(start, pos)), i + 1, pos - start + 1)
+
+    def anchors(self, marker, doc):
+        return [self.locate(pos, doc) for pos in self._hits(marker)]
+
+    def replace(self, start, end, block, removed, byte, doc):
+        """Update the index after `removed` (doc[start:end], starting at `byte`)
+        was replaced by block; `doc` is the edited document."""
+        delta = len(block) - (end - start)
+        bdelta = utf8_len(block) - utf8_len(removed)
+        for p, hits in self.hits.items():
+            # drop matches touching the edited range, shift the ones after it
+            lo = bisect_left(hits, start - len(p) + 1)
+            hi = bisect_left(hits, end)
+            hits[lo:] = [h + delta for h in hits[hi:]]
+        # line starts inside the replaced range go away, new ones come from the block
+        lo = bisect_right(self.line_starts, start)
+        hi = bisect_right(self.line_starts, end)
+        starts, nbytes, prev = [], [], 0
+        for i, ch in enumerate(block):
+            if ch == '\n':
+                byte += utf8_len(block[prev:i + 1])
+                prev = i + 1
+                starts.append(start + prev)
+                nbytes.append(byte)
+        self.line_starts[lo:] = starts + [s + delta for s in self.line_starts[hi:]]
+        self.line_bytes[lo:] = nbytes + [b + bdelta for b in self.line_bytes[hi:]]
+        # rescan just the window around the edit for matches that now cross or sit in it
+        a = self.automaton
+        lo, hi = max(0, start - a.maxlen + 1), min(len(doc), start + len(block) + a.maxlen - 1)
+        for pos, p in a.scan(doc.slice(lo, hi)):
+            pos += lo
+            if pos < start + len(block) and pos + len(p) > start:
+                hits = self.hits[p]
+                hits.insert(bisect_left(hits, pos), pos)
+
+def markers_for(fns):
+    """Union of the markers declared by several patch functions, in order."""
+    return list(dict.fromkeys(m for fn in fns for m in getattr(fn, 'markers', ())))
@@ -1,23 +1,34 @@
-import re, pathlib
-p=pathlib.Path('/mnt/data/work_step14/App.tsx')
-txt=p.read_text(encoding='utf-8')
-changed=False
-if 'dcCablingRuns' not in txt:
-    txt2=re.sub(r"configuredStrings: \[\],\n\s*agcpValue: undefined", "configuredStrings: [],\n      dcCablingRuns: [],\n      agcpValue: undefined", txt)
-    if txt2!=txt:
-        txt=txt2; changed=True
+import re
+from patch_anchors import anchored
+from patch_document import Source
+from patch_trace import TracedPattern
 
-# Insert UI block after AC cablage input block label "Câblage AC (m)" section end.
-# We'll locate the closing div after the input and small hint line "Coffret AC ➜ point de raccordement".
-marker='Coffret AC ➜ point de raccordement'
-if marker in txt and 'Câblage DC (m)' not in txt:
-    # find position after the hint line's containing </div></div> (two closes) just after hint.
-    idx=txt.index(marker)
-    # find end of the small text div line by finding next '</div>' after idx, then next '</div>'
-    end1=txt.find('</div>', idx)
-    end2=txt.find('</div>', end1+6)
-    insert_pos=end2+6
-    insert_block="""
+# patch_app_dc_ui's block, or this one
+UI_GUARDS=('Câblage DC (m)', 'Câblage DC par MPPT (m)')
+
+AGCP_DEFAULT=TracedPattern(re.compile(r"configuredStrings: \[\],\n\s*agcpValue: undefined"), 'AGCP_DEFAULT')
+
+@anchored(writes={
+    'dc-cabling-default': ('configuredStrings: [],', 'dcCablingRuns'),
+    'dc-cabling-ui': ('Coffret AC ➜ point de raccordement', UI_GUARDS),
+})
+def patch_app_dc(src:Source):
+    if 'dcCablingRuns' not in src:
+        for pos in reversed(src.positions('configuredStrings: [],')):
+            m=AGCP_DEFAULT.match(src.text, pos)
+            if m:
+                src.replace(pos, m.end(), "configuredStrings: [],\n      dcCablingRuns: [],\n      agcpValue: undefined")
+
+    # Insert UI block after AC cablage input block label "Câblage AC (m)" section end.
+    # The small hint line "Coffret AC ➜ point de raccordement" sits in its own div inside that section.
+    marker='Coffret AC ➜ point de raccordement'
+    if marker in src and not any(g in src for g in UI_GUARDS):
+        # insert after the element around the hint's element (the whole AC section)
+        hint=src.outline.containing(src.index(marker))
+        if hint is None or hint.parent is None or hint.parent.kind!='element':
+            return
+        insert_pos=hint.parent.end
+        insert_block="""
 
                                         {!isMicroSystem && project.inverterConfig.brand !== InverterBrand.NONE && project.inverterConfig.brand !== InverterBrand.ENPHASE && project.inverterConfig.brand !== InverterBrand.APSYSTEMS && (
                                           <div className=\"mt-4\">
@@ -66,11 +77,16 @@ if marker in txt and 'Câblage DC (m)' not in txt:
                                           </div>
                                         )}
 """
-    txt = txt[:insert_pos] + insert_block + txt[insert_pos:]
-    changed=True
+        src.insert(insert_pos, insert_block)
 
-if changed:
-    p.write_text(txt, encoding='utf-8')
-    print('updated App.tsx')
-else:
-    print('no changes')
+if __name__=='__main__':
+    from patch_step14 import root
+    p=root/'App.tsx'
+    txt=p.read_text(encoding='utf-8')
+    src=Source(txt, patch_app_dc.markers)
+    patch_app_dc(src)
+    if src.text!=txt:
+        p.write_text(src.text, encoding='utf-8')
+        print('updated App.tsx')
+    else:
+        print('no changes')
@@ -1,10 +1,5 @@
-import re, pathlib
-p=pathlib.Path('/mnt/data/work_step14/App.tsx')
-txt=p.read_text(encoding='utf-8')
-if 'Câblage DC (m)' in txt:
-    print('already present');
-    exit(0)
-
+from patch_anchors import anchored
+from patch_document import Source
 block = '''
 
                             {!isMicroSystem && project.inverterConfig.configuredStrings && project.inverterConfig.configuredStrings.length > 0 && (
@@ -72,17 +67,33 @@ block = '''
                             )}
 '''
 
-# insert after AC cablage block end (after its closing </div>)
-marker = r"</div>\n\s*</div>\n\s*</div>\n\s*\)\}\n\s*</div>"
-# The marker is too broad; instead find the AC cablage block end specifically: the italic line "Coffret AC → point de raccordement" then close divs.
-pattern = r"Coffret AC → point de raccordement\n\s*</div>\n\s*</div>"
+@anchored(writes={'dc-cabling-ui': ('Coffret AC → point de raccordement', 'Câblage DC (m)')})
+def patch_app_dc_ui(src:Source):
+    if 'Câblage DC (m)' in src:
+        return
 
-m = re.search(pattern, txt)
-if not m:
-    raise SystemExit('pattern not found for insertion')
+    # insert after AC cablage block end: the element around the italic line "Coffret AC → point de raccordement"
+    outline = src.outline
+    section = None
+    for pos in src.positions('Coffret AC → point de raccordement'):
+        hint = outline.containing(pos)
+        if hint is not None and hint.parent is not None and hint.parent.kind == 'element':
+            section = hint.parent
+            break
+    if section is None:
+        raise SystemExit('pattern not found for insertion')
 
-insert_pos = m.end()
-new_txt = txt[:insert_pos] + block + txt[insert_pos:]
+    insert_pos = section.end
+    src.insert(insert_pos, block)
 
-p.write_text(new_txt, encoding='utf-8')
-print('inserted DC cablage UI')
+if __name__=='__main__':
+    from patch_step14 import root
+    p=root/'App.tsx'
+    txt=p.read_text(encoding='utf-8')
+    if 'Câblage DC (m)' in txt:
+        print('already present');
+        exit(0)
+    src=Source(txt, patch_app_dc_ui.markers)
+    patch_app_dc_ui(src)
+    p.write_text(src.text, encoding='utf-8')
+    print('inserted DC cablage UI')
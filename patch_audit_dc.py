@@ -1,9 +1,5 @@
-import re, pathlib
-p=pathlib.Path('/mnt/data/work_step14/components/CalculationAudit.tsx')
-txt=p.read_text(encoding='utf-8')
-if '2. Liaison DC (Liaison coffret)' in txt or 'Liaison DC (Panneaux' in txt:
-    print('already'); exit()
-
+from patch_anchors import anchored
+from patch_document import Source
 insert = '''
 
           {/* 1B. Liaison DC (câbles PV -> coffret DC / onduleur) */}
@@ -68,11 +64,26 @@ insert = '''
           )}
 '''
 
-# insert before MPPT detailed comment
-marker = "          {/* Affichage DÉTAILLÉ des MPPT */}"
-idx = txt.find(marker)
-if idx==-1:
-    raise SystemExit('marker not found')
-new = txt[:idx] + insert + txt[idx:]
-p.write_text(new, encoding='utf-8')
-print('patched')
+MARKER = "          {/* Affichage DÉTAILLÉ des MPPT */}"
+
+@anchored(writes={'dc-drop-audit': (MARKER, ('2. Liaison DC (Liaison coffret)', 'Liaison DC (Panneaux'))})
+def patch_audit_dc(src:Source):
+    if '2. Liaison DC (Liaison coffret)' in src or 'Liaison DC (Panneaux' in src:
+        return
+
+    # insert before MPPT detailed comment
+    idx = src.find(MARKER)
+    if idx==-1:
+        raise SystemExit('marker not found')
+    src.insert(idx, insert)
+
+if __name__=='__main__':
+    from patch_step14 import root
+    p=root/'components/CalculationAudit.tsx'
+    txt=p.read_text(encoding='utf-8')
+    if '2. Liaison DC (Liaison coffret)' in txt or 'Liaison DC (Panneaux' in txt:
+        print('already'); exit()
+    src=Source(txt, patch_audit_dc.markers)
+    patch_audit_dc(src)
+    p.write_text(src.text, encoding='utf-8')
+    print('patched')
@@ -0,0 +1,98 @@
+"""Persistent result cache for patch runs.
+
+Each entry maps (file path, content hash) to the hash of the output the
+file's patch chain produced, together with the hash of that chain. A patch
+is identified by its qualified name and the hash of its module's source,
+so editing a patch script invalidates every entry it took part in. The
+modules that decide where and whether any patch edits (the outline parser,
+the anchor index, Source and the scheduler's guard skipping) are hashed
+into every chain, so a fix to one of them invalidates the whole cache. When the cached output
+hash equals the input hash the file is known to be already patched and
+none of its patches run.
+
+The cache is a small JSON file (PATCH_CACHE, default
+~/.cache/patch_pipeline.json) kept to MAX_ENTRIES in least-recently-used
+order.
+"""
+import os, json, hashlib, inspect, pathlib, tempfile
+
+import patch_anchors, patch_document, patch_schedule, tsx_outline
+
+CACHE_PATH = pathlib.Path(os.environ.get('PATCH_CACHE', pathlib.Path.home() / '.cache' / 'patch_pipeline.json'))
+MAX_ENTRIES = 1024
+_module_hashes = {}
+SHARED = (tsx_outline, patch_anchors, patch_document, patch_schedule)
+
+def digest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def source_hash(path):
+    if path not in _module_hashes:
+        _module_hashes[path] = digest(pathlib.Path(path).read_bytes())
+    return _module_hashes[path]
+
+def patch_identity(fn):
+    """Qualified name plus the hash of the source file that defines the patch."""
+    fn = getattr(fn, '__wrapped__', fn)
+    return f'{fn.__module__}.{fn.__qualname__}@{source_hash(inspect.getsourcefile(fn))}'
+
+def chain_hash(fns):
+    # these decide where patches anchor and whether they edit, so they are part of every chain
+    shared = [f'{m.__name__}@{source_hash(inspect.getsourcefile(m))}' for m in SHARED]
+    return digest('\n'.join(shared + [patch_identity(fn) for fn in fns]))
+
+class PatchCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = pathlib.Path(path)
+        self.max_entries = max_entries
+        self.dirty = False
+        try:
+            self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def key(self, path, texts, fns):
+        """Cache key for `path`: its content plus any other file its patches read."""
+        reads = sorted(set(f for fn in fns for f in getattr(fn, 'files', ()) if f != path))
+        return f'{path}:' + digest('\0'.join([texts[path]] + [texts.get(f, '') for f in reads]))
+
+    def lookup(self, key, chain):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry['chain'] != chain:
+            # the patches changed since this entry was written
+            del self.entries[key]
+            self.dirty = True
+            return None
+        self.entries[key] = self.entries.pop(key)  # most recently used last
+        return entry['out']
+
+    def is_noop(self, path, texts, fns):
+        """True when this chain is known to leave the file unchanged."""
+        return self.lookup(self.key(path, texts, fns), chain_hash(fns)) == digest(texts[path])
+
+    def record(self, path, texts, fns, out):
+        key, entry = self.key(path, texts, fns), {'chain': chain_hash(fns), 'out': digest(out)}
+        if self.entries.get(key) != entry:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            self.dirty = True
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.' + self.path.name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
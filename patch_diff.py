@@ -0,0 +1,117 @@
+"""Unified diff of a patched Source, built from its edit log.
+
+The piece table already knows every edit as (orig_start, orig_end,
+new_text) against the original, and the anchor index holds the original
+line table, so hunks are cut straight around the edits: only the edited
+lines and their context are ever sliced out of the text. Nothing compares
+the old and new files, and the cost follows the size of the edits, not of
+the files.
+"""
+from bisect import bisect_left, bisect_right
+
+CONTEXT = 3
+
+def split_lines(text):
+    """Lines of text with their ends, cut after each LF only."""
+    # not str.splitlines: it also breaks on CR, FF, VT, \x1c-\x1e, \x85, \u2028 and \u2029,
+    # plain characters to the line table and to patch
+    lines = text.split('\n')
+    return [line + '\n' for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+
+def format_range(start, stop):
+    """Hunk range as difflib writes it (0-based [start, stop) in, 1-based out)."""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f'{start + (1 if length else 0)},{length}'
+
+class LineTable:
+    def __init__(self, text, starts):
+        self.text, self.starts = text, starts
+        self.count = len(starts) - (1 if not text or text.endswith('\n') else 0)
+
+    def line_of(self, pos):
+        return bisect_right(self.starts, pos) - 1
+
+    def line_end(self, i):
+        return self.starts[i + 1] if i + 1 < len(self.starts) else len(self.text)
+
+    def is_start(self, pos):
+        i = bisect_left(self.starts, pos)
+        return pos == len(self.text) or (i < len(self.starts) and self.starts[i] == pos)
+
+    def lines(self, a, b):
+        """Original lines [a, b) with their line ends."""
+        return split_lines(self.text[self.starts[a]:self.line_end(b - 1)]) if b > a else []
+
+def expand(table, lo, edits):
+    """(lo, hi, edits, new text) for edits sharing lines, widened to whole lines."""
+    text, parts, pos = table.text, [], lo
+    for a, b, block in edits:
+        parts += [text[pos:a], block]
+        pos = b
+    new, hi = ''.join(parts), pos
+    # the replacement has to end on a line break (or at the end of the file)
+    if hi < len(text) and not (table.is_start(hi) and (not new or new.endswith('\n'))):
+        hi = table.line_end(table.line_of(hi))
+        new += text[pos:hi]
+    return lo, hi, edits, new
+
+def changes(edits, table):
+    """Line changes (first old line, end old line, new lines) for char edits in order."""
+    out = []
+    for a, b, block in edits:
+        lo = table.starts[table.line_of(a)]
+        group = [(a, b, block)]
+        if out and lo < out[-1][1]:  # shares a line with the previous change
+            lo, _, previous, _ = out.pop()
+            group = previous + group
+        out.append(expand(table, lo, group))
+    result = []
+    for lo, hi, _, new in out:
+        a, b = table.line_of(lo), bisect_left(table.starts, hi) if hi < len(table.text) else table.count
+        old, new = table.lines(a, b), split_lines(new)
+        # an insertion right after a line's last char rewrites that line unchanged: keep it as context
+        i = 0
+        while i < min(len(old), len(new)) and old[i] == new[i]:
+            i += 1
+        j = 0
+        while j < min(len(old), len(new)) - i and old[-1 - j] == new[-1 - j]:
+            j += 1
+        if a + i < b - j or i + j < len(new):
+            result.append((a + i, b - j, new[i:len(new) - j]))
+    return result
+
+def emit(prefix, line):
+    return prefix + line if line.endswith('\n') else prefix + line + '\n\\ No newline at end of file\n'
+
+def unified_diff(src, path, context=CONTEXT):
+    """The unified diff a/path -> b/path of everything recorded on `src`."""
+    edits = src.edits()
+    if not edits:
+        return ''
+    table = LineTable(src.original, src.anchors.original_line_starts)
+    todo = changes(edits, table)
+    if not todo:
+        return ''
+    out = [f'--- a/{path}\n', f'+++ b/{path}\n']
+    delta, i = 0, 0
+    while i < len(todo):
+        j = i
+        while j + 1 < len(todo) and todo[j + 1][0] - todo[j][1] <= 2 * context:
+            j += 1
+        start = max(0, todo[i][0] - context)
+        stop = min(table.count, todo[j][1] + context)
+        body, pos, added = [], start, 0
+        for a, b, new in todo[i:j + 1]:
+            body += [emit(' ', l) for l in table.lines(pos, a)]
+            body += [emit('-', l) for l in table.lines(a, b)]
+            body += [emit('+', l) for l in new]
+            added += len(new) - (b - a)
+            pos = b
+        body += [emit(' ', l) for l in table.lines(pos, stop)]
+        out.append(f'@@ -{format_range(start, stop)} +{format_range(start + delta, stop + delta + added)} @@\n')
+        out += body
+        delta += added
+        i = j + 1
+    return ''.join(out)
@@ -0,0 +1,211 @@
+"""Piece-table document the patches edit.
+
+Edits never copy the file: the table keeps the original text untouched and
+records each insertion/replacement as pieces pointing into either the
+original or the inserted block. The final text is joined once, when it is
+read back (normally at flush time).
+"""
+import functools
+from bisect import bisect_right
+
+from patch_anchors import AnchorIndex
+from patch_trace import span
+from tsx_outline import parse as parse_outline
+
+class PieceTable:
+    def __init__(self, text):
+        self.original = text
+        # (buffer, start, end, original offset or None for inserted text)
+        self.pieces = [(text, 0, len(text), 0)] if text else []
+        self._starts = None
+        self._text = text
+        self.length = len(text)
+
+    def __len__(self):
+        return self.length
+
+    def _offsets(self):
+        if self._starts is None:
+            pos, self._starts = 0, []
+            for buf, a, b, _ in self.pieces:
+                self._starts.append(pos)
+                pos += b - a
+        return self._starts
+
+    def _split(self, pos):
+        """Index of the first piece starting at `pos`, splitting a piece if needed."""
+        starts = self._offsets()
+        i = bisect_right(starts, pos) - 1
+        if i < 0:
+            return 0
+        if i >= len(self.pieces):
+            return len(self.pieces)
+        buf, a, b, orig = self.pieces[i]
+        k = pos - starts[i]
+        if k == 0:
+            return i
+        if k >= b - a:
+            return i + 1
+        self.pieces[i:i + 1] = [(buf, a, a + k, orig), (buf, a + k, b, None if orig is None else orig + k)]
+        self._starts = None
+        return i + 1
+
+    def replace(self, start, end, block):
+        if not 0 <= start <= end <= self.length:
+            raise IndexError(f'edit out of range: {start}:{end} (length {self.length})')
+        i = self._split(start)
+        j = self._split(end)
+        self.pieces[i:j] = [(block, 0, len(block), None)] if block else []
+        self._starts = None
+        self._text = None
+        self.length += len(block) - (end - start)
+
+    def slice(self, start, end):
+        start, end = max(0, start), min(self.length, end)
+        if start >= end:
+            return ''
+        if self._text is not None:
+            return self._text[start:end]
+        starts = self._offsets()
+        out = []
+        i = bisect_right(starts, start) - 1
+        while i < len(self.pieces) and starts[i] < end:
+            buf, a, b, _ = self.pieces[i]
+            lo = a + max(0, start - starts[i])
+            hi = a + min(b - a, end - starts[i])
+            out.append(buf[lo:hi])
+            i += 1
+        return ''.join(out)
+
+    def text(self):
+        if self._text is None:
+            self._text = ''.join(buf[a:b] for buf, a, b, _ in self.pieces)
+        return self._text
+
+    def edits(self):
+        """The edits as (orig_start, orig_end, new_text) against the original, in order."""
+        out, orig_pos, pending = [], 0, []
+        for buf, a, b, orig in self.pieces:
+            if orig is None:
+                pending.append(buf[a:b])
+                continue
+            if orig != orig_pos or pending:
+                out.append((orig_pos, orig, ''.join(pending)))
+                pending = []
+            orig_pos = orig + (b - a)
+        if orig_pos != len(self.original) or pending:
+            out.append((orig_pos, len(self.original), ''.join(pending)))
+        return out
+
+class Source:
+    """A file's text (as a piece table) together with its anchor index."""
+    def __init__(self, text, markers=()):
+        self.doc = PieceTable(text)
+        with span('anchor scan', 'scan', bytes=len(text)) as args:
+            self.anchors = AnchorIndex(text, markers)
+            args['matches'] = sum(map(len, self.anchors.hits.values()))
+
+    @classmethod
+    def from_index(cls, text, anchors):
+        """A Source over text that reuses an AnchorIndex already built for it."""
+        src = cls.__new__(cls)
+        src.doc = PieceTable(text)
+        src.anchors = anchors.copy()
+        return src
+
+    @property
+    def text(self):
+        return self.doc.text()
+
+    @property
+    def original(self):
+        return self.doc.original
+
+    @property
+    def outline(self):
+        """Structural outline (tsx_outline) of the current text.
+
+        Before any edit this parses the original text as is. After an edit the
+        pieces are joined and the whole text parsed again, so a patch takes the
+        outline once, before its own edits.
+        """
+        with span('outline', 'scan', bytes=len(self)) as args:
+            outline = parse_outline(self.text)
+            args['matches'] = len(outline.nodes)
+        return outline
+
+    def __len__(self):
+        return len(self.doc)
+
+    def __contains__(self, marker):
+        return marker in self.anchors
+
+    def slice(self, start, end):
+        return self.doc.slice(start, end)
+
+    def find(self, marker, start=0):
+        return self.anchors.find(marker, start)
+
+    def index(self, marker, start=0):
+        pos = self.find(marker, start)
+        if pos == -1:
+            raise ValueError(f'marker not found: {marker!r}')
+        return pos
+
+    def positions(self, marker):
+        return self.anchors.positions(marker)
+
+    def locate(self, pos):
+        return self.anchors.locate(pos, self)
+
+    def replace(self, start, end, block):
+        removed = self.doc.slice(start, end)
+        byte = self.locate(start).byte
+        self.doc.replace(start, end, block)
+        self.anchors.replace(start, end, block, removed, byte, self)
+
+    def insert(self, pos, block):
+        self.replace(pos, pos, block)
+
+    def edits(self):
+        return self.doc.edits()
+
+def common_affixes(a, b):
+    """Lengths of the common prefix and (non-overlapping) common suffix of a and b."""
+    n = min(len(a), len(b))
+    lo, hi = 0, n
+    while lo < hi:  # binary search on slice equality keeps the comparisons in C
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+    lo, hi = 0, n - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return prefix, lo
+
+def text_patch(fn):
+    """Adapt a plain str -> str patch to the Source interface.
+
+    The text is materialised for the call and the result is recorded as a
+    single replacement of the span that actually changed.
+    """
+    @functools.wraps(fn)
+    def wrapper(src):
+        old = src.text
+        new = fn(old)
+        if new != old:
+            prefix, suffix = common_affixes(old, new)
+            src.replace(prefix, len(old) - suffix, new[prefix:len(new) - suffix])
+    wrapper.markers = ()
+    return wrapper
+
+def as_source_patch(fn):
+    """Patches declared with @anchored take a Source; anything else is a str -> str function."""
+    return fn if hasattr(fn, 'markers') else text_patch(fn)
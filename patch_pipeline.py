@@ -0,0 +1,142 @@
+"""Single-pass runner for every patch script.
+
+Each target file is read once, kept in memory while every patch of the
+manifest that touches it runs, then written once (temp file + rename).
+With --dry-run nothing is written; the unified diff of every change, built
+from the recorded edits, goes to REVIEW_DIFF.patch instead. With --trace
+(or PATCH_TRACE) the run is recorded as a Chrome trace and summarised on
+stderr (see patch_trace).
+
+    python patch_pipeline.py [root]
+    python patch_pipeline.py [root] --dry-run [--diff -]
+    python patch_pipeline.py [root] --trace trace.json [--no-trace-memory]
+"""
+import os, sys, stat, argparse, pathlib, tempfile
+
+import patch_app_dc, patch_app_dc_ui, patch_audit_dc, patch_step14
+from patch_cache import PatchCache
+from patch_diff import unified_diff
+from patch_schedule import ConflictError, execute
+from patch_trace import recording, span
+
+# Ordered manifest: (target file relative to root, patch function).
+# Patches declared with @anchored edit a Source; plain str -> str functions are adapted.
+MANIFEST = [
+    ('App.tsx', patch_app_dc.patch_app_dc),
+    ('App.tsx', patch_app_dc_ui.patch_app_dc_ui),
+    ('components/CalculationAudit.tsx', patch_audit_dc.patch_audit_dc),
+    ('types.ts', patch_step14.patch_types),
+    ('App.tsx', patch_step14.patch_app),
+    ('components/CalculationAudit.tsx', patch_step14.patch_audit),
+    ('components/PdfReport.tsx', patch_step14.patch_pdf),
+]
+
+DIFF_PATH=pathlib.Path(__file__).resolve().parent/'REVIEW_DIFF.patch'
+
+def targets(manifest=MANIFEST):
+    """Target files in first-use order."""
+    return list(dict.fromkeys(path for path, _ in manifest))
+
+def inputs(manifest=MANIFEST):
+    """Target files plus the other files patches declare they read."""
+    return list(dict.fromkeys(targets(manifest) + [f for _, fn in manifest for f in getattr(fn, 'files', ())]))
+
+def patch_sources(texts, manifest=MANIFEST, jobs=None, strict=False, cache=None):
+    """Run the manifest over in-memory sources ({path: text}); returns {path: Source}.
+
+    With a PatchCache, files whose content is known to come out unchanged are
+    not touched at all and are left out of the result.
+    """
+    chains={path: [fn for p, fn in manifest if p==path] for path in targets(manifest)}
+    todo=[path for path in chains if cache is None or not cache.is_noop(path, texts, chains[path])]
+    sources={}
+    if todo:
+        sources=execute(texts, [(p, fn) for p, fn in manifest if p in todo], jobs=jobs, strict=strict)
+    if cache is not None:
+        for path in todo:
+            cache.record(path, texts, chains[path], sources[path].text)
+    return sources
+
+def patch_files(texts, manifest=MANIFEST, jobs=None, strict=False, cache=None):
+    """Run the manifest over in-memory sources ({path: text}) and return the patched texts."""
+    out=dict(texts)
+    out.update((path, src.text) for path, src in patch_sources(texts, manifest, jobs, strict, cache).items())
+    return out
+
+def read_text(p):
+    with span(f'read {p}', 'io') as args:
+        text=pathlib.Path(p).read_text(encoding='utf-8')
+        args['bytes']=len(text)
+    return text
+
+def write_atomic(p, text):
+    p=pathlib.Path(p)
+    with span(f'write {p}', 'io', bytes=len(text)):
+        _write_atomic(p, text)
+
+def _write_atomic(p, text):
+    fd, tmp = tempfile.mkstemp(dir=p.parent, prefix='.'+p.name+'.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if p.exists():
+            os.chmod(tmp, stat.S_IMODE(p.stat().st_mode))
+        os.replace(tmp, p)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def run(root=patch_step14.root, manifest=MANIFEST, jobs=None, strict=False, cache=True, dry_run=False, diff=DIFF_PATH,
+        trace=None, trace_memory=True):
+    """Patch the tree at root; with dry_run, write the unified diff to `diff` ('-' for stdout) instead.
+
+    With `trace` (a path) the run is recorded there as trace-event JSON.
+    """
+    if trace:
+        with recording(trace, memory=trace_memory):
+            return run(root, manifest, jobs, strict, cache, dry_run, diff)
+    root=pathlib.Path(root)
+    paths=targets(manifest)
+    texts={path: read_text(root/path) for path in inputs(manifest)}
+    cache=PatchCache() if cache is True else cache or None
+    # every patch runs before anything is written: a failing patch leaves the tree untouched
+    sources=patch_sources(texts, manifest, jobs=jobs, strict=strict, cache=cache)
+    patches=[]
+    # keep stdout for the diff itself when it goes there
+    say=(lambda *a: print(*a, file=sys.stderr)) if dry_run and diff=='-' else print
+    for path in paths:
+        src=sources.get(path)
+        if dry_run:
+            patch=unified_diff(src, path) if src is not None else ''
+            patches.append(patch)
+            say('would update' if patch else 'nochange',path)
+        elif src is not None and src.text!=texts[path]:
+            write_atomic(root/path, src.text)
+            say('updated',path)
+        else:
+            say('nochange',path)
+    if dry_run:
+        if diff=='-':
+            sys.stdout.write(''.join(patches))
+        else:
+            write_atomic(diff, ''.join(patches))
+            say('diff written to',diff)
+    elif cache is not None:
+        cache.save()
+
+if __name__=='__main__':
+    ap=argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('root', nargs='?', default=patch_step14.root)
+    ap.add_argument('-j', '--jobs', type=int, help='worker processes (default: CPU count, 1 = in-process)')
+    ap.add_argument('--strict', action='store_true', help='fail on conflicting patches instead of keeping the first')
+    ap.add_argument('--no-cache', action='store_true', help='ignore the patch result cache')
+    ap.add_argument('--dry-run', action='store_true', help='write nothing, produce the unified diff instead')
+    ap.add_argument('--diff', default=DIFF_PATH, help='where --dry-run writes the diff (default: %(default)s, - for stdout)')
+    ap.add_argument('--trace', default=os.environ.get('PATCH_TRACE'), help='write a Chrome trace of the run to this path and a summary to stderr')
+    ap.add_argument('--no-trace-memory', action='store_true', help='leave tracemalloc peaks out of the trace (faster)')
+    args=ap.parse_args()
+    try:
+        run(args.root, jobs=args.jobs, strict=args.strict, cache=not args.no_cache, dry_run=args.dry_run, diff=args.diff,
+            trace=args.trace, trace_memory=not args.no_trace_memory)
+    except ConflictError as e:
+        raise SystemExit(str(e))
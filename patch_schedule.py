@@ -0,0 +1,174 @@
+"""Schedule the manifest: conflict check first, then independent files in parallel.
+
+Every patch declares (through @anchored) the regions it writes, the anchor
+it edits next to and the guard that marks the region as done, plus any other
+files it reads. Before anything runs, the anchor index of each file tells
+which regions are still live (anchor present, and no guard any patch
+declares for the region present); two patches with the same live region,
+or live anchors on the same span, are reported as a conflict. Files then form a DAG through the declared reads and each
+level of it runs in a process pool, one worker per file.
+"""
+import os, sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from patch_anchors import as_tuple, markers_for
+from patch_document import Source, as_source_patch
+from patch_trace import Tracer, active, span, traced_patch
+
+Conflict = namedtuple('Conflict', 'path region kept dropped')
+
+class ConflictError(Exception):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__('\n'.join(describe(c) for c in conflicts))
+
+def describe(c):
+    return f'conflict in {c.path}: {c.kept} and {c.dropped} both write {c.region}'
+
+def name(fn):
+    return f'{fn.__module__}.{fn.__name__}'
+
+def region_guards(manifest):
+    """{path: {region: guards}} pooled over every patch of the manifest that writes the region."""
+    guards = {}
+    for path, fn in manifest:
+        for label, (_, guard) in getattr(fn, 'writes', {}).items():
+            guards.setdefault(path, {}).setdefault(label, {}).update(dict.fromkeys(g for g in as_tuple(guard) if g))
+    return guards
+
+def region_state(fn, src, guards=None):
+    """(live, written) regions of fn: anchor present and guard absent / some guard present.
+
+    `guards` ({region: guards} for src's file) widens each region's guards to
+    those of the other patches writing it.
+    """
+    live, written = [], []
+    for label, (anchor, guard) in getattr(fn, 'writes', {}).items():
+        pooled = (guards or {}).get(label) or [g for g in as_tuple(guard) if g]
+        if any(g in src for g in pooled):
+            written.append(label)
+        elif anchor is None or anchor in src:
+            live.append(label)
+    return live, written
+
+def find_conflicts(manifest, sources):
+    """Return (conflicts, skipped patch indices) for the manifest.
+
+    A region is written once any patch's guard for it is present, so a patch
+    that only reaches written regions is skipped: its own guard may not
+    recognise another patch's version of the region (or even its own, run
+    after run). The first live writer of a region keeps it; a later patch
+    whose live regions are all taken is skipped too. Patches with nothing
+    live or written are left to their own guards.
+    """
+    guards = region_guards(manifest)
+    owners, spans, conflicts, skipped = {}, {}, [], set()
+    for i, (path, fn) in enumerate(manifest):
+        src = sources[path]
+        live, written = region_state(fn, src, guards.get(path))
+        if written and not live:
+            skipped.add(i)
+            continue
+        taken = set()
+        for label in live:
+            if (path, label) in owners:
+                conflicts.append(Conflict(path, label, owners[path, label], name(fn)))
+                taken.add(label)
+            anchor = fn.writes[label][0]
+            for pos in src.positions(anchor) if anchor else ():
+                for a, b, other, owner in spans.get(path, ()):
+                    if other != label and a < pos + len(anchor) and pos < b:
+                        conflicts.append(Conflict(path, f'{other}/{label} at {anchor!r}', owner, name(fn)))
+                        taken.add(label)
+        if live and taken == set(live):
+            skipped.add(i)
+            continue
+        for label in live:
+            owners.setdefault((path, label), name(fn))
+            anchor = fn.writes[label][0]
+            for pos in src.positions(anchor) if anchor else ():
+                spans.setdefault(path, []).append((pos, pos + len(anchor), label, name(fn)))
+    return conflicts, skipped
+
+def file_levels(manifest):
+    """Group target files into dependency levels (files only read by later levels)."""
+    deps = {}
+    for path, fn in manifest:
+        deps.setdefault(path, set()).update(f for f in getattr(fn, 'files', ()) if f != path)
+    levels, done = [], set()
+    while len(done) < len(deps):
+        level = [p for p in deps if p not in done and all(d in done or d not in deps for d in deps[p])]
+        if not level:
+            raise ValueError('cyclic file dependencies: ' + ', '.join(sorted(deps.keys() - done)))
+        levels.append(level)
+        done.update(level)
+    return levels
+
+def run_file(src, fns, context, path=None, trace=None):
+    """Worker: run one file's patches, in manifest order, over its Source.
+
+    `trace` (the memory flag of the parent's tracer, passed to pool workers
+    only) makes the worker record its own events and return them as
+    src.trace_events, or as the trace_events of the exception that stopped it.
+    """
+    worker = Tracer(trace).start() if trace is not None else None
+    try:
+        src.context = context
+        with span(f'apply {path}', 'file', bytes=len(src)):
+            for fn in fns:
+                traced_patch(fn, src, path, as_source_patch(fn))
+        del src.context
+    except BaseException as e:
+        if worker is not None:
+            e.trace_events, worker = worker.stop(), None
+        raise
+    finally:
+        if worker is not None:
+            src.trace_events = worker.stop()
+    return src
+
+def execute(texts, manifest, jobs=None, strict=False, log=None, sources=None):
+    """Check conflicts, then run the manifest over {path: text}; returns {path: Source}.
+
+    `sources` may hand over ready Sources (their index holding every marker
+    of the file's patches) for some paths; the others are scanned here.
+    """
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+    paths = list(dict.fromkeys(path for path, _ in manifest))
+    sources = dict(sources or {})
+    for p in paths:
+        if p not in sources:
+            sources[p] = Source(texts[p], markers_for(fn for q, fn in manifest if q == p))
+    conflicts, skipped = find_conflicts(manifest, sources)
+    if conflicts and strict:
+        raise ConflictError(conflicts)
+    for c in conflicts:
+        log(describe(c) + f' (keeping {c.kept})')
+    plan = {p: [fn for i, (q, fn) in enumerate(manifest) if q == p and i not in skipped] for p in paths}
+    jobs = jobs or os.cpu_count() or 1
+    trace = active().memory if active() is not None else None
+    reads = set(f for _, fn in manifest for f in getattr(fn, 'files', ()))
+    for level in file_levels(manifest):
+        # other files a patch reads, as they stand after the previous levels
+        context = {f: sources[f].text if f in sources else texts[f] for f in reads}
+        if jobs > 1 and len(level) > 1:
+            with ProcessPoolExecutor(min(jobs, len(level))) as pool:
+                futures = {p: pool.submit(run_file, sources[p], plan[p], context, p, trace) for p in level}
+                failed = None
+                # every worker's events are merged before a failure is raised, so the trace shows it
+                for p, f in futures.items():
+                    try:
+                        sources[p] = f.result()
+                        events = sources[p].__dict__.pop('trace_events', ())
+                    except Exception as e:
+                        failed = failed or e
+                        events = e.__dict__.pop('trace_events', ())
+                    if trace is not None:
+                        active().events.extend(events)
+                if failed is not None:
+                    raise failed
+        else:
+            for p in level:
+                run_file(sources[p], plan[p], context, p)
+    return sources
@@ -0,0 +1,250 @@
+"""Inverted index of patch markers across every kept source snapshot.
+
+A snapshot is a loose generation of the app (App.tsx, App.tsx.bak,
+src/App.legacy.tsx) or a pvapp_step*.zip archive. Every guard and anchor
+declared by the manifest's patches maps to the (snapshot, file, byte
+offset) of each occurrence, so "which snapshots already carry the DC
+cabling patch?" is a dictionary lookup instead of a grep over unzipped
+trees.
+
+Loose files are memory-mapped and zip members are decompressed as a
+stream in CHUNK-sized pieces, never held whole. Markers are searched as
+bytes in UTF-8 and cp1252 (App.tsx.bak is cp1252), with LF and CRLF line
+ends, so nothing is decoded. The index is a JSON file (SNAPSHOT_INDEX,
+default ~/.cache/patch_snapshots.json). An update rescans only the
+snapshots whose (mtime, size) changed and whose content hash then differs;
+for archives the hash covers the names, CRCs and sizes of the indexed
+members, so it costs no decompression either. Editing a patch's markers
+rebuilds the whole index.
+
+    python patch_snapshots.py                                   # update, then list the snapshots
+    python patch_snapshots.py 'Liaison DC (chute de tension)'   # where the marker(s) occur
+    python patch_snapshots.py --patch patch_step14.patch_audit  # where the patch is already applied
+"""
+import os, json, mmap, zlib, hashlib, zipfile, argparse, pathlib, tempfile
+from collections import namedtuple
+
+from patch_anchors import as_tuple, markers_for
+from patch_pipeline import MANIFEST
+from patch_schedule import name
+from ts_literals import ROOT
+
+INDEX_PATH = pathlib.Path(os.environ.get('SNAPSHOT_INDEX', pathlib.Path.home() / '.cache' / 'patch_snapshots.json'))
+LOOSE = ('App.tsx', 'App.tsx.bak', 'src/App.legacy.tsx')
+ARCHIVES = ('pvapp_step*.zip', '*/pvapp_step*.zip')
+MEMBER_SUFFIXES = ('.ts', '.tsx', '.tsx.bak')
+ENCODINGS = ('utf-8', 'cp1252')
+CHUNK = 1 << 20
+VERSION = 1
+
+Hit = namedtuple('Hit', 'snapshot file offset')
+
+def find_snapshots(root=ROOT):
+    """Loose generations that exist under root, then the archives, as paths relative to root."""
+    root = pathlib.Path(root)
+    found = [p for p in LOOSE if (root / p).is_file()]
+    for pattern in ARCHIVES:
+        found += sorted(str(p.relative_to(root)) for p in root.glob(pattern))
+    return found
+
+def needles(markers):
+    """{bytes: marker} for every encoding and line-end variant of the markers."""
+    out = {}
+    for m in markers:
+        for text in dict.fromkeys((m, m.replace('\n', '\r\n'))):
+            for enc in ENCODINGS:
+                try:
+                    out.setdefault(text.encode(enc), m)
+                except UnicodeEncodeError:
+                    pass
+    return out
+
+def scan(buf, table, hits, base=0, skip=0):
+    """Add {marker: [offset]} for every needle in buf; matches ending within buf[:skip] were seen before."""
+    for needle, marker in table.items():
+        i = buf.find(needle)
+        while i >= 0:
+            if i + len(needle) > skip:
+                hits.setdefault(marker, []).append(base + i)
+            i = buf.find(needle, i + 1)
+
+def scan_file(path, table):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            hits = {}
+            scan(mm, table, hits)
+    return hits
+
+def scan_stream(f, table):
+    """Scan a file object chunk by chunk, carrying the longest needle's length minus one between chunks."""
+    keep = max(map(len, table), default=1) - 1
+    hits, tail, base = {}, b'', 0
+    while True:
+        chunk = f.read(CHUNK)
+        if not chunk:
+            break
+        buf = tail + chunk
+        scan(buf, table, hits, base, len(tail))
+        tail = buf[max(0, len(buf) - keep):] if keep else b''
+        base += len(buf) - len(tail)
+    return hits
+
+def indexed_members(zf):
+    return [i for i in zf.infolist() if not i.is_dir() and i.filename.endswith(MEMBER_SUFFIXES)]
+
+def content_hash(path):
+    """blake2b of a loose file, or of the indexed members' names, CRCs and sizes for an archive."""
+    h = hashlib.blake2b(digest_size=16)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in indexed_members(zf):
+                h.update(f'{info.filename}\0{info.CRC}\0{info.file_size}\n'.encode('utf-8'))
+    elif os.path.getsize(path):
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm)
+    return h.hexdigest()
+
+def scan_snapshot(path, rel, table):
+    """{file: {marker: [offsets]}} for one snapshot."""
+    if not zipfile.is_zipfile(path):
+        return {rel: scan_file(path, table)}
+    files = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in indexed_members(zf):
+            with zf.open(info) as member:
+                files[info.filename] = scan_stream(member, table)
+    return files
+
+def markers_digest(markers):
+    return hashlib.blake2b('\0'.join(markers).encode('utf-8'), digest_size=16).hexdigest()
+
+class SnapshotIndex:
+    """marker -> snapshot -> file -> byte offsets, kept on disk and refreshed incrementally."""
+    def __init__(self, root=ROOT, path=INDEX_PATH, manifest=MANIFEST):
+        self.root, self.path, self.manifest = pathlib.Path(root), pathlib.Path(path), manifest
+        self.markers = markers_for(fn for _, fn in manifest)
+        self.dirty = False
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            data = {}
+        if (data.get('version'), data.get('markers'), data.get('root')) != (VERSION, markers_digest(self.markers), str(self.root)):
+            data = {'snapshots': {}, 'postings': {}}
+            self.dirty = True
+        self.snapshots, self.postings = data['snapshots'], data['postings']
+
+    def update(self, snapshots=None):
+        """Bring the index up to date with `snapshots` (default: find_snapshots); returns the rescanned ones."""
+        snapshots = find_snapshots(self.root) if snapshots is None else list(snapshots)
+        table, rescanned = needles(self.markers), []
+        for rel in set(self.snapshots) - set(snapshots):
+            self.drop(rel)
+        for rel in snapshots:
+            path = self.root / rel
+            st = path.stat()
+            stat, entry = [st.st_mtime_ns, st.st_size], self.snapshots.get(rel)
+            if entry is not None and entry['stat'] == stat:
+                continue
+            digest = content_hash(path)
+            if entry is not None and entry['hash'] == digest:
+                entry['stat'] = stat  # touched, not changed
+                self.dirty = True
+                continue
+            try:
+                files = scan_snapshot(path, rel, table)
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                raise ValueError(f'{rel}: {e}') from None
+            self.drop(rel)
+            self.snapshots[rel] = {'stat': stat, 'hash': digest, 'files': sorted(files)}
+            for file, hits in files.items():
+                for marker, offsets in hits.items():
+                    self.postings.setdefault(marker, {}).setdefault(rel, {})[file] = sorted(offsets)
+            rescanned.append(rel)
+            self.dirty = True
+        return rescanned
+
+    def drop(self, rel):
+        if self.snapshots.pop(rel, None) is None:
+            return
+        for by_snapshot in self.postings.values():
+            by_snapshot.pop(rel, None)
+        self.dirty = True
+
+    def hits(self, marker):
+        """Every occurrence of a marker, as Hit(snapshot, file, offset) in snapshot order."""
+        if marker not in self.markers:
+            raise KeyError(f'not an indexed marker: {marker!r}')
+        return [Hit(snap, file, off) for snap, files in self.postings.get(marker, {}).items()
+                for file, offsets in files.items() for off in offsets]
+
+    def files_with(self, *markers):
+        """(snapshot, file) pairs that contain every one of the markers."""
+        found = None
+        for marker in markers:
+            pairs = {(h.snapshot, h.file) for h in self.hits(marker)}
+            found = pairs if found is None else found & pairs
+        return sorted(found or ())
+
+    def applied(self, fn):
+        """(snapshot, file) pairs where every region fn writes already has one of its guards."""
+        found = None
+        for anchor, guard in getattr(fn, 'writes', {}).values():
+            pairs = {(h.snapshot, h.file) for g in as_tuple(guard) if g is not None for h in self.hits(g)}
+            found = pairs if found is None else found & pairs
+        return sorted(found or ())
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': VERSION, 'markers': markers_digest(self.markers), 'root': str(self.root),
+                'snapshots': self.snapshots, 'postings': self.postings}
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.' + self.path.name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
+
+def patch_by_name(qualified, manifest=MANIFEST):
+    for _, fn in manifest:
+        if qualified in (name(fn), fn.__name__):
+            return fn
+    raise KeyError(f'no patch named {qualified!r} in the manifest')
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('markers', nargs='*', help='list the files containing all of these markers')
+    ap.add_argument('--patch', action='append', default=[], help='list the files where this patch is already applied')
+    ap.add_argument('--root', default=ROOT, type=pathlib.Path)
+    ap.add_argument('--index', default=INDEX_PATH, type=pathlib.Path)
+    ap.add_argument('--no-update', action='store_true', help='query the index as stored, without checking the snapshots')
+    ap.add_argument('--offsets', action='store_true', help='print every byte offset, not just the files')
+    args = ap.parse_args()
+    index = SnapshotIndex(args.root, args.index)
+    if not args.no_update:
+        for rel in index.update():
+            print('indexed', rel)
+        index.save()
+    try:
+        if args.markers:
+            if args.offsets:
+                for marker in args.markers:
+                    for hit in index.hits(marker):
+                        print(f'{hit.snapshot}\t{hit.file}\t{hit.offset}\t{marker!r}')
+            else:
+                for snap, file in index.files_with(*args.markers):
+                    print(f'{snap}\t{file}')
+        for qualified in args.patch:
+            for snap, file in index.applied(patch_by_name(qualified)):
+                print(f'{snap}\t{file}\t{qualified}')
+    except KeyError as e:
+        raise SystemExit(e.args[0])
+    if not args.markers and not args.patch:
+        for rel, entry in index.snapshots.items():
+            print(f'{rel}\t{len(entry["files"])} file(s)')
@@ -1,5 +1,8 @@
-import re, pathlib
-root=pathlib.Path('/mnt/data/work_step14')
+import os, pathlib
+from patch_anchors import anchored
+from patch_document import Source, as_source_patch
+# working tree the patches apply to (PATCH_ROOT overrides it)
+root=pathlib.Path(os.environ.get('PATCH_ROOT', '/mnt/data/work_step14'))
 
 def write(path, text):
     p=root/path
@@ -9,44 +12,62 @@ def read(path):
     return (root/path).read_text(encoding='utf-8')
 
 def apply(path, fn):
+    fn=as_source_patch(fn)
     txt=read(path)
-    new=fn(txt)
-    if new!=txt:
-        write(path,new)
+    src=Source(txt, fn.markers)
+    fn(src)
+    if src.text!=txt:
+        write(path,src.text)
         print('updated',path)
     else:
         print('nochange',path)
 
 # --- types.ts ---
 
-def patch_types(txt:str)->str:
-    if 'DcCablingRun' not in txt:
+@anchored('export interface MicroBranchConfig', writes={
+    'dc-cabling-type': (None, 'DcCablingRun'),
+    'dc-cabling-field': ('export interface InverterConfig', 'dcCablingRuns'),
+})
+def patch_types(src:Source):
+    # one outline, taken before any edit: its offsets are shifted by what is inserted before them
+    outline=src.outline
+    inserted=None
+    if 'DcCablingRun' not in src:
         # insert interface after MicroBranchConfig or near other interfaces
         ins = '\nexport interface DcCablingRun {\n  mpptIndex: number;\n  /** Longueur aller (m) entre chaîne PV (MPPT) et coffret DC / onduleur. */\n  lengthM: number;\n  /** Section conducteur (mm²) */\n  sectionMm2: number;\n}\n'
-        # place after MicroBranchConfig interface (which ends around line with '}\n\nexport interface')
-        m=re.search(r'export interface MicroBranchConfig\s*\{[\s\S]*?\}\n', txt)
-        if m:
-            pos=m.end()
-            txt = txt[:pos] + ins + txt[pos:]
-        else:
-            txt += ins
-    # add to InverterConfig
-    if 'dcCablingRuns' not in txt:
-        txt = re.sub(r'(export interface InverterConfig\s*\{[\s\S]*?)(\n\})', r"\1\n  /** Paramètres de liaison DC par MPPT (onduleur centralisé) */\n  dcCablingRuns?: DcCablingRun[];\2", txt, count=1)
-    return txt
-
-apply('types.ts', patch_types)
+        # place after the MicroBranchConfig interface, past the line break that ends it
+        found=outline.find('interface', 'MicroBranchConfig')
+        pos=found[0].end if found else len(src)
+        inserted=pos+1 if src.slice(pos, pos+1)=='\n' else pos
+        src.insert(inserted, ins)
+    # add to InverterConfig, after its last member
+    if 'dcCablingRuns' not in src:
+        found=outline.find('interface', 'InverterConfig')
+        if found and found[0].closed:
+            pos=found[0].members_end
+            if inserted is not None and inserted<=pos:
+                pos+=len(ins)
+            src.insert(pos, "\n  /** Paramètres de liaison DC par MPPT (onduleur centralisé) */\n  dcCablingRuns?: DcCablingRun[];")
 
 # --- App.tsx ---
 
-def patch_app(txt:str)->str:
+# another DC cabling block, or this one
+APP_GUARDS = ('Câblage DC (m)', 'Câblage DC (par MPPT)')
+APP_MARKER = "<label className=\"text-[11px] font-black text-slate-700\">\n                                                <b>Câblage AC (m)</b>"
+
+@anchored(writes={
+    'dc-cabling-default': ('mpptCount: undefined,', 'dcCablingRuns'),
+    'dc-cabling-ui': (APP_MARKER, APP_GUARDS),
+})
+def patch_app(src:Source):
     # ensure inverterConfig default includes dcCablingRuns
-    if 'dcCablingRuns' not in txt:
-        txt = txt.replace("mpptCount: undefined,", "mpptCount: undefined,\n    dcCablingRuns: [],")
+    if 'dcCablingRuns' not in src:
+        for pos in reversed(src.positions("mpptCount: undefined,")):
+            src.insert(pos+len("mpptCount: undefined,"), "\n    dcCablingRuns: [],")
 
     # add UI block near Câblage AC
-    marker = "<label className=\"text-[11px] font-black text-slate-700\">\n                                                <b>Câblage AC (m)</b>"
-    if marker in txt and 'Câblage DC (m)' not in txt:
+    marker = APP_MARKER
+    if marker in src and not any(g in src for g in APP_GUARDS):
         insert_block = r'''
 
                                         {/* --- LIAISON DC (CENTRAL) : longueur + section par MPPT --- */}
@@ -114,20 +135,20 @@ def patch_app(txt:str)->str:
                                           </div>
                                         )}
 '''
-        txt = txt.replace(marker, insert_block + "\n" + marker)
-
-    return txt
-
-apply('App.tsx', patch_app)
+        for pos in reversed(src.positions(marker)):
+            src.insert(pos, insert_block + "\n")
 
 # --- CalculationAudit.tsx ---
 
-def patch_audit(txt:str)->str:
-    if 'Liaison DC (chute de tension)' in txt:
-        return txt
+AUDIT_HOOK = "<h2 className=\"text-sm font-black text-slate-700 uppercase tracking-widest mb-2\">Validation matériel de protection DC</h2>"
+
+@anchored(writes={'dc-drop-audit': (AUDIT_HOOK, 'Liaison DC (chute de tension)')})
+def patch_audit(src:Source):
+    if 'Liaison DC (chute de tension)' in src:
+        return
     # Insert a new section after DC currents/voltage blocks, before "VALIDATION MATÉRIEL" table
-    hook = "<h2 className=\"text-sm font-black text-slate-700 uppercase tracking-widest mb-2\">Validation matériel de protection DC</h2>"
-    if hook in txt:
+    hook = AUDIT_HOOK
+    if hook in src:
         block = r'''
 
               {project.inverterConfig.type === 'central' && stringsAnalysis.length > 0 && (
@@ -183,19 +204,20 @@ def patch_audit(txt:str)->str:
                 </div>
               )}
 '''
-        txt = txt.replace(hook, block + "\n" + hook)
-    return txt
-
-apply('components/CalculationAudit.tsx', patch_audit)
+        for pos in reversed(src.positions(hook)):
+            src.insert(pos, block + "\n")
 
 # --- PdfReport.tsx ---
 
-def patch_pdf(txt:str)->str:
-    if 'Liaison DC (chute de tension)' in txt:
-        return txt
+PDF_HOOK = "<section className=\"mb-6\">\n            <h3 className=\"text-[10px] font-black text-slate-800 uppercase mb-3 tracking-tight\">Validation Matériel de protection DC</h3>"
+
+@anchored(writes={'dc-drop-pdf': (PDF_HOOK, 'Liaison DC (chute de tension)')})
+def patch_pdf(src:Source):
+    if 'Liaison DC (chute de tension)' in src:
+        return
     # insert after MPPT distribution section ("Répartition détaillée des chaînes") and before Validation matériel
-    hook = "<section className=\"mb-6\">\n            <h3 className=\"text-[10px] font-black text-slate-800 uppercase mb-3 tracking-tight\">Validation Matériel de protection DC</h3>"
-    if hook in txt:
+    hook = PDF_HOOK
+    if hook in src:
         block = r'''
 
         {project.inverterConfig.type === 'central' && stringsAnalysis.length > 0 && (
@@ -248,8 +270,11 @@ def patch_pdf(txt:str)->str:
         </section>
         )}
 '''
-        txt = txt.replace(hook, block + "\n" + hook)
-    return txt
-
-apply('components/PdfReport.tsx', patch_pdf)
+        for pos in reversed(src.positions(hook)):
+            src.insert(pos, block + "\n")
 
+if __name__=='__main__':
+    apply('types.ts', patch_types)
+    apply('App.tsx', patch_app)
+    apply('components/CalculationAudit.tsx', patch_audit)
+    apply('components/PdfReport.tsx', patch_pdf)
@@ -0,0 +1,184 @@
+"""Tracing for patch runs: Chrome / Perfetto trace events plus a text summary.
+
+While a Tracer is active, the pipeline records one complete ('X') event per
+file read and write, per file's patch chain, per patch function, per anchor
+or outline scan and per regex call. Each event carries its wall time. Where
+it applies, it also carries the bytes scanned, the match count and the
+tracemalloc peak. A patch event also notes which of its guards were
+already present (the short-circuits), how many edits it made, and any
+exception that stopped it. Worker processes record their own events and
+hand them back with the Source they return, or with the exception that
+stopped them.
+
+    with recording('trace.json'):
+        run(root)
+
+The JSON loads in chrome://tracing or ui.perfetto.dev. summary() prints
+the same events aggregated by name, with one line per patch. Peak memory
+comes from tracemalloc, which slows the run down noticeably, so
+memory=False leaves it out.
+"""
+import os, sys, json, time, tracemalloc, contextlib
+
+from patch_anchors import as_tuple
+
+_active = None
+
+class Tracer:
+    def __init__(self, memory=True):
+        self.memory, self.events, self.stack = memory, [], []
+        self.pid = os.getpid()
+
+    @contextlib.contextmanager
+    def span(self, name, cat, **args):
+        """Record the enclosed block; the yielded dict takes extra args (bytes, matches ...)."""
+        if self.memory:
+            if self.stack:  # the parent keeps the peak reached so far, the child starts fresh
+                self.stack[-1] = max(self.stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.stack.append(0)
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            dur = time.perf_counter_ns() - start
+            if self.memory:
+                peak = max(self.stack.pop(), tracemalloc.get_traced_memory()[1])
+                if self.stack:
+                    self.stack[-1] = max(self.stack[-1], peak)
+                args['peak_kib'] = peak >> 10
+            self.events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': start / 1e3, 'dur': dur / 1e3,
+                                'pid': self.pid, 'tid': self.pid, 'args': args})
+
+    def start(self):
+        global _active
+        self.owns_tracemalloc = self.memory and not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def stop(self):
+        global _active
+        _active = None
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+        return self.events
+
+    def chrome_trace(self):
+        names = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid,
+                  'args': {'name': 'pipeline' if pid == self.pid else f'worker {pid}'}}
+                 for pid in dict.fromkeys(e['pid'] for e in self.events)]
+        return {'traceEvents': names + sorted(self.events, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+
+def active():
+    return _active
+
+def span(name, cat, **args):
+    """Tracer.span on the active tracer, or a no-op block when nothing is recording."""
+    return _active.span(name, cat, **args) if _active is not None else contextlib.nullcontext(args)
+
+@contextlib.contextmanager
+def recording(path, memory=True, summary_to=sys.stderr):
+    """Trace the enclosed run, then write the trace JSON to path and the summary to summary_to.
+
+    Both are written even when the run fails, which is when they are most useful.
+    """
+    tracer = Tracer(memory).start()
+    try:
+        yield tracer
+    finally:
+        tracer.stop()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(tracer.chrome_trace(), f)
+        if summary_to is not None:
+            summary_to.write(summary(tracer.events) + f'trace written to {path}\n')
+
+class TracedPattern:
+    """A compiled regex whose match / search / finditer calls show up in the trace."""
+    def __init__(self, pattern, label):
+        self.pattern, self.label = pattern, label
+
+    def __getattr__(self, attr):
+        return getattr(self.pattern, attr)
+
+    def match(self, string, pos=0, endpos=sys.maxsize):
+        with span(f'regex {self.label}', 'regex', call='match') as args:
+            m = self.pattern.match(string, pos, endpos)
+            args.update(bytes=(m.end() if m else min(len(string), endpos)) - pos, matches=int(m is not None))
+        return m
+
+    def search(self, string, pos=0, endpos=sys.maxsize):
+        with span(f'regex {self.label}', 'regex', call='search') as args:
+            m = self.pattern.search(string, pos, endpos)
+            args.update(bytes=(m.end() if m else min(len(string), endpos)) - pos, matches=int(m is not None))
+        return m
+
+    def finditer(self, string, pos=0, endpos=sys.maxsize):
+        with span(f'regex {self.label}', 'regex', call='finditer') as args:
+            found = list(self.pattern.finditer(string, pos, endpos))
+            args.update(bytes=min(len(string), endpos) - pos, matches=len(found))
+        return iter(found)
+
+def guard_report(fn, src):
+    """{region: state} before fn runs: 'guard <g>' when a guard short-circuits it, else 'no anchor' / 'live'."""
+    report = {}
+    for label, (anchor, guard) in getattr(fn, 'writes', {}).items():
+        present = [g for g in as_tuple(guard) if g is not None and g in src]
+        if present:
+            report[label] = f'guard {present[0]!r}'
+        elif anchor is not None and anchor not in src:
+            report[label] = 'no anchor'
+        else:
+            report[label] = 'live'
+    return report
+
+def traced_patch(fn, src, path, run):
+    """Call run(src) (fn adapted to a Source) inside a patch event describing fn's outcome."""
+    if _active is None:
+        return run(src)
+    name = f'{fn.__module__}.{fn.__name__}'
+    markers = getattr(fn, 'markers', ())
+    with span(name, 'patch', file=path) as args:
+        args['regions'] = guard_report(fn, src)
+        args['markers'] = {m: len(src.positions(m)) for m in markers if m in src.anchors.hits}
+        before, length = len(src.edits()), len(src)
+        run(src)
+        args['edits'] = len(src.edits()) - before
+        args['bytes'] = len(src) - length
+        args['short_circuit'] = sorted(r for r, state in args['regions'].items() if state.startswith('guard'))
+
+def summary(events):
+    """Events aggregated by name (calls, time, bytes, matches, peak), then one line per patch."""
+    rows = {}
+    for e in events:
+        if e.get('ph') != 'X':
+            continue
+        r = rows.setdefault(e['name'], [e['cat'], 0, 0.0, 0.0, 0, 0, 0])
+        a = e['args']
+        r[1] += 1
+        r[2] += e['dur'] / 1e3
+        r[3] = max(r[3], e['dur'] / 1e3)
+        r[4] += a.get('bytes', 0) if e['cat'] != 'patch' else 0
+        r[5] += a.get('matches', 0)
+        r[6] = max(r[6], a.get('peak_kib', 0))
+    out = [f'{"event":44} {"cat":6} {"calls":>6} {"total ms":>9} {"max ms":>8} {"bytes":>10} {"matches":>8} {"peak KiB":>9}']
+    for name, (cat, calls, total, longest, nbytes, matches, peak) in sorted(rows.items(), key=lambda kv: -kv[1][2]):
+        out.append(f'{name[:44]:44} {cat:6} {calls:>6} {total:>9.2f} {longest:>8.2f} {nbytes:>10} {matches:>8} {peak:>9}')
+    for e in events:
+        if e.get('cat') != 'patch':
+            continue
+        a = e['args']
+        if 'error' in a:
+            outcome = f'failed ({a["error"]}); markers {a.get("markers")}'
+        elif a.get('edits'):
+            outcome = f'{a["edits"]} edit(s), {a["bytes"]:+d} chars'
+        elif a.get('short_circuit'):
+            outcome = 'short-circuited by ' + ', '.join(f'{r} ({a["regions"][r]})' for r in a['short_circuit'])
+        else:
+            outcome = 'no change'
+        out.append(f'{e["name"]} [{a.get("file")}]: {outcome}')
+    return '\n'.join(out) + '\n'
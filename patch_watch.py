@@ -0,0 +1,222 @@
+"""Watch mode: keep the tree in memory and re-patch only what an edit touches.
+
+Every target file stays loaded with its anchor index (the markers and
+guards of all the patches on it). When a file changes on disk, the changed
+span is cut out by comparing the old and new text, the index is updated
+for that span only, and just the patches whose markers were added, removed
+or moved inside it run again (plus any patch that declares it reads the
+file). The patches run over the kept index instead of a fresh scan.
+
+Changes come from inotify on the directories that hold the targets, or
+from polling mtimes where inotify is not available. A burst of saves is
+debounced into one cycle, and each cycle writes a file at most once. A
+file that was saved again while its patches ran is not overwritten; the
+next cycle picks it up.
+
+    python patch_watch.py [root] [--debounce 0.2] [--poll]
+"""
+import os, sys, time, ctypes, select, struct, argparse, pathlib, ctypes.util
+from bisect import bisect_left
+
+from patch_anchors import AnchorIndex, markers_for
+from patch_document import PieceTable, Source, common_affixes
+from patch_pipeline import MANIFEST, inputs, targets, write_atomic
+from patch_schedule import ConflictError, execute, name
+import patch_step14
+
+DEBOUNCE = 0.2
+POLL_INTERVAL = 0.5
+
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_Q_OVERFLOW = 0x100, 0x200, 0x4000
+IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM
+EVENT = struct.Struct('iIII')
+
+class Inotify:
+    """inotify on a few directories, through libc; yields changed paths relative to root."""
+    def __init__(self, root, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+        self.root, self.paths, self.libc = pathlib.Path(root), set(paths), libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        for d in sorted({str(pathlib.PurePosixPath(p).parent) for p in paths}):
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(self.root / d), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'cannot watch {self.root / d}')
+            self.dirs[wd] = '' if d == '.' else d + '/'
+
+    def wait(self, timeout):
+        """Changed paths (set) seen within `timeout` seconds; empty on timeout."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+            off = 0
+            while off < len(buf):
+                wd, mask, _, length = EVENT.unpack_from(buf, off)
+                if mask & IN_Q_OVERFLOW:
+                    changed |= self.paths
+                elif wd in self.dirs:
+                    rel = self.dirs[wd] + os.fsdecode(buf[off + EVENT.size:off + EVENT.size + length].rstrip(b'\0'))
+                    if rel in self.paths:
+                        changed.add(rel)
+                off += EVENT.size + length
+
+    def close(self):
+        os.close(self.fd)
+
+class Poller:
+    """Fallback for systems without inotify: compares (mtime, size) every POLL_INTERVAL."""
+    def __init__(self, root, paths):
+        self.root, self.paths = pathlib.Path(root), list(paths)
+        self.seen = {p: self.stat(p) for p in self.paths}
+
+    def stat(self, p):
+        try:
+            st = (self.root / p).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL))
+        changed = set()
+        for p in self.paths:
+            now = self.stat(p)
+            if now != self.seen[p]:
+                self.seen[p] = now
+                changed.add(p)
+        return changed
+
+    def close(self):
+        pass
+
+class Tracked:
+    """A file's current text and its anchor index, kept across cycles."""
+    def __init__(self, text, markers):
+        self.text = text
+        self.index = AnchorIndex(text, markers)
+
+    def update(self, text):
+        """Move to a new version of the file; returns the markers with hits in the changed span."""
+        prefix, suffix = common_affixes(self.text, text)
+        start, end, new_end = prefix, len(self.text) - suffix, len(text) - suffix
+        touched = self.hits_in(start, end)
+        old = PieceTable(self.text)
+        byte = self.index.locate(start, old).byte
+        self.index.replace(start, end, text[start:new_end], self.text[start:end], byte, PieceTable(text))
+        self.text = text
+        return touched | self.hits_in(start, new_end)
+
+    def hits_in(self, start, end):
+        return {p for p, hits in self.index.hits.items() if bisect_left(hits, end) > bisect_left(hits, start - len(p) + 1)}
+
+class Watcher:
+    def __init__(self, root=patch_step14.root, manifest=MANIFEST, strict=False, debounce=DEBOUNCE, log=print):
+        self.root, self.manifest, self.strict = pathlib.Path(root), manifest, strict
+        self.debounce, self.log = debounce, log
+        self.files = {}
+
+    def read(self, path):
+        try:
+            return (self.root / path).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+    def start(self):
+        """Load every input and bring the tree up to date with a full cycle."""
+        for path in inputs(self.manifest):
+            markers = markers_for(fn for p, fn in self.manifest if p == path)
+            self.files[path] = Tracked((self.root / path).read_text(encoding='utf-8'), markers)
+        self.run(self.manifest)
+
+    def plan(self, touched):
+        """Manifest entries to rerun for {path: touched markers}."""
+        return [(path, fn) for path, fn in self.manifest
+                if path in touched and (not getattr(fn, 'markers', ()) or touched[path] & set(fn.markers))
+                or any(f in touched for f in getattr(fn, 'files', ()) if f != path)]
+
+    def cycle(self, paths):
+        """Take in the files that changed on disk and rerun the patches the change reaches."""
+        touched = {}
+        for path in sorted(paths):
+            text = self.read(path)
+            if text is None or text == self.files[path].text:
+                continue  # gone for a moment (editor rename dance) or our own write
+            touched[path] = self.files[path].update(text)
+        if not touched:
+            return
+        todo = self.plan(touched)
+        for path in touched:
+            self.log(f'changed {path}: {sum(p == path for p, _ in todo)} of '
+                     f'{sum(p == path for p, _ in self.manifest)} patches to rerun')
+        if todo:
+            self.run(todo)
+
+    def run(self, todo):
+        texts = {path: t.text for path, t in self.files.items()}
+        sources = {path: Source.from_index(texts[path], self.files[path].index) for path in targets(todo)}
+        started = time.perf_counter()
+        sources = execute(texts, todo, jobs=1, strict=self.strict, log=self.log, sources=sources)
+        for path in targets(todo):
+            src, before = sources[path], texts[path]
+            if src.text == before:
+                continue
+            if self.read(path) != before:
+                self.log(f'skipped {path}: saved again while patching')
+                continue
+            write_atomic(self.root / path, src.text)
+            self.files[path].text, self.files[path].index = src.text, src.anchors
+            self.log(f'updated {path}')
+        self.log(f'cycle: {", ".join(name(fn) for _, fn in todo)} in {(time.perf_counter() - started) * 1e3:.1f} ms')
+
+    def serve(self, events):
+        """Block on `events` (Inotify or Poller) and run one cycle per burst of changes."""
+        while True:
+            pending = events.wait(None if isinstance(events, Inotify) else POLL_INTERVAL)
+            # debounce: keep collecting until the tree has been quiet for a while
+            while pending:
+                more = events.wait(self.debounce)
+                if not more:
+                    break
+                pending |= more
+            if pending:
+                try:
+                    self.cycle(pending)
+                except ConflictError as e:
+                    self.log(str(e))
+
+def watch(root=patch_step14.root, manifest=MANIFEST, strict=False, debounce=DEBOUNCE, poll=False):
+    watcher = Watcher(root, manifest, strict, debounce)
+    watcher.start()
+    paths = inputs(manifest)
+    try:
+        events = Poller(root, paths) if poll else Inotify(root, paths)
+    except OSError as e:
+        print(f'inotify unavailable ({e}), polling every {POLL_INTERVAL} s', file=sys.stderr)
+        events = Poller(root, paths)
+    print(f'watching {len(paths)} files under {root}', file=sys.stderr)
+    try:
+        watcher.serve(events)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        events.close()
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('root', nargs='?', default=patch_step14.root)
+    ap.add_argument('--debounce', type=float, default=DEBOUNCE, help='quiet time before a cycle (s, default: %(default)s)')
+    ap.add_argument('--strict', action='store_true', help='report conflicting patches instead of keeping the first')
+    ap.add_argument('--poll', action='store_true', help='poll mtimes instead of using inotify')
+    args = ap.parse_args()
+    watch(args.root, strict=args.strict, debounce=args.debounce, poll=args.poll)
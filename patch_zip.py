@@ -0,0 +1,182 @@
+"""Patch source snapshots directly inside their zip archives.
+
+Only the entries the manifest reads are decompressed. Every other entry,
+and every target the patches leave unchanged, is copied as its raw
+compressed bytes (local header, data, data descriptor) in bounded chunks,
+so nothing is recompressed or fully buffered. Changed entries are deflated
+again, with their original line endings, and the central directory is
+rewritten with the new offsets. Patches whose target (or a file they
+read) is not in the archive are skipped, or fail the run with --strict.
+
+    python patch_zip.py pvapp_step22_source_acsectionfix_ok.zip -o patched.zip
+    python patch_zip.py archives/*.zip -o patched/
+"""
+import os, time, zlib, struct, zipfile, argparse, pathlib, tempfile, collections
+
+from patch_cache import PatchCache
+from patch_pipeline import MANIFEST, inputs, targets, patch_files
+from patch_schedule import ConflictError
+
+LOCAL = struct.Struct('<4s2B4HL2L2H')
+CENTRAL = struct.Struct('<4s4B4HL2L5H2L')
+END = struct.Struct('<4s4H2LH')
+LOCAL_SIG, CENTRAL_SIG, END_SIG, DESCRIPTOR_SIG = b'PK\x03\x04', b'PK\x01\x02', b'PK\x05\x06', b'PK\x07\x08'
+CHUNK = 1 << 20
+
+def dos_time(date_time):
+    y, mo, d, h, mi, s = date_time
+    return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+def find_prefix(names, paths):
+    """Directory inside the archive that holds the tree ('' when it sits at the root).
+
+    Every directory some path could sit under is a candidate; the one holding
+    the most paths wins, so a nested file of the same name (lib/types.ts) does
+    not pull the tree into its directory. A tie fails rather than guess.
+    """
+    counts = collections.Counter()
+    for name in set(names):
+        for path in paths:
+            if name == path or name.endswith('/' + path):
+                counts[name[:len(name) - len(path)]] += 1
+    if not counts:
+        raise ValueError(f'none of {paths} found in archive')
+    (prefix, n), *rest = counts.most_common()
+    tied = [p for p, m in rest if m == n]
+    if tied:
+        raise ValueError(f'tree directory is ambiguous ({", ".join(repr(p) for p in [prefix, *tied])}); pass --prefix')
+    return prefix
+
+def copy_bytes(fin, fout, n):
+    while n > 0:
+        chunk = fin.read(min(CHUNK, n))
+        if not chunk:
+            raise ValueError('truncated zip entry')
+        fout.write(chunk)
+        n -= len(chunk)
+
+def copy_raw(fin, fout, info):
+    """Copy an entry's local header, compressed data and data descriptor untouched."""
+    fin.seek(info.header_offset)
+    header = fin.read(LOCAL.size)
+    fields = LOCAL.unpack(header)
+    if fields[0] != LOCAL_SIG:
+        raise ValueError(f'bad local header for {info.filename}')
+    fout.write(header)
+    copy_bytes(fin, fout, fields[10] + fields[11] + info.compress_size)
+    if info.flag_bits & 0x08:
+        sig = fin.read(4)
+        fout.write(sig)
+        copy_bytes(fin, fout, 12 if sig == DESCRIPTOR_SIG else 8)
+
+def write_deflated(fout, info, data):
+    """Write `data` as a new deflated entry; updates info's crc, sizes, flags and date."""
+    comp = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    packed = comp.compress(data) + comp.flush()
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.flag_bits = info.flag_bits & 0x800
+    info.CRC, info.compress_size, info.file_size = zlib.crc32(data), len(packed), len(data)
+    info.date_time = time.localtime()[:6]
+    info.extract_version = max(info.extract_version, 20)
+    name, extra = info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'cp437'), b''
+    t, d = dos_time(info.date_time)
+    fout.write(LOCAL.pack(LOCAL_SIG, info.extract_version, 0, info.flag_bits, info.compress_type,
+                          t, d, info.CRC, info.compress_size, info.file_size, len(name), len(extra)))
+    fout.write(name)
+    fout.write(packed)
+
+def write_central(fout, entries, comment):
+    start = fout.tell()
+    for info, offset in entries:
+        name = info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'cp437')
+        t, d = dos_time(info.date_time)
+        fout.write(CENTRAL.pack(CENTRAL_SIG, info.create_version, info.create_system, info.extract_version, 0,
+                                info.flag_bits, info.compress_type, t, d, info.CRC, info.compress_size,
+                                info.file_size, len(name), len(info.extra), len(info.comment), 0,
+                                info.internal_attr, info.external_attr, offset))
+        fout.write(name + info.extra + info.comment)
+    size = fout.tell() - start
+    fout.write(END.pack(END_SIG, 0, 0, len(entries), len(entries), size, start, len(comment)))
+    fout.write(comment)
+
+def newline(text):
+    """'\r\n' when every line of text ends with it: the patches then see LF and it is put back."""
+    crlf = text.count('\r\n')
+    return '\r\n' if crlf and crlf == text.count('\n') else '\n'
+
+def present(manifest, texts, strict=False):
+    """The manifest entries whose target and declared reads are all in texts."""
+    kept = []
+    for path, fn in manifest:
+        absent = [f for f in (path, *getattr(fn, 'files', ())) if f not in texts]
+        if not absent:
+            kept.append((path, fn))
+        elif strict:
+            raise ValueError(f'{fn.__module__}.{fn.__name__} needs {", ".join(absent)}, not in the archive')
+    return kept
+
+def patch_zip(src, dst, manifest=MANIFEST, prefix=None, jobs=None, strict=False, cache=None):
+    """Patch the tree stored in zip `src` into a new zip `dst`.
+
+    Returns {path: changed} for every manifest target, None for the ones
+    the archive does not hold (their patches are skipped).
+    """
+    src, dst = pathlib.Path(src), pathlib.Path(dst)
+    with zipfile.ZipFile(src) as zin:
+        infos = zin.infolist()
+        if len(infos) >= 0xFFFF or os.path.getsize(src) >= 0xFFFFFFFF:
+            raise ValueError(f'{src}: zip64 archives are not supported')
+        names = [i.filename for i in infos]
+        if prefix is None:
+            prefix = find_prefix(names, inputs(manifest))
+        # only the entries a patch reads are decompressed
+        texts = {path: zin.read(prefix + path).decode('utf-8') for path in inputs(manifest)
+                 if prefix + path in zin.NameToInfo}
+        comment = zin.comment
+    ends = {p: newline(t) for p, t in texts.items()}
+    texts = {p: t.replace('\r\n', '\n') if ends[p] == '\r\n' else t for p, t in texts.items()}
+    out = patch_files(texts, present(manifest, texts, strict), jobs=jobs, strict=strict, cache=cache)
+    changed = {prefix + p: out[p].replace('\n', ends[p]).encode('utf-8') for p in texts if out[p] != texts[p]}
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix='.' + dst.name + '.', suffix='.tmp')
+    try:
+        with open(src, 'rb') as fin, os.fdopen(fd, 'wb') as fout:
+            entries = []
+            for info in infos:
+                offset = fout.tell()
+                if info.filename in changed:
+                    write_deflated(fout, info, changed[info.filename])
+                else:
+                    copy_raw(fin, fout, info)
+                entries.append((info, offset))
+            write_central(fout, entries, comment)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return {p: None if p not in texts else prefix + p in changed for p in targets(manifest)}
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('archives', nargs='+')
+    ap.add_argument('-o', '--out', required=True, help='output zip (one input) or directory (several)')
+    ap.add_argument('--prefix', help="tree directory inside the archives (default: detected)")
+    ap.add_argument('-j', '--jobs', type=int)
+    ap.add_argument('--strict', action='store_true')
+    ap.add_argument('--no-cache', action='store_true', help='ignore the patch result cache')
+    args = ap.parse_args()
+    cache = None if args.no_cache else PatchCache()
+    out = pathlib.Path(args.out)
+    if len(args.archives) > 1 or out.is_dir():
+        out.mkdir(parents=True, exist_ok=True)
+    for archive in args.archives:
+        dst = out / pathlib.Path(archive).name if out.is_dir() else out
+        try:
+            result = patch_zip(archive, dst, prefix=args.prefix, jobs=args.jobs, strict=args.strict, cache=cache)
+        except (ConflictError, ValueError) as e:
+            raise SystemExit(f'{archive}: {e}')
+        for path, changed in result.items():
+            status = 'skipped (not in archive)' if changed is None else 'updated' if changed else 'nochange'
+            print(status, path, *([f'({archive})'] if len(args.archives) > 1 else []))
+    if cache is not None:
+        cache.save()
@@ -0,0 +1,15 @@
+import sys, pathlib
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+@pytest.fixture
+def skeleton_tree(tmp_path):
+    """The bench_patches skeletons written out as a tree the pipeline can patch."""
+    from bench_patches import SKELETONS
+    for path, text in SKELETONS.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text, encoding='utf-8')
+    return tmp_path
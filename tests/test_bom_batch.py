@@ -0,0 +1,36 @@
+"""The batch BOM against calculateBillOfMaterials.
+
+The expected BOMs come from the TS code run through node
+(`python bom_batch.py ... --write-fixture`, see the module docstring),
+for the default catalogs and for tests/fixtures/bom_catalog.json.
+"""
+import json, pathlib
+
+import pytest
+
+from bom_batch import batch, compare, load_catalogs, merge_into
+from dc_audit import read_projects
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / 'fixtures'
+PROJECTS = FIXTURES / 'bom_projects.ndjson'
+
+def expected(name):
+    with open(FIXTURES / name, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.mark.parametrize('catalog, fixture', [(None, 'bom_ts.ndjson'), (FIXTURES / 'bom_catalog.json', 'bom_ts_catalog.ndjson')])
+def test_matches_ts(catalog, fixture):
+    results = list(batch(read_projects([PROJECTS]), load_catalogs(catalog), jobs=1, chunk=7))
+    assert compare(results, expected(fixture)) == 0
+
+def test_pool_keeps_input_order():
+    collections = load_catalogs()
+    serial = list(batch(read_projects([PROJECTS]), collections, jobs=1))
+    assert list(batch(read_projects([PROJECTS]), collections, jobs=2, chunk=5)) == serial
+
+def test_totals():
+    totals = {}
+    for bom in expected('bom_ts.ndjson'):
+        merge_into(totals, bom)
+    for item_id, entry in totals.items():
+        assert entry['quantity'] == sum(i['quantity'] for bom in expected('bom_ts.ndjson') for i in bom if i['id'] == item_id)
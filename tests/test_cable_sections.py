@@ -0,0 +1,41 @@
+import numpy as np
+
+from cable_sections import MAX_IDC_FOR_SECTION, NO_DC_SECTION, Optimizer
+from dc_audit import RHO, THRESHOLDS
+from js_compat import fixed
+from ts_literals import load_const
+
+CABLES = load_const('data/cables.ts', 'DEFAULT_CABLES')
+
+def runs():
+    current = np.array([9.0, 14.0, 30.0, 11.0, 12.0])
+    vmp = np.array([380.0, 420.0, 500.0, np.nan, 400.0])
+    length = np.array([25.0, 80.0, 10.0, 20.0, 0.0])
+    return current, vmp, length
+
+def test_dc_picks_the_first_feasible_section():
+    optimizer = Optimizer()
+    current, vmp, length = runs()
+    picked = optimizer.dc(current, vmp, length)
+    assert picked[3] is None and picked[4] is None
+    for i, v, l, row in list(zip(current, vmp, length, picked))[:3]:
+        for t in THRESHOLDS:
+            want = None
+            for section, cable in optimizer.catalog['dc']:
+                drop = 2 * l * i * RHO / section / v * 100
+                if i <= MAX_IDC_FOR_SECTION.get(section, np.inf) and drop <= t:
+                    want = {'id': cable['id'], 'description': cable['description'], 'sectionMm2': section, 'dropPct': fixed(drop, 2)}
+                    break
+            assert row[f'{t}%'] == want
+
+def test_dc_without_dc_cables():
+    optimizer = Optimizer({k: c for k, c in CABLES.items() if 'H1Z2Z2' not in c['description'].upper()})
+    assert optimizer.catalog['dc'] == []
+    picked = optimizer.dc(*runs())
+    assert picked[:3] == [{'1%': None, '3%': None, 'skipped': NO_DC_SECTION}] * 3
+    assert picked[3:] == [None, None]
+
+def test_ac_without_ac_cables():
+    optimizer = Optimizer({k: c for k, c in CABLES.items() if 'R2V' not in c['description']})
+    out = optimizer.ac([(6000, 20, False), (9000, 30, True), (0, 10, False)])
+    assert [r and (r['1%'], r['3%'], r['breakerA']) for r in out] == [(None, None, None), (None, None, None), None]
@@ -0,0 +1,114 @@
+import io, json, random
+
+import pytest
+
+from catalog_backup import ChainError, backup, backup_files, header, restore, verify
+
+def catalog(rng, n=60):
+    return {
+        'panels': {f'P{i}': {'id': f'P{i}', 'power': rng.choice((400, 450, 500)), 'name': f'panel é {i}'} for i in range(n)},
+        'cables': {f'C{i}': {'id': f'C{i}', 'description': f'CABLE R2V 3G{i}'} for i in range(n // 2)},
+        'boxes': {},
+    }
+
+def mutate(rng, data):
+    data = json.loads(json.dumps(data))
+    panels = data['panels']
+    for k in rng.sample(list(panels), 5):
+        panels[k]['power'] += 5                      # update in place
+    for k in rng.sample(list(panels), 4):
+        del panels[k]                                 # delete
+    for k in rng.sample(list(panels), 3):
+        panels[k] = panels.pop(k)                     # move to the end
+    panels[f'N{rng.randrange(10**6)}'] = {'id': 'new', 'power': 300}
+    if 'cables' in data and rng.random() < 0.5:
+        data['cables'] = dict(reversed(list(data['cables'].items())))
+    if rng.random() < 0.3:
+        data.pop('boxes', None)
+    else:
+        data['boxes'] = {'B1': {'id': 'B1', 'n': rng.random()}}
+    return data
+
+def write(tmp_path, data):
+    path = tmp_path / 'getAllData.json'
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return path
+
+def restored(directory, upto=None):
+    out = io.StringIO()
+    restore(out, directory, upto)
+    return json.loads(out.getvalue())
+
+def same(a, b):
+    """Equal, with the same key order in every collection (null collections are not kept)."""
+    a = {c: v for c, v in a.items() if v is not None}
+    return a == b and list(a) == list(b) and all(list(a[c]) == list(b[c]) for c in a)
+
+@pytest.fixture
+def history(tmp_path):
+    rng = random.Random(7)
+    directory, versions = tmp_path / 'backups', []
+    data = catalog(rng)
+    for _ in range(6):
+        backup(write(tmp_path, data), directory)
+        versions.append((header(backup_files(directory)[-1])['id'], data))
+        data = mutate(rng, data)
+    return directory, versions
+
+def test_restore_every_version(history):
+    directory, versions = history
+    assert [header(p)['kind'] for p in backup_files(directory)] == ['full'] + ['delta'] * 5
+    for backup_id, data in versions:
+        assert same(data, restored(directory, backup_id))
+    assert same(versions[-1][1], restored(directory))
+
+def test_verify_clean_chain(history):
+    assert verify(history[0]) == []
+
+def test_unchanged_data_writes_nothing(history, tmp_path):
+    directory, versions = history
+    assert backup(write(tmp_path, versions[-1][1]), directory) is None
+    assert len(backup_files(directory)) == len(versions)
+
+def test_full_snapshot_restarts_the_chain(history, tmp_path):
+    directory, versions = history
+    backup(write(tmp_path, versions[2][1]), directory, full=True)
+    assert same(versions[2][1], restored(directory))
+    assert verify(directory) == []
+
+def test_tampered_record(history):
+    directory, _ = history
+    path = backup_files(directory)[2]
+    path.write_text(path.read_text(encoding='utf-8').replace('"power":4', '"power":9', 1), encoding='utf-8')
+    assert any('does not match its hash' in p for _, p in verify(directory))
+
+def test_missing_delta(history):
+    directory, _ = history
+    backup_files(directory)[3].unlink()
+    problems = verify(directory)
+    assert any('is not the previous backup' in p for _, p in problems)
+    assert any('catalog digest mismatch' in p for _, p in problems)
+
+def test_truncated_file(history):
+    directory, _ = history
+    path = backup_files(directory)[-1]
+    path.write_bytes(b''.join(path.read_bytes().splitlines(keepends=True)[:-1]))
+    assert (path.name, 'truncated (no end record)') in verify(directory)
+
+def test_unknown_id(history):
+    with pytest.raises(ChainError):
+        restored(history[0], 'nope')
+
+def test_emptied_collection_is_kept(tmp_path):
+    directory = tmp_path / 'backups'
+    data = {'panels': {'P1': {'id': 'P1'}}, 'k2': {'K1': {'id': 'K1'}}, 'boxes': None}
+    backup(write(tmp_path, data), directory)
+    data = {'panels': {}, 'k2': {'K1': {'id': 'K1'}}, 'boxes': None}
+    assert backup(write(tmp_path, data), directory) is not None
+    assert header(backup_files(directory)[-1])['collections'] == ['panels', 'k2']
+    assert restored(directory) == {'panels': {}, 'k2': {'K1': {'id': 'K1'}}}
+    assert list(restored(directory)) == ['panels', 'k2']
+    assert verify(directory) == []
+    full = tmp_path / 'full'
+    backup(write(tmp_path, data), full)
+    assert restored(full) == {'panels': {}, 'k2': {'K1': {'id': 'K1'}}}
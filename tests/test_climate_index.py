@@ -0,0 +1,43 @@
+"""The climate port and index against answers of the TS functions.
+
+tests/fixtures/climate_ts.ndjson comes from `python climate_index.py fixture`
+(node + typescript); run it again after editing the TS tables.
+"""
+import json
+
+import pytest
+
+import climate
+from climate_index import FIXTURE, ClimateIndex, compare
+
+def cases():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    return ClimateIndex(tmp_path_factory.mktemp('climate') / 'index.bin')
+
+def test_fixture_covers_every_department():
+    codes = {code for code, *_ in cases()}
+    assert {f'{d:02d}000' for d in range(100)} <= codes
+    assert set(climate.COASTAL_EXCEPTIONS_MAP) <= codes
+    assert {'', '2A004', '97150', '20000'} <= codes
+
+@pytest.mark.parametrize('code, altitudes, climates, zone', cases(), ids=[repr(c[0]) for c in cases()])
+def test_port(code, altitudes, climates, zone):
+    assert [climate.location_climate(code, 0 if a is None else a) for a in altitudes] == climates
+    assert climate.wind_zone(code) == zone
+
+def test_index(index):
+    assert compare(index, cases()) == 0
+
+def test_vectorised_lookup(index):
+    rows = cases()
+    codes = [code for code, *_ in rows]
+    for alt in (None, 0, 401, 1901):
+        expected = [climates[altitudes.index(alt)] for _, altitudes, climates, _ in rows]
+        temp_min, tmax, zone = index.climates(codes, [alt] * len(codes))
+        assert temp_min.tolist() == [e['tempMin'] for e in expected]
+        assert tmax.tolist() == [e['tempMaxAmb'] for e in expected]
+        assert [index.zones[z] for z in zone] == [r[3] for r in rows]
@@ -0,0 +1,41 @@
+"""The compatibility matrix against answers of checkElectricalCompatibility.
+
+tests/fixtures/compat_ts.ndjson comes from `python compat_matrix.py fixture`
+(node + typescript); run it again after editing the panel, inverter or
+climate tables.
+"""
+import json, operator, functools
+
+import pytest
+
+from compat_matrix import FIXTURE, NOT_STRING, CompatMatrix, compare
+
+def rows():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture(scope='module')
+def matrix(tmp_path_factory):
+    return CompatMatrix(tmp_path_factory.mktemp('compat') / 'matrix.bin')
+
+def test_fixture_covers_every_pair(matrix):
+    pairs = {(panel, inverter) for panel, inverter, *_ in rows()}
+    assert pairs == {(p['name'], i['id']) for p in matrix.panels for i in matrix.inverters}
+
+def test_cells_match_ts(matrix):
+    fixture = rows()
+    assert compare(matrix, [tuple(r[:5]) for r in fixture], [r[5] for r in fixture]) == 0
+
+def test_micro_inverters_take_one_panel(matrix):
+    for i, inv in enumerate(matrix.inverters):
+        if inv['electrical']['maxInputVoltage'] < 100:
+            assert not (matrix.flags[:, i, :, 0] & NOT_STRING).any()
+            assert (matrix.flags[:, i, :, 1:] & NOT_STRING).all()
+
+def test_query_takes_the_worst_band(matrix):
+    temp_min, name = matrix.climates[0][0], matrix.panels[0]['name']
+    bands = [matrix.query(12, temp_min, matrix.climates[c][1], name=name) for c in matrix.climate_rows(temp_min)]
+    assert len(bands) > 1
+    for k, (_, inv, flags, voc, vmp) in enumerate(matrix.query(12, temp_min, name=name)):
+        assert flags == functools.reduce(operator.or_, (band[k][2] for band in bands))
+        assert voc == max(band[k][3] for band in bands) and vmp == min(band[k][4] for band in bands)
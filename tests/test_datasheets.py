@@ -0,0 +1,46 @@
+"""parse_datasheet against parseDatasheet, and the text cache of the ingestion.
+
+tests/fixtures/datasheets_ts.ndjson holds [text, parseDatasheet(text)] pairs
+written by `python datasheets.py <sheets> --write-fixture ...` (node + typescript).
+"""
+import json, pathlib
+
+import pytest
+
+from datasheets import TextCache, ingest, normalise, parse_datasheet, sheet_kind
+
+FIXTURE = pathlib.Path(__file__).resolve().parent / 'fixtures' / 'datasheets_ts.ndjson'
+
+def pairs():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.mark.parametrize('text, expected', pairs(), ids=[f'sheet{k}' for k in range(len(pairs()))])
+def test_matches_parse_datasheet(text, expected):
+    assert parse_datasheet(text) == expected
+
+def test_fixture_covers_every_kind():
+    assert {sheet_kind(normalise(text)) for text, _ in pairs()} == {'panel', 'inverter', None}
+
+def test_cache_extracts_only_new_or_changed_sheets(tmp_path):
+    sheets = tmp_path / 'sheets'
+    sheets.mkdir()
+    texts = [t for t, _ in pairs()[:6]]
+    for k, text in enumerate(texts):
+        (sheets / f'{k}.txt').write_text(text, encoding='utf-8')
+    logged = []
+    cache = TextCache(tmp_path / 'cache.json')
+    first = list(ingest([sheets], cache, workers=1, log=logged.append))
+    cache.save()
+    assert [c for _, _, c, _ in first] == [parse_datasheet(t) for t in texts]
+    extracted = len(logged)
+    (sheets / '0.txt').write_text(texts[0] + '\nOnduleur\n', encoding='utf-8')
+    logged.clear()
+    again = list(ingest([sheets], TextCache(tmp_path / 'cache.json'), workers=1, log=logged.append))
+    assert logged == ['extracted 1/1'] and extracted == len(set(texts))
+    assert again[0][1] == texts[0] + '\nOnduleur\n'
+    assert [r[1] for r in again[1:]] == texts[1:]
+
+def test_fixture_covers_python_only_whitespace():
+    # \x1c-\x1f and \x85 are \s to Python but not to JS
+    assert any(c in text for text, _ in pairs() for c in '\x1c\x1d\x1e\x1f\x85')
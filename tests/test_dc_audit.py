@@ -0,0 +1,68 @@
+"""The batch DC audit against the app's compatibilityReport and 1B block.
+
+tests/fixtures/dc_audit_ts.ndjson holds, per project of dc_audit_projects.ndjson,
+the stringsAnalysis rows with the 1B ΔU / ΔU% the app computes from them (None
+when the app has no report), written by `python dc_audit.py ... --write-fixture`
+(node + typescript).
+"""
+import json, pathlib
+
+import pytest
+
+from climate_index import ClimateIndex
+from dc_audit import RHO, active_inverter, audit, default_inverters, read_projects
+from js_compat import fixed
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / 'fixtures'
+PROJECTS = FIXTURES / 'dc_audit_projects.ndjson'
+
+@pytest.fixture(scope='module')
+def reports(tmp_path_factory):
+    climates = ClimateIndex(tmp_path_factory.mktemp('climate') / 'index.bin')
+    with open(FIXTURES / 'dc_audit_ts.ndjson', encoding='utf-8') as f:
+        expected = [json.loads(line) for line in f]
+    projects = [p for _, p in read_projects([PROJECTS])]
+    return list(zip(projects, audit(read_projects([PROJECTS]), chunk=16, climates=climates), expected, strict=True))
+
+def rows(report):
+    return [{'mpptIndex': m['mpptIndex'], 'vmpHot': m['vmpHot'], 'iscCalculation': m['currentA'],
+             'lengthM': m['lengthM'], 'sectionMm2': m['sectionMm2'], 'missing': m['status'] == 'missing',
+             'dropV': m['dropV'], 'dropPct': m['dropPct']} for m in report['mppts']]
+
+def test_audited_projects_match_the_app(reports):
+    audited = [(r, ts) for _, r, ts in reports if r['skipped'] is None]
+    assert len(audited) > 20
+    for report, ts in audited:
+        assert rows(report) == ts, report['id']
+
+def test_fixture_covers_every_status(reports):
+    statuses = {m['status'] for _, r, _ in reports for m in r['mppts']}
+    assert statuses == {'ok', 'over 1%', 'over 3%', 'missing'}
+    assert {r['skipped'] for _, r, _ in reports} == {None, 'micro system', 'strings not assigned'}
+
+def test_unassigned_strings_have_no_report(reports):
+    skipped = [ts for _, r, ts in reports if r['skipped'] == 'strings not assigned']
+    assert skipped and all(ts is None for ts in skipped)
+
+def test_micro_inverters_have_no_strings(reports):
+    inverters = default_inverters()
+    micro = [(p, r, ts) for p, r, ts in reports if r['skipped'] == 'micro system'
+             and (inv := active_inverter(p, inverters)) and inv['electrical']['maxInputVoltage'] < 100]
+    assert micro
+    for _, report, ts in micro:
+        assert report['mppts'] == [] and ts == []
+
+def test_missing_length_or_section(reports):
+    missing = [m for _, r, _ in reports for m in r['mppts'] if m['status'] == 'missing']
+    assert missing
+    for m in missing:
+        assert m['lengthM'] <= 0 or m['sectionMm2'] <= 0
+        assert m['dropV'] is None and m['dropPct'] is None
+
+def test_drop_formula(reports):
+    for _, report, _ in reports:
+        for m in report['mppts']:
+            if m['status'] != 'missing':
+                drop = 2 * m['lengthM'] * m['currentA'] * RHO / m['sectionMm2']
+                assert m['dropV'] == fixed(drop, 1)
+                assert m['dropPct'] == fixed(drop / m['vmpHot'] * 100, 2)
@@ -0,0 +1,35 @@
+import random
+
+from patch_anchors import AnchorIndex, Automaton
+
+def naive(text, marker):
+    return [i for i in range(len(text)) if text.startswith(marker, i)]
+
+def test_automaton_finds_every_overlapping_match():
+    patterns = ['he', 'she', 'his', 'hers', 'ushers', 'e', 'sh']
+    text = 'ushers and his sheep; she said hershe'
+    found = sorted(Automaton(patterns).scan(text))
+    assert found == sorted((i, p) for p in patterns for i in naive(text, p))
+
+def test_index_matches_naive_search():
+    rng = random.Random(1)
+    markers = ['ab', 'aba', 'b\na', 'Câblage', 'é', 'aaaa']
+    for _ in range(50):
+        text = ''.join(rng.choice('ab\né Câblage') for _ in range(rng.randrange(200)))
+        index = AnchorIndex(text, markers)
+        for m in markers:
+            assert index.positions(m) == naive(text, m)
+            assert (m in index) == (m in text)
+            assert index.find(m, 17) == text.find(m, 17)
+
+class Text(str):
+    def slice(self, a, b):
+        return self[a:b]
+
+def test_locate_counts_utf8_bytes():
+    text = Text('élan\nà côté\nfin')
+    index = AnchorIndex(text, ['fin'])
+    pos = text.index('côté')
+    anchor = index.locate(pos, text)
+    assert (anchor.line, anchor.col) == (2, 3)
+    assert anchor.byte == len(text[:pos].encode('utf-8'))
@@ -0,0 +1,49 @@
+import inspect
+
+import pytest
+
+import patch_cache, patch_document, patch_step14
+from bench_patches import SKELETONS
+from patch_cache import PatchCache, digest
+from patch_pipeline import MANIFEST, patch_files, patch_sources
+
+@pytest.fixture
+def patched():
+    return patch_files(SKELETONS, jobs=1)
+
+def test_patched_files_are_a_hit(tmp_path, patched):
+    cache = PatchCache(tmp_path / 'cache.json')
+    assert set(patch_sources(SKELETONS, jobs=1, cache=cache)) == set(SKELETONS)
+    # the outputs were recorded, but the inputs are not known to be patched yet
+    assert set(patch_sources(patched, jobs=1, cache=cache)) == set(SKELETONS)
+    cache.save()
+    assert patch_sources(patched, jobs=1, cache=PatchCache(tmp_path / 'cache.json')) == {}
+
+def test_changed_content_misses(tmp_path, patched):
+    cache = PatchCache(tmp_path / 'cache.json')
+    patch_sources(patched, jobs=1, cache=cache)
+    texts = dict(patched, **{'types.ts': patched['types.ts'] + '\n// edited\n'})
+    assert set(patch_sources(texts, jobs=1, cache=cache)) == {'types.ts'}
+
+@pytest.mark.parametrize('module', [patch_step14, patch_document], ids=['patch', 'shared'])
+def test_changed_patch_source_invalidates(tmp_path, patched, monkeypatch, module):
+    cache = PatchCache(tmp_path / 'cache.json')
+    patch_sources(patched, jobs=1, cache=cache)
+    assert patch_sources(patched, jobs=1, cache=cache) == {}
+    monkeypatch.setitem(patch_cache._module_hashes, inspect.getsourcefile(module), 'edited')
+    rerun = set(patch_sources(patched, jobs=1, cache=cache))
+    touched = {path for path, fn in MANIFEST if fn.__module__ == 'patch_step14'}
+    assert rerun == (touched if module is patch_step14 else set(SKELETONS))
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = PatchCache(tmp_path / 'cache.json', max_entries=2)
+    fns = [patch_step14.patch_types]
+    texts = {f'{k}.ts': f'// {k}\n' for k in 'abc'}
+    cache.record('a.ts', texts, fns, texts['a.ts'])
+    cache.record('b.ts', texts, fns, texts['b.ts'])
+    assert cache.is_noop('a.ts', texts, fns)          # a is now the most recently used
+    cache.record('c.ts', texts, fns, texts['c.ts'])
+    assert [cache.is_noop(p, texts, fns) for p in texts] == [True, False, True]
+    cache.save()
+    reloaded = PatchCache(tmp_path / 'cache.json', max_entries=2)
+    assert [e['out'] for e in reloaded.entries.values()] == [digest(texts['a.ts']), digest(texts['c.ts'])]
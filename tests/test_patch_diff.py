@@ -0,0 +1,67 @@
+import re, random
+
+import pytest
+
+from bench_patches import SKELETONS
+from patch_diff import unified_diff
+from patch_document import Source
+from patch_pipeline import patch_sources
+
+HUNK = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+LINE = re.compile(r'[^\n]*\n|[^\n]+')
+
+def apply(original, diff):
+    """Apply a unified diff to original, checking every context and removed line."""
+    # like patch, only '\n' ends a line
+    lines = LINE.findall(original)
+    body = LINE.findall(diff)[2:]
+    out, pos, i = [], 0, 0
+    while i < len(body):
+        m = HUNK.match(body[i])
+        assert m, body[i]
+        start, length = int(m[1]), int(m[2] or 1)
+        start = start - 1 if length else start
+        out += lines[pos:start]
+        pos, i = start, i + 1
+        while i < len(body) and not body[i].startswith('@@'):
+            tag, line = body[i][0], body[i][1:]
+            i += 1
+            if i < len(body) and body[i] == '\\ No newline at end of file\n':
+                line, i = line[:-1], i + 1
+            if tag in ' -':
+                assert lines[pos] == line
+                pos += 1
+            if tag in ' +':
+                out.append(line)
+    return ''.join(out + lines[pos:])
+
+def random_source(seed):
+    rng = random.Random(seed)
+    words = ['alpha', 'beta', 'gamma', '', 'é', 'b\u2028x', 'b\x0cx', 'b\rx', '\x1c', '\x85', '\x0b', '\r']
+    text = ''.join(rng.choice(words) + rng.choice(('\n', ' ', '\n')) for _ in range(120))
+    if rng.random() < 0.5:
+        text = text.rstrip('\n')
+    src = Source(text, ())
+    for _ in range(rng.randrange(1, 12)):
+        a = rng.randrange(len(src) + 1)
+        b = min(len(src), a + rng.choice((0, 0, 2, 15, 60)))
+        src.replace(a, b, ''.join(rng.choice(words) + rng.choice(('\n', ' ', '')) for _ in range(rng.randrange(4))))
+    return src
+
+@pytest.mark.parametrize('seed', range(40))
+def test_diff_applies_back(seed):
+    src = random_source(seed)
+    diff = unified_diff(src, 'f.txt')
+    assert apply(src.original, diff) == src.text
+    assert bool(diff) == (src.text != src.original)
+
+def test_patch_run_diff_applies_back():
+    for path, src in patch_sources(SKELETONS, jobs=1).items():
+        diff = unified_diff(src, path)
+        assert diff.startswith(f'--- a/{path}\n+++ b/{path}\n@@ ')
+        assert apply(SKELETONS[path], diff) == src.text
+
+def test_no_edit_no_diff():
+    src = Source('same\n', ())
+    src.replace(0, 4, 'same')
+    assert unified_diff(src, 'f.txt') == ''
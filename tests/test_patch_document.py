@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from patch_document import Source, as_source_patch
+from tsx_outline import parse as parse_outline
+
+MARKERS = ['ab', 'aba', 'b\na', 'é\n', 'xyz']
+
+def naive(text, marker):
+    return [i for i in range(len(text)) if text.startswith(marker, i)]
+
+def random_edits(seed, steps=60):
+    rng = random.Random(seed)
+    text = ''.join(rng.choice('abé\nxyz') for _ in range(300))
+    src, model = Source(text, MARKERS), text
+    for _ in range(steps):
+        a = rng.randrange(len(model) + 1)
+        b = min(len(model), a + rng.choice((0, 0, 1, 5, 30)))
+        block = ''.join(rng.choice('abé\nxyz') for _ in range(rng.choice((0, 1, 3, 12))))
+        src.replace(a, b, block)
+        model = model[:a] + block + model[b:]
+        yield src, model
+
+@pytest.mark.parametrize('seed', range(8))
+def test_anchor_positions_follow_edits(seed):
+    for src, model in random_edits(seed):
+        assert len(src) == len(model)
+        for m in MARKERS:
+            assert src.positions(m) == naive(model, m)
+    assert src.text == model
+
+@pytest.mark.parametrize('seed', range(4))
+def test_locate_after_edits(seed):
+    for src, model in random_edits(seed, 30):
+        for pos in range(0, len(model), 37):
+            anchor = src.locate(pos)
+            before = model[:pos]
+            assert anchor.line == before.count('\n') + 1
+            assert anchor.col == pos - (before.rfind('\n') + 1) + 1
+            assert anchor.byte == len(before.encode('utf-8'))
+
+@pytest.mark.parametrize('seed', range(4))
+def test_edit_log_replays_onto_the_original(seed):
+    for src, model in random_edits(seed, 40):
+        text, shift = src.original, 0
+        for a, b, block in src.edits():
+            text = text[:a + shift] + block + text[b + shift:]
+            shift += len(block) - (b - a)
+        assert text == model
+        assert src.slice(10, 90) == model[10:90]
+
+def test_text_patch_records_the_changed_span():
+    src = Source('one two three', ())
+    as_source_patch(lambda t: t.replace('two', 'deux'))(src)
+    assert src.text == 'one deux three'
+    assert src.edits() == [(4, 7, 'deux')]
+
+def test_out_of_range_edit():
+    with pytest.raises(IndexError):
+        Source('abc', ()).replace(2, 5, 'x')
+
+def test_patch_types_parses_once_and_never_joins(monkeypatch):
+    import patch_document
+    from bench_patches import SKELETONS
+    from patch_pipeline import patch_files
+    from patch_step14 import patch_types
+    parsed = []
+    monkeypatch.setattr(patch_document, 'parse_outline', lambda text: parsed.append(text) or parse_outline(text))
+    src = Source(SKELETONS['types.ts'], patch_types.markers)
+    patch_types(src)
+    assert len(parsed) == 1 and parsed[0] is src.original
+    assert src.doc._text is None  # the text is first joined when it is read back
+    assert src.text == patch_files(SKELETONS, jobs=1)['types.ts']
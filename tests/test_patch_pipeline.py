@@ -0,0 +1,34 @@
+from bench_patches import SKELETONS
+from patch_pipeline import MANIFEST, patch_files, run
+from patch_schedule import find_conflicts
+from patch_anchors import markers_for
+from patch_document import Source
+
+def snapshot(root):
+    return {path: (root / path).read_text(encoding='utf-8') for path in SKELETONS}
+
+def test_second_run_is_a_noop(skeleton_tree, capsys):
+    run(skeleton_tree, jobs=1, cache=False)
+    first = snapshot(skeleton_tree)
+    assert first != SKELETONS
+    capsys.readouterr()
+    run(skeleton_tree, jobs=1, cache=False)
+    assert snapshot(skeleton_tree) == first
+    assert 'updated' not in capsys.readouterr().out
+
+def test_each_region_written_once(skeleton_tree):
+    run(skeleton_tree, jobs=1, cache=False)
+    run(skeleton_tree, jobs=1, cache=False)
+    out = snapshot(skeleton_tree)
+    app = out['App.tsx']
+    assert app.count('Câblage DC') == 1
+    assert app.count('dcCablingRuns: [],') == 1
+    assert 'Liaison DC (chute de tension)' not in out['components/CalculationAudit.tsx']
+
+def test_written_regions_skip_every_writer():
+    texts = patch_files(SKELETONS, jobs=1)
+    sources = {p: Source(texts[p], markers_for(fn for q, fn in MANIFEST if q == p)) for p in SKELETONS}
+    conflicts, skipped = find_conflicts(MANIFEST, sources)
+    assert conflicts == []
+    # types.ts and PdfReport.tsx patches are guarded by their own output; the rest by any writer's
+    assert {MANIFEST[i][1].__name__ for i in skipped} >= {'patch_app_dc', 'patch_app_dc_ui', 'patch_app', 'patch_audit_dc', 'patch_audit'}
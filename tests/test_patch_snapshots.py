@@ -0,0 +1,88 @@
+import os, io, zipfile
+
+import pytest
+
+import patch_snapshots
+from bench_patches import SKELETONS
+from patch_app_dc import patch_app_dc
+from patch_pipeline import patch_files
+from patch_snapshots import SnapshotIndex, needles, scan_file, scan_stream
+from patch_step14 import APP_MARKER, patch_pdf, patch_types
+
+PDF_GUARD = 'Liaison DC (chute de tension)'
+
+@pytest.fixture
+def snapshots(tmp_path):
+    patched = patch_files(SKELETONS, jobs=1)
+    root = tmp_path / 'root'
+    (root / 'src').mkdir(parents=True)
+    (root / 'App.tsx').write_text(patched['App.tsx'], encoding='utf-8')
+    # the .bak generation is cp1252 with CRLF line ends (its arrows did not survive)
+    (root / 'App.tsx.bak').write_bytes(patched['App.tsx'].replace('\n', '\r\n').encode('cp1252', 'replace'))
+    (root / 'src/App.legacy.tsx').write_text(SKELETONS['App.tsx'], encoding='utf-8')
+    with zipfile.ZipFile(root / 'pvapp_step01.zip', 'w', zipfile.ZIP_DEFLATED) as z:
+        for path, text in patched.items():
+            z.writestr('pvapp/' + path, text.encode('utf-8'))
+        z.writestr('pvapp/README.md', PDF_GUARD)
+    index = SnapshotIndex(root, tmp_path / 'index.json')
+    assert sorted(index.update()) == ['App.tsx', 'App.tsx.bak', 'pvapp_step01.zip', 'src/App.legacy.tsx']
+    index.save()
+    return root, index, patched
+
+def offsets(index, marker, snapshot, file):
+    return [h.offset for h in index.hits(marker) if (h.snapshot, h.file) == (snapshot, file)]
+
+def test_offsets_in_every_encoding(snapshots):
+    root, index, patched = snapshots
+    raw = patched['App.tsx'].encode('utf-8')
+    assert offsets(index, APP_MARKER, 'App.tsx', 'App.tsx') == [raw.find(APP_MARKER.encode('utf-8'))]
+    bak = (root / 'App.tsx.bak').read_bytes()
+    want = bak.find(APP_MARKER.replace('\n', '\r\n').encode('cp1252'))
+    assert want > 0 and offsets(index, APP_MARKER, 'App.tsx.bak', 'App.tsx.bak') == [want]
+    guard = 'Câblage DC par MPPT (m)'
+    assert bak.find(guard.encode('utf-8')) == -1
+    assert offsets(index, guard, 'App.tsx.bak', 'App.tsx.bak') == [bak.find(guard.encode('cp1252'))]
+    member = patched['components/PdfReport.tsx'].encode('utf-8')
+    assert offsets(index, PDF_GUARD, 'pvapp_step01.zip', 'pvapp/components/PdfReport.tsx') == [member.find(PDF_GUARD.encode('utf-8'))]
+    assert ('pvapp_step01.zip', 'pvapp/README.md') not in index.files_with(PDF_GUARD)
+
+def test_applied(snapshots):
+    _, index, _ = snapshots
+    assert index.applied(patch_pdf) == [('pvapp_step01.zip', 'pvapp/components/PdfReport.tsx')]
+    assert index.applied(patch_types) == [('pvapp_step01.zip', 'pvapp/types.ts')]
+    assert index.applied(patch_app_dc) == [('App.tsx', 'App.tsx'), ('App.tsx.bak', 'App.tsx.bak'), ('pvapp_step01.zip', 'pvapp/App.tsx')]
+
+def test_update_rescans_only_changed_snapshots(snapshots, tmp_path):
+    root, index, _ = snapshots
+    assert index.update() == []
+    st = (root / 'App.tsx').stat()
+    os.utime(root / 'App.tsx', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert index.update() == []                       # touched, same content
+    assert index.snapshots['App.tsx']['stat'][0] == st.st_mtime_ns + 10**9
+    (root / 'src/App.legacy.tsx').write_text(SKELETONS['App.tsx'] + '\n// Câblage DC (m)\n', encoding='utf-8')
+    assert index.update() == ['src/App.legacy.tsx']
+    assert ('src/App.legacy.tsx', 'src/App.legacy.tsx') in index.files_with('Câblage DC (m)')
+    (root / 'App.tsx.bak').unlink()
+    assert index.update() == []
+    assert all(h.snapshot != 'App.tsx.bak' for h in index.hits(APP_MARKER))
+    index.save()
+    reloaded = SnapshotIndex(root, tmp_path / 'index.json')
+    assert reloaded.postings == index.postings and reloaded.update() == []
+
+def test_editing_markers_rebuilds(snapshots, tmp_path):
+    root, _, _ = snapshots
+    index = SnapshotIndex(root, tmp_path / 'index.json', manifest=[('types.ts', patch_types)])
+    assert index.snapshots == {} and len(index.update()) == 4
+
+@pytest.mark.parametrize('chunk', [1, 7, 64, 100, 1 << 20])
+def test_stream_matches_across_chunk_boundaries(tmp_path, monkeypatch, chunk):
+    table = needles([APP_MARKER, 'Câblage DC (m)', PDF_GUARD])
+    text = ('x' * 61 + APP_MARKER + 'y' * 30 + PDF_GUARD + PDF_GUARD + '\n' + 'Câblage DC (m)') * 3
+    data = text.replace('\n', '\r\n').encode('cp1252') + text.encode('utf-8')
+    (tmp_path / 'f').write_bytes(data)
+    monkeypatch.setattr(patch_snapshots, 'CHUNK', chunk)
+    hits = {m: sorted(v) for m, v in scan_stream(io.BytesIO(data), table).items()}
+    assert hits == {m: sorted(v) for m, v in scan_file(tmp_path / 'f', table).items()}
+    assert {m: len(v) for m, v in hits.items()} == {APP_MARKER: 6, PDF_GUARD: 12, 'Câblage DC (m)': 6}
+    # a needle straddling the first 64-byte chunk is found exactly once
+    assert 61 in hits[APP_MARKER] and len(set(hits[APP_MARKER])) == 6
@@ -0,0 +1,54 @@
+import io, os, json
+
+import pytest
+
+from bench_patches import SKELETONS
+from patch_pipeline import MANIFEST, run
+from patch_trace import recording
+
+def boom(text):
+    raise RuntimeError('boom')
+
+def traced(root, manifest=MANIFEST, jobs=2):
+    summary = io.StringIO()
+    try:
+        with recording(root / 'trace.json', memory=False, summary_to=summary):
+            run(root, manifest, jobs=jobs, cache=False)
+    finally:
+        events = json.loads((root / 'trace.json').read_text(encoding='utf-8'))['traceEvents']
+    return events, summary.getvalue()
+
+def patches(events):
+    return {e['name']: e for e in events if e.get('cat') == 'patch'}
+
+def test_worker_events_are_merged(skeleton_tree):
+    events, summary = traced(skeleton_tree)
+    workers = {e['pid'] for e in events if e['ph'] == 'M'} - {os.getpid()}
+    assert len(workers) >= 2
+    ran = patches(events)
+    assert {'patch_app_dc.patch_app_dc', 'patch_audit_dc.patch_audit_dc', 'patch_step14.patch_types',
+            'patch_step14.patch_pdf'} <= set(ran)
+    assert {e['pid'] for e in ran.values()} <= workers
+    assert {e['name'] for e in events if e['name'].startswith('apply ')} == {f'apply {p}' for p in SKELETONS}
+    assert 'patch_step14.patch_types [types.ts]: 2 edit(s)' in summary
+
+def test_guard_short_circuit_is_reported(skeleton_tree):
+    types = skeleton_tree / 'types.ts'
+    types.write_text(SKELETONS['types.ts'] + '\nexport interface DcCablingRun {\n  mpptIndex: number;\n}\n', encoding='utf-8')
+    events, summary = traced(skeleton_tree)
+    args = patches(events)['patch_step14.patch_types']['args']
+    assert args['short_circuit'] == ['dc-cabling-type']
+    assert args['regions'] == {'dc-cabling-type': "guard 'DcCablingRun'", 'dc-cabling-field': 'live'}
+    assert args['edits'] == 1
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_failing_patch_still_writes_the_trace(skeleton_tree, jobs):
+    with pytest.raises(RuntimeError, match='boom'):
+        traced(skeleton_tree, MANIFEST + [('types.ts', boom)], jobs=jobs)
+    events = json.loads((skeleton_tree / 'trace.json').read_text(encoding='utf-8'))['traceEvents']
+    failed = patches(events)[f'{__name__}.boom']
+    assert failed['args']['error'] == 'RuntimeError: boom'
+    assert failed['args']['file'] == 'types.ts'
+    if jobs > 1:  # the other workers' events are merged too
+        assert 'patch_step14.patch_pdf' in patches(events)
+    assert (skeleton_tree / 'types.ts').read_text(encoding='utf-8') == SKELETONS['types.ts']
@@ -0,0 +1,44 @@
+"""Watcher cycles driven by hand, without inotify or polling."""
+import pytest
+
+from bench_patches import SKELETONS
+from patch_pipeline import patch_files
+from patch_watch import Watcher
+
+@pytest.fixture
+def watcher(skeleton_tree):
+    logs = []
+    w = Watcher(skeleton_tree, log=logs.append)
+    w.start()
+    logs.clear()
+    return w, logs
+
+def test_start_patches_the_tree(watcher, skeleton_tree):
+    expected = patch_files(SKELETONS, jobs=1)
+    for path, text in expected.items():
+        assert (skeleton_tree / path).read_text(encoding='utf-8') == text
+
+def test_unrelated_edit_reruns_nothing(watcher, skeleton_tree):
+    w, logs = watcher
+    app = skeleton_tree / 'App.tsx'
+    edited = app.read_text(encoding='utf-8') + '\n// note\n'
+    app.write_text(edited, encoding='utf-8')
+    w.cycle({'App.tsx'})
+    assert logs == ['changed App.tsx: 0 of 3 patches to rerun']
+    assert app.read_text(encoding='utf-8') == w.files['App.tsx'].text == edited
+
+def test_own_write_is_not_a_change(watcher):
+    w, logs = watcher
+    w.cycle({'App.tsx', 'types.ts'})
+    assert logs == []
+
+def test_revert_reapplies_only_that_files_patches(watcher, skeleton_tree):
+    w, logs = watcher
+    pdf = skeleton_tree / 'components/PdfReport.tsx'
+    before = {p: (skeleton_tree / p).read_text(encoding='utf-8') for p in SKELETONS}
+    pdf.write_text(SKELETONS['components/PdfReport.tsx'], encoding='utf-8')
+    w.cycle({'components/PdfReport.tsx'})
+    assert logs[0] == 'changed components/PdfReport.tsx: 1 of 1 patches to rerun'
+    assert logs[1:-1] == ['updated components/PdfReport.tsx']
+    assert logs[-1].startswith('cycle: patch_step14.patch_pdf in ')
+    assert {p: (skeleton_tree / p).read_text(encoding='utf-8') for p in SKELETONS} == before
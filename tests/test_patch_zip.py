@@ -0,0 +1,79 @@
+import zipfile
+
+import pytest
+
+from bench_patches import SKELETONS
+from patch_pipeline import MANIFEST, patch_files
+from patch_zip import patch_zip, present
+
+def make_zip(path, files, prefix='pvapp/'):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, text in files.items():
+            z.writestr(prefix + name, text.encode('utf-8'))
+        z.writestr(prefix + 'README.md', b'untouched\r\n')
+    return path
+
+def read_zip(path):
+    with zipfile.ZipFile(path) as z:
+        assert z.testzip() is None
+        return {name: z.read(name).decode('utf-8') for name in z.namelist()}
+
+def test_patches_members(tmp_path):
+    src = make_zip(tmp_path / 'in.zip', SKELETONS)
+    result = patch_zip(src, tmp_path / 'out.zip', jobs=1)
+    assert result == {path: True for path in ('App.tsx', 'components/CalculationAudit.tsx', 'types.ts', 'components/PdfReport.tsx')}
+    out = read_zip(tmp_path / 'out.zip')
+    expected = patch_files(SKELETONS, jobs=1)
+    assert {name[len('pvapp/'):]: text for name, text in out.items() if name != 'pvapp/README.md'} == expected
+    assert out['pvapp/README.md'] == 'untouched\r\n'
+
+def test_missing_target_is_skipped(tmp_path):
+    files = {p: t for p, t in SKELETONS.items() if p != 'components/PdfReport.tsx'}
+    src = make_zip(tmp_path / 'in.zip', files)
+    result = patch_zip(src, tmp_path / 'out.zip', jobs=1)
+    assert result['components/PdfReport.tsx'] is None
+    assert result['App.tsx'] is True
+    out = read_zip(tmp_path / 'out.zip')
+    assert 'pvapp/components/PdfReport.tsx' not in out
+    assert out['pvapp/types.ts'] == patch_files(files, present(MANIFEST, files), jobs=1)['types.ts']
+
+def test_missing_target_fails_strict(tmp_path):
+    files = {p: t for p, t in SKELETONS.items() if p != 'components/PdfReport.tsx'}
+    src = make_zip(tmp_path / 'in.zip', files)
+    with pytest.raises(ValueError, match='PdfReport'):
+        patch_zip(src, tmp_path / 'out.zip', jobs=1, strict=True)
+    assert not (tmp_path / 'out.zip').exists()
+
+def test_crlf_members_keep_their_line_endings(tmp_path):
+    files = dict(SKELETONS)
+    files['App.tsx'] = files['App.tsx'].replace('\n', '\r\n')
+    src = make_zip(tmp_path / 'in.zip', files)
+    result = patch_zip(src, tmp_path / 'out.zip', jobs=1)
+    assert result['App.tsx'] and result['types.ts']
+    out = read_zip(tmp_path / 'out.zip')
+    app = out['pvapp/App.tsx']
+    assert app.count('\n') == app.count('\r\n')
+    assert app.replace('\r\n', '\n') == patch_files(SKELETONS, jobs=1)['App.tsx']
+    assert '\r' not in out['pvapp/types.ts']
+
+def test_prefix_ignores_a_nested_file_of_the_same_name(tmp_path):
+    src = tmp_path / 'in.zip'
+    with zipfile.ZipFile(src, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('pvapp/lib/types.ts', b'export type Unrelated = number;\n')
+        for name, text in SKELETONS.items():
+            z.writestr('pvapp/' + name, text.encode('utf-8'))
+    result = patch_zip(src, tmp_path / 'out.zip', jobs=1)
+    assert all(result.values())
+    out = read_zip(tmp_path / 'out.zip')
+    assert out['pvapp/lib/types.ts'] == 'export type Unrelated = number;\n'
+    assert out['pvapp/types.ts'] == patch_files(SKELETONS, jobs=1)['types.ts']
+
+def test_ambiguous_prefix_fails(tmp_path):
+    src = tmp_path / 'in.zip'
+    with zipfile.ZipFile(src, 'w') as z:
+        for prefix in ('a/', 'b/'):
+            for name, text in SKELETONS.items():
+                z.writestr(prefix + name, text.encode('utf-8'))
+    with pytest.raises(ValueError, match='ambiguous'):
+        patch_zip(src, tmp_path / 'out.zip', jobs=1)
+    assert patch_zip(src, tmp_path / 'out.zip', prefix='b/', jobs=1)['App.tsx'] is True
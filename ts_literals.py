@@ -0,0 +1,160 @@
+"""Read the literal tables of the app's .ts files from Python.
+
+Only what the data/ and services/ modules actually contain is supported:
+`const NAME[: Type] = <literal>;` with object / array / string / number /
+boolean / null / undefined literals, enum member references
+(`WindZone.ZONE_4`) and references to other constants of the same file,
+plus `enum Name { A = 'x' }` declarations. Everything else in the file is
+skipped.
+"""
+import re, json, pathlib
+from functools import lru_cache
+
+ROOT = pathlib.Path(__file__).resolve().parent
+
+TOKEN = re.compile(r'''
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<str>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"|`(?:\\.|[^`\\])*`)
+  | (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>\.\.\.|=>|[{}\[\]():;,.=<>|&?!*+\-/%@])
+''', re.S | re.X)
+
+class TsSyntaxError(ValueError):
+    pass
+
+def tokenize(text):
+    out = []
+    for m in TOKEN.finditer(text):
+        kind = m.lastgroup
+        if kind != 'ws':
+            out.append((kind, m.group(), m.start()))
+    return out
+
+def unquote(s):
+    if s[0] == '`':
+        if '${' in s:
+            raise TsSyntaxError('template literal with substitutions')
+        s = '"' + s[1:-1].replace('"', '\\"').replace('\n', '\\n') + '"'
+    elif s[0] == "'":
+        s = '"' + s[1:-1].replace('\\\'', "'").replace('"', '\\"') + '"'
+    return json.loads(s)
+
+class Parser:
+    def __init__(self, tokens, enums, consts):
+        self.toks, self.i, self.enums, self.consts = tokens, 0, enums, consts
+
+    def peek(self, k=0):
+        j = self.i + k
+        return self.toks[j] if j < len(self.toks) else ('eof', '', -1)
+
+    def take(self, value=None):
+        tok = self.peek()
+        if value is not None and tok[1] != value:
+            raise TsSyntaxError(f'expected {value!r}, got {tok[1]!r} at offset {tok[2]}')
+        self.i += 1
+        return tok
+
+    def value(self):
+        kind, text, pos = self.take()
+        if kind == 'str':
+            return unquote(text)
+        if kind == 'num':
+            return float(text) if re.search(r'[.eE]', text) else int(text)
+        if text == '-' and self.peek()[0] == 'num':
+            v = self.value()
+            return -v
+        if text == '{':
+            obj = {}
+            while self.peek()[1] != '}':
+                k_kind, key, _ = self.take()
+                key = unquote(key) if k_kind == 'str' else key
+                self.take(':')
+                obj[key] = self.value()
+                if self.peek()[1] == ',':
+                    self.take()
+            self.take('}')
+            return obj
+        if text == '[':
+            arr = []
+            while self.peek()[1] != ']':
+                arr.append(self.value())
+                if self.peek()[1] == ',':
+                    self.take()
+            self.take(']')
+            return arr
+        if kind == 'name':
+            if text in ('true', 'false'):
+                return text == 'true'
+            if text in ('null', 'undefined'):
+                return None
+            if self.peek()[1] == '.' and text in self.enums:
+                self.take('.')
+                return self.enums[text][self.take()[1]]
+            if text in self.consts:
+                return self.consts[text]
+        raise TsSyntaxError(f'unsupported expression {text!r} at offset {pos}')
+
+    def skip_type(self):
+        """Skip a type annotation up to the `=` that starts the initialiser."""
+        depth = 0
+        while True:
+            kind, text, pos = self.peek()
+            if kind == 'eof':
+                raise TsSyntaxError('unterminated declaration')
+            if text in '{[(<' and kind == 'punct':
+                depth += 1
+            elif text in '}])>' and kind == 'punct':
+                depth -= 1
+            elif text == '=' and depth == 0:
+                return
+            self.take()
+
+def parse_enums(text):
+    enums = {}
+    for m in re.finditer(r'\benum\s+(\w+)\s*\{([^}]*)\}', text):
+        members, nxt = {}, 0
+        for k, v in re.findall(r'(\w+)\s*(?:=\s*([^,\n]+?))?\s*(?:,|$)', re.sub(r'//[^\n]*', '', m.group(2)), re.M):
+            if v:
+                v = v.strip()
+                nxt = unquote(v) if v[0] in '\'"`' else int(v)
+            members[k] = nxt
+            if isinstance(nxt, int):
+                nxt += 1
+        enums[m.group(1)] = members
+    return enums
+
+@lru_cache(maxsize=None)
+def load_module(path, enum_sources=('types.ts',)):
+    """{name: value} for every literal constant in a .ts file (path relative to the repo root)."""
+    text = (ROOT / path).read_text(encoding='utf-8')
+    enums = {}
+    for src in enum_sources:
+        enums.update(parse_enums((ROOT / src).read_text(encoding='utf-8')))
+    enums.update(parse_enums(text))
+    toks = tokenize(text)
+    consts = {}
+    p = Parser(toks, enums, consts)
+    for j, (kind, word, _) in enumerate(toks):
+        if word != 'const' or kind != 'name' or toks[j + 1][0] != 'name':
+            continue
+        p.i = j + 2
+        name = toks[j + 1][1]
+        try:
+            if p.peek()[1] == ':':
+                p.take()
+                p.skip_type()
+            p.take('=')
+            consts[name] = p.value()
+        except (TsSyntaxError, KeyError, IndexError):
+            continue  # not a literal table (function body, expression, ...)
+    return consts
+
+def load_const(path, name):
+    try:
+        return load_module(path)[name]
+    except KeyError:
+        raise KeyError(f'{name} is not a literal constant of {path}') from None
+
+def load_enum(path, name):
+    return parse_enums((ROOT / path).read_text(encoding='utf-8'))[name]
@@ -0,0 +1,382 @@
+"""Structural outline of a .ts/.tsx file in one linear pass.
+
+A small tokenizer (strings, template literals, comments, regex literals,
+JSX text) drives a bracket / JSX-tag matcher and records the nodes patches
+anchor on:
+
+    interface   `interface Name {...}` with one `member` child per member
+    object      object literals, named after their key or binding
+                (`inverterConfig: {...}`, `const DEFAULT = {...}`), with
+                one `member` child per property
+    element     JSX elements (name '' for fragments)
+    comment     `{/* ... */}` section comments between JSX children
+
+Every node knows its span (start, end), the span inside its brackets or
+tags (inner_start, inner_end), where its last member ends (members_end)
+and its parent, so patches can say "end of InverterConfig members" or
+"after the element around 'Coffret AC'" instead of scanning with regexes.
+Token patterns are plain alternations matched at the current offset; no
+pattern can backtrack across the file.
+"""
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+CODE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+  | (?P<str>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<name>[^\W\d][\w$]*|\$[\w$]*)
+  | (?P<num>\d[\w.]*|\.\d\w*)
+  | (?P<punct>=>|\.\.\.|\?\?=?|\?\.|[=!]==?|<=|>=|&&=?|\|\|=?|\*\*=?|<<=?|>>>?=?|[-+*%&|^/]=?|[{}()\[\];,<>:?~.@#!=`])
+''', re.X)
+REGEX = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+TEMPLATE = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*')
+TAG = re.compile(r'''(?P<ws>\s+)|(?P<name>[^\W\d][\w$.:-]*)|(?P<str>"[^"]*"|'[^']*')|(?P<punct>/>|[>{=])''')
+TEXT = re.compile(r'[^<{]+')
+CLOSE = re.compile(r'</\s*([\w$.:-]*)\s*>')
+JSX_COMMENT = re.compile(r'\{\s*/\*((?:[^*]|\*(?!/))*)\*/\s*\}')
+TAG_START = re.compile(r'<\s*(?:[^\W\d]|>)')
+TAG_NAME = re.compile(r'<\s*([^\W\d][\w$.:-]*)?\s*')
+
+# after these a '/' starts a regex and a '<' a JSX element
+EXPRESSION_KEYWORDS = frozenset('return typeof case do else in of new delete void throw yield await instanceof'.split())
+CONTINUATION = frozenset(': | & , ( => ? = . < extends'.split())
+OBJECT_AFTER = frozenset(': = ( , [ ? && || ?? return'.split())
+CODE_FRAME, TAG_FRAME, CHILDREN_FRAME, TEMPLATE_FRAME = range(4)
+
+class Node:
+    __slots__ = ('kind', 'name', 'start', 'end', 'inner_start', 'inner_end', 'members_end', 'parent', 'children', 'closed')
+
+    def __init__(self, kind, name, start, parent):
+        self.kind, self.name, self.start, self.parent = kind, name, start, parent
+        self.end = self.inner_start = self.inner_end = self.members_end = None
+        self.children, self.closed = [], False
+        if parent is not None:
+            parent.children.append(self)
+
+    def __repr__(self):
+        return f'<{self.kind} {self.name!r} {self.start}:{self.end}>'
+
+    @property
+    def members(self):
+        return [c for c in self.children if c.kind == 'member']
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def walk(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+class Outline:
+    def __init__(self, text, roots, nodes):
+        self.text, self.roots, self.nodes = text, roots, nodes
+        self._by_kind, self._starts = {}, {}
+        for node in nodes:
+            self._by_kind.setdefault(node.kind, []).append(node)
+
+    def find(self, kind, name=None):
+        """Nodes of a kind (optionally with a name), in source order."""
+        return [n for n in self._by_kind.get(kind, ()) if name is None or n.name == name]
+
+    def first(self, kind, name=None):
+        found = self.find(kind, name)
+        if not found:
+            raise KeyError(f'no {kind} {name or ""} in outline'.rstrip())
+        return found[0]
+
+    def containing(self, pos, kind='element'):
+        """Innermost node of `kind` whose span holds pos, or None."""
+        nodes = self._by_kind.get(kind, ())
+        starts = self._starts.get(kind)
+        if starts is None:
+            starts = self._starts[kind] = [n.start for n in nodes]
+        i = bisect_right(starts, pos) - 1
+        # spans nest, so the answer is the last node opened before pos or one of its ancestors
+        node = nodes[i] if i >= 0 else None
+        while node is not None and not (node.kind == kind and pos < node.end):
+            node = node.parent
+        return node
+
+    def select(self, path):
+        """Nodes matching a path like 'interface InverterConfig/member dcCablingRuns'.
+
+        Each step is 'kind' or 'kind name'; a step matches descendants of the
+        previous step's nodes.
+        """
+        scope = None
+        for step in path.split('/'):
+            kind, _, name = step.strip().partition(' ')
+            candidates = self.find(kind, name or None)
+            if scope is not None:
+                candidates = [n for n in candidates if any(a in scope for a in n.ancestors())]
+            scope = candidates
+        return scope or []
+
+class Parser:
+    def __init__(self, text):
+        self.text = text
+        self.roots, self.nodes = [], []
+        self.current = None          # innermost open node
+        self.prev = None             # last significant code token (kind, text, start, end)
+        self.before_prev = None
+        self.newline = False         # a line break since the last significant token
+        self.pending = None          # ('interface', name, start) until its '{'
+        self.binding = None          # const/let/var name waiting for its '='
+        self.assigned = None         # name the last '=' assigns to
+        self.open_members = {}       # interface / object -> its member being read
+
+    def open(self, kind, name, start):
+        node = Node(kind, name, start, self.current)
+        if self.current is None:
+            self.roots.append(node)
+        self.nodes.append(node)
+        self.current = node
+        return node
+
+    def close(self, node, end):
+        # close anything left open inside (tolerates unbalanced input)
+        while self.current is not None and self.current is not node:
+            self.current.end = end
+            self.current = self.current.parent
+        node.end, node.closed = end, True
+        self.current = node.parent
+
+    def expression_start(self):
+        prev = self.prev
+        if prev is None:
+            return True
+        kind, tok = prev[0], prev[1]
+        if kind == 'name':
+            return tok in EXPRESSION_KEYWORDS
+        if kind in ('str', 'num', 'regex', 'template'):
+            return False
+        return tok not in (')', ']')
+
+    # members of interfaces and object literals -------------------------------------------
+
+    def member_token(self, kind, tok, start, end, body):
+        if body is None:
+            return
+        member = self.open_members.get(body)
+        if tok in (';', ','):
+            if member is not None:
+                self.end_member(body, end)
+            return
+        if member is not None and body.kind == 'interface' and self.newline and self.prev_tok() not in CONTINUATION \
+                and (kind in ('name', 'str') or tok == '['):
+            self.end_member(body, self.prev[3])
+            member = None
+        if member is None and (kind in ('name', 'str') or tok in ('[', '...', '(')):
+            if kind == 'name' and tok == 'readonly':
+                return
+            name = tok.strip('\'"') if kind in ('name', 'str') else tok
+            self.open_members[body] = self.open('member', name, start)
+
+    def end_member(self, body, end):
+        member = self.open_members.pop(body, None)
+        if member is not None:
+            member.inner_start, member.inner_end = member.start, end
+            member.members_end = end
+            self.close(member, end)
+
+    def prev_tok(self):
+        return self.prev[1] if self.prev else None
+
+    # the scan ------------------------------------------------------------------------------
+
+    def parse(self):
+        text, n = self.text, len(self.text)
+        stack = [[CODE_FRAME, [], False]]   # frames: [mode, data, ...]
+        pos = 0
+        while pos < n:
+            frame = stack[-1]
+            mode = frame[0]
+            if mode == CODE_FRAME:
+                pos = self.code(stack, frame, pos)
+            elif mode == TEMPLATE_FRAME:
+                m = TEMPLATE.match(text, pos)
+                pos = m.end()
+                if pos >= n:
+                    break
+                if text[pos] == '`':
+                    stack.pop()
+                    self.token('template', '`', frame[1], pos + 1)
+                    pos += 1
+                else:  # '${'
+                    stack.append([CODE_FRAME, [], True])
+                    pos += 2
+            elif mode == TAG_FRAME:
+                pos = self.tag(stack, frame, pos)
+            else:
+                pos = self.children(stack, frame, pos)
+        while self.current is not None:
+            self.current.end = n
+            self.current = self.current.parent
+        return Outline(text, self.roots, sorted(self.nodes, key=lambda node: node.start))
+
+    def token(self, kind, tok, start, end):
+        self.before_prev, self.prev = self.prev, (kind, tok, start, end)
+        self.newline = False
+
+    def body(self, brackets):
+        """The interface / object whose member list the next token belongs to."""
+        if brackets and brackets[-1][1] is not None and brackets[-1][1].kind in ('interface', 'object'):
+            return brackets[-1][1]
+        return None
+
+    def code(self, stack, frame, pos):
+        text, brackets = self.text, frame[1]
+        ch = text[pos]
+        if ch == '/' and pos + 1 < len(text) and text[pos + 1] not in '/*' and self.expression_start():
+            m = REGEX.match(text, pos)
+            if m:
+                self.member_token('regex', m.group(), pos, m.end(), self.body(brackets))
+                self.token('regex', m.group(), pos, m.end())
+                return m.end()
+        if ch == '<' and self.expression_start() and TAG_START.match(text, pos):
+            self.member_token('jsx', '<', pos, pos + 1, self.body(brackets))
+            node, end = self.open_element(pos)
+            stack.append([TAG_FRAME, node])
+            return end
+        m = CODE.match(text, pos)
+        if m is None:  # not TS (a stray backslash, '→' in a broken file ...): skip it
+            return pos + 1
+        kind, tok, end = m.lastgroup, m.group(), m.end()
+        if kind == 'ws':
+            if '\n' in tok:
+                self.newline = True
+            return end
+        if kind == 'comment':
+            return end
+        body = self.body(brackets)
+        if tok in ('}', ')', ']') and kind == 'punct':
+            if not brackets:
+                if frame[2]:  # end of an embedded expression: back to JSX / template
+                    stack.pop()
+                    self.token('punct', tok, pos, end)
+                    return end
+                self.token('punct', tok, pos, end)
+                return end
+            opener, node = brackets.pop()
+            if node is not None:
+                if node in self.open_members:
+                    self.end_member(node, self.prev[3])
+                node.inner_end = pos
+                node.members_end = self.prev[3] if self.prev and self.prev[3] > node.inner_start else pos
+                self.close(node, end)
+            self.token('punct', tok, pos, end)
+            return end
+        self.member_token(kind, tok, pos, end, body)
+        if kind == 'punct' and tok == '`':
+            stack.append([TEMPLATE_FRAME, pos])
+            self.prev = ('template', '`', pos, end)
+            return end
+        if kind == 'name':
+            if tok == 'interface' and not (self.prev and self.prev[1] == '.'):
+                start = self.prev[2] if self.prev and self.prev[1] == 'export' else pos
+                self.pending = ('interface', None, start)
+            elif self.pending and self.pending[1] is None:
+                self.pending = ('interface', tok, self.pending[2])
+            elif self.prev and self.prev[1] in ('const', 'let', 'var'):
+                self.binding = tok
+        elif tok == ';':
+            self.pending = self.binding = None
+        elif tok == '=':
+            # `const X: Type = ` names X; `x = ` names x; `a[i] = ` names nothing
+            if self.binding:
+                self.assigned = self.binding
+            else:
+                self.assigned = self.prev[1] if self.prev and self.prev[0] == 'name' else None
+            self.binding = None
+        elif tok == '{':
+            node = None
+            if self.pending and self.pending[1]:
+                node = self.open('interface', self.pending[1], self.pending[2])
+                self.pending = None
+            elif self.prev and self.prev[1] in OBJECT_AFTER:
+                node = self.open('object', self.object_name(), pos)
+            if node is not None:
+                node.inner_start = end
+            brackets.append(('{', node))
+        elif tok in ('(', '['):
+            brackets.append((tok, None))
+        self.token(kind, tok, pos, end)
+        return end
+
+    def object_name(self):
+        prev, before = self.prev, self.before_prev
+        if prev[1] == ':' and before and before[0] in ('name', 'str'):
+            return before[1].strip('\'"')
+        if prev[1] == '=':
+            return self.assigned
+        return None
+
+    def open_element(self, pos):
+        m = TAG_NAME.match(self.text, pos)
+        return self.open('element', m.group(1) or '', pos), m.end()
+
+    def tag(self, stack, frame, pos):
+        text, node = self.text, frame[1]
+        m = TAG.match(text, pos)
+        if m is None:
+            return pos + 1
+        kind, tok, end = m.lastgroup, m.group(), m.end()
+        if kind != 'punct' or tok == '=':
+            return end
+        if tok == '{':
+            stack.append([CODE_FRAME, [], True])
+            self.prev = None
+            return end
+        if tok == '/>':
+            stack.pop()
+            node.inner_start = node.inner_end = node.members_end = end
+            self.close(node, end)
+            self.token('jsx', '/>', pos, end)
+            return end
+        # '>': children follow
+        node.inner_start = end
+        frame[0] = CHILDREN_FRAME
+        return end
+
+    def children(self, stack, frame, pos):
+        text, node = self.text, frame[1]
+        ch = text[pos]
+        if ch == '{':
+            m = JSX_COMMENT.match(text, pos)
+            if m:
+                comment = self.open('comment', m.group(1).strip(), pos)
+                comment.inner_start, comment.inner_end = m.start(1), m.end(1)
+                comment.members_end = m.end(1)
+                self.close(comment, m.end())
+                return m.end()
+            stack.append([CODE_FRAME, [], True])
+            self.prev = None
+            return pos + 1
+        if ch == '<':
+            m = CLOSE.match(text, pos)
+            if m:
+                stack.pop()
+                node.inner_end = node.members_end = pos
+                self.close(node, m.end())
+                self.token('jsx', '>', pos, m.end())
+                return m.end()
+            if TAG_START.match(text, pos):
+                node, end = self.open_element(pos)
+                stack.append([TAG_FRAME, node])
+                return end
+            return pos + 1  # a stray '<' in text
+        m = TEXT.match(text, pos)
+        return m.end()
+
+@lru_cache(maxsize=32)
+def parse(text):
+    """Outline of a .ts/.tsx text (cached for the last few texts)."""
+    return Parser(text).parse()